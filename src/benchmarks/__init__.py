@@ -0,0 +1,7 @@
+"""
+Micro / end-to-end benchmarks for DECS<->VISA
+
+Run from the /src folder, e.g.
+
+    python -m benchmarks.socket_framing
+"""
@@ -0,0 +1,191 @@
+"""
+Benchmark of the client message routing.
+
+Compares the original routing - a substring test chain ("set_" in
+data, "get_" in data, ...), the command dictionary lookup and the uri
+pattern chain of the original decs_command_parser to build the
+arguments - with the precompiled command table lookup and argument
+packers, over every alias in the command dictionary, and lists the
+messages the substring chain sends to the wrong handler.
+"""
+import time
+import timeit
+import typing
+
+from decs_visa_tools.command_dictionary import Proteox_cmd_uri as cmd_uri
+from decs_visa_tools.command_parser import decs_command_parser, lookup_command
+from decs_visa_tools.command_parser import GET, SET, PUBLISH
+
+REPEATS = 20
+
+# messages that contain another command's keyword
+MISROUTED = [
+    "PUBLISH:[reset_valve,ok]",
+    "get_offset_T",
+]
+
+def legacy_request_parser(cmd: str) -> str:
+    """
+    The original decs_request_parser
+    """
+    uri = cmd_uri.get(cmd)
+    try:
+        assert isinstance(uri, str), "uri not returned from command_dictionary"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    return uri
+
+def legacy_command_parser(cmd: str) -> tuple:
+    """
+    The original decs_command_parser - the command dictionary
+    lookup, then the uri pattern chain for the arguments
+    """
+    cmd_parts = cmd.split(':')
+    try:
+        assert len(cmd_parts) > 1, "set_ commands must have a :<payload>"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    uri = cmd_uri.get(cmd_parts[0].strip())
+    try:
+        assert isinstance(uri, str), "uri not returned from cmd_dict"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    args: list[typing.Any]
+    args = []
+    if "temperature_control" in uri and uri.endswith("setpoint"):
+        args.append(float(str(cmd_parts[1]).strip()))
+        args.append(1)
+    elif "temperature_control" in uri and uri.endswith("power"):
+        args.append(float(str(cmd_parts[1]).strip()))
+        if cmd_parts[0].endswith("OFF"):
+            args.append(False)
+        else:
+            args.append(True)
+    elif "pressure_control" in uri and uri.endswith("setpoint"):
+        args.append(float(str(cmd_parts[1]).strip()))
+        args.append(1)
+    elif uri.endswith("set_valve_open_percentage") or uri.endswith("set_target_position") \
+            or uri.endswith("pulse_width"):
+        args.append(float(str(cmd_parts[1]).strip()))
+    elif "magnetic_field_control" in uri and uri.endswith("set_field_target"):
+        cmd_args = (cmd_parts[1].strip()).split(',')
+        try:
+            assert len(cmd_args) == 7, "Incorrect arguments to set field"
+        except AssertionError as e:
+            raise ValueError(e) from e
+        args.append(int(cmd_args[0].strip('[')))
+        args.append(float(cmd_args[1]))
+        args.append(float(cmd_args[2]))
+        args.append(float(cmd_args[3]))
+        args.append(int(cmd_args[4]))
+        args.append(float(cmd_args[5]))
+        if cmd_args[6].strip(']') == 'true' or cmd_args[6].strip(']') == ' True':
+            args.append(True)
+        elif cmd_args[6].strip(']') == 'false' or cmd_args[6].strip(']') == ' False':
+            args.append(False)
+    elif "magnetic_field_control" in uri and uri.endswith("set_output_current_target"):
+        cmd_args = (cmd_parts[1].strip()).split(',')
+        try:
+            assert len(cmd_args) == 6, "Incorrect arguments to set current"
+        except AssertionError as e:
+            raise ValueError(e) from e
+        args.append(float(cmd_args[0].strip('[')))
+        args.append(float(cmd_args[1]))
+        args.append(float(cmd_args[2]))
+        args.append(int(cmd_args[3]))
+        args.append(float(cmd_args[4]))
+        if cmd_args[5].strip(']') == 'true' or cmd_args[5].strip(']') == ' True':
+            args.append(True)
+        elif cmd_args[5].strip(']') == 'false' or cmd_args[5].strip(']') == ' False':
+            args.append(False)
+    elif "magnetic_field_control" in uri and uri.endswith("set_state"):
+        args.append((int(str(cmd_parts[1]).strip())))
+    elif "PUBLISH" in cmd:
+        cmd_args = (cmd_parts[1].strip()).split(',')
+        try:
+            assert len(cmd_args) == 2, "Incorrect arguments for publication"
+        except AssertionError as e:
+            raise ValueError(e) from e
+        ts = str(int(time.time()))
+        args.append(int(10008))
+        args.append(int(0))
+        args.append(int(ts))
+        args.append(int(0))
+        args.append(int(0))
+        args.append(int(10008))
+        args.append(str((cmd_args[0]).strip('[')))
+        args.append(str((cmd_args[1]).strip(']')))
+    else:
+        raise NotImplementedError("Command / uri pattern incorrect, or not yet implemented")
+    return uri, args
+
+def legacy_route(data: str) -> tuple:
+    """
+    The original routing - a chain of substring tests, then the
+    original parsers for the uri (and arguments)
+    """
+    if "set_" in data:
+        kind = SET
+    elif "get_" in data:
+        kind = GET
+    elif "PUBLISH" in data:
+        kind = PUBLISH
+    elif "IDN" in data:
+        return "IDN", None, None
+    else:
+        return None, None, None
+    try:
+        if kind == GET:
+            return kind, legacy_request_parser(data), None
+        return (kind, *legacy_command_parser(data))
+    except (ValueError, NotImplementedError) as e:
+        return kind, e, None
+
+def table_route(data: str) -> tuple:
+    """
+    The command table - one dictionary lookup, then the
+    precompiled argument packer
+    """
+    name, spec = lookup_command(data)
+    if spec is None:
+        return ("IDN", None, None) if name.upper() == "*IDN?" else (None, None, None)
+    if spec.kind == GET:
+        return GET, spec.uri, None
+    try:
+        return (spec.kind, *decs_command_parser(data))
+    except (ValueError, NotImplementedError) as e:
+        return spec.kind, e, None
+
+# payloads of the commands that don't take a single number
+PAYLOADS = {
+    "set_MAG_TARGET": "[0,0.0,0.0,0.1,0,0.01,false]",
+    "set_CURR_TARGET": "[0.0,0.0,1.0,0,0.01,false]",
+    "PUBLISH": "[benchmark,ok]",
+}
+
+def messages() -> list:
+    """
+    One message for every alias in the command dictionary
+    """
+    return [alias if alias.startswith("get_") else f"{alias}:{PAYLOADS.get(alias, 1)}"
+            for alias in cmd_uri]
+
+def main():
+    """
+    Time both routings and show where they disagree
+    """
+    msgs = messages()
+    # both routings find the same handlers and uris (or errors)
+    assert [repr(legacy_route(m)[:2]) for m in msgs] == [repr(table_route(m)[:2]) for m in msgs]
+    for name, route in (("substring", legacy_route), ("table", table_route)):
+        seconds = min(timeit.repeat(lambda route=route: [route(m) for m in msgs],
+                                    number=REPEATS, repeat=5))
+        per_msg = 1e9 * seconds / (REPEATS * len(msgs))
+        print(f"{name:>9}: {per_msg:8.1f} ns per message ({len(msgs)} aliases)")
+    print("substring routing of messages containing another keyword:")
+    for msg in MISROUTED:
+        print(f"  {msg:<28} substring -> {legacy_route(msg)[0]!s:<8}"
+              f" table -> {table_route(msg)[0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+End-to-end benchmark of DECS<->VISA against the oi.DECS simulator.
+
+Starts the socket server and WAMP Component (answered in-process by
+the DecsSimulator backend, so a get_ sees the value of an earlier
+set_) in a child process, then measures commands per
+second and the p50/p99 round trip latency seen by clients for get_,
+set_, PUBLISH and *IDN? at several client counts.  Results are
+written as JSON so runs can be compared, e.g. from the /src folder:
+
+    python -m benchmarks.e2e --latency 0.001 --output e2e.json
+
+The threaded server serves one client at a time, so only the
+asyncio server is run with several clients.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import platform
+import queue
+import socket
+import statistics
+import threading
+import time
+
+from decs_visa_tools.decs_visa_settings import SERVER_MODE_THREADED, SERVER_MODE_ASYNCIO
+from decs_visa_tools.decs_visa_settings import SHUTDOWN
+from decs_visa_tools.loop_queue import LoopQueue
+
+# the command for each kind of message
+COMMANDS = {
+    "get"     : "get_MC_T",
+    "set"     : "set_MC_T:0.01",
+    "publish" : "PUBLISH:[benchmark,ok]",
+    "idn"     : "*IDN?",
+}
+CLIENT_COUNTS = (1, 4, 16)
+PORT = 34576
+
+def run_server(mode: str, port: int, latency: float) -> None:
+    """
+    The DECS<->VISA side - run in a child process until a
+    client sends SHUTDOWN
+    """
+    # imported here so the parent doesn't load the component
+    from autobahn.wamp.types import ComponentConfig
+    from decs_visa_components.simple_socket_server import simple_server
+    from decs_visa_components.wamp_component import Component
+    from decs_visa_tools.simulator import DecsSimulator
+
+    extra = dict(input_queue=None, output_queue=None, server_mode=mode,
+                 interface='localhost', server_port=port,
+                 user_name='benchmark', user_secret=None,
+                 backend=DecsSimulator(latency, 0.0, 'benchmark'))
+    component = Component(ComponentConfig('simulator', extra=extra))
+
+    async def serve() -> None:
+        if not await component.claim_system_control():
+            return
+        if mode == SERVER_MODE_ASYNCIO:
+            await component.serve_clients()
+        else:
+            await component.process_queue()
+
+    if mode == SERVER_MODE_THREADED:
+        q, r = LoopQueue(), queue.Queue()
+        component.config.extra.update(input_queue=q, output_queue=r)
+        server = threading.Thread(target=simple_server, args=('localhost', port, q, r))
+        server.start()
+        asyncio.run(serve())
+        server.join()
+    else:
+        asyncio.run(serve())
+
+def connect(port: int, timeout: float = 10.0) -> socket.socket:
+    """
+    Connect to the server, waiting for it to start listening
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return socket.create_connection(('localhost', port))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def client(port: int, command: str, n_commands: int, latencies: list,
+           start: threading.Barrier) -> None:
+    """
+    Send a command lock-step n_commands times, recording each round trip
+    """
+    with connect(port) as conn:
+        reader = conn.makefile('rb')
+        msg = (command + '\n').encode('utf-8')
+        start.wait()
+        for _ in range(n_commands):
+            sent = time.perf_counter_ns()
+            conn.sendall(msg)
+            reader.readline()
+            latencies.append(time.perf_counter_ns() - sent)
+
+def measure(port: int, command: str, n_clients: int, n_commands: int) -> dict:
+    """
+    Run n_clients clients concurrently
+    """
+    latencies = []
+    start = threading.Barrier(n_clients + 1)
+    clients = [threading.Thread(target=client,
+                                args=(port, command, n_commands, latencies, start))
+               for _ in range(n_clients)]
+    for thread in clients:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    latencies.sort()
+    return {"commands": len(latencies),
+            "cmds_per_s": round(len(latencies) / elapsed, 1),
+            "p50_us": round(statistics.median(latencies) / 1000, 1),
+            "p99_us": round(latencies[int(0.99 * (len(latencies) - 1))] / 1000, 1)}
+
+def run_mode(mode: str, client_counts: tuple, n_commands: int, latency: float,
+             port: int) -> list:
+    """
+    Start a server and measure every command kind / client count
+    """
+    server = multiprocessing.Process(target=run_server, args=(mode, port, latency))
+    server.start()
+    results = []
+    try:
+        with connect(port):
+            # wait for the server to be ready
+            pass
+        for kind, command in COMMANDS.items():
+            for n_clients in client_counts:
+                result = measure(port, command, n_clients, n_commands)
+                result.update(mode=mode, kind=kind, clients=n_clients)
+                results.append(result)
+                print(f"{mode:>8} {kind:>7} x{n_clients:<3}: {result['cmds_per_s']:10.1f} cmd/s"
+                      f"  p50 {result['p50_us']:8.1f} us  p99 {result['p99_us']:8.1f} us")
+    finally:
+        with connect(port) as conn:
+            conn.sendall((SHUTDOWN + '\n').encode('utf-8'))
+        server.join(timeout=10)
+        if server.is_alive():
+            server.terminate()
+    return results
+
+def main():
+    """
+    Run the benchmark and write the results
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="simulated router latency per WAMP call (seconds)")
+    parser.add_argument('--commands', type=int, default=500,
+                        help="commands sent by each client")
+    parser.add_argument('--clients', type=int, nargs='+', default=list(CLIENT_COUNTS),
+                        help="client counts (asyncio server)")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--output', default="e2e_results.json")
+    args = parser.parse_args()
+
+    results = run_mode(SERVER_MODE_THREADED, (1,), args.commands, args.latency, args.port)
+    results += run_mode(SERVER_MODE_ASYNCIO, tuple(args.clients), args.commands,
+                        args.latency, args.port + 1)
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "time": time.time(),
+              "latency": args.latency,
+              "commands_per_client": args.commands,
+              "results": results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
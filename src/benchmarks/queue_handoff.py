@@ -0,0 +1,93 @@
+"""
+Benchmark of the socket server thread -> WAMP event loop handoff.
+
+Compares the original queue.Queue polled with get_nowait() and a
+0.5 ms asyncio.sleep() with the LoopQueue (call_soon_threadsafe),
+measuring the CPU used while idle and the enqueue to dispatch latency.
+"""
+import asyncio
+import queue
+import statistics
+import threading
+import time
+
+from decs_visa_tools.loop_queue import LoopQueue
+
+IDLE_SECONDS = 2.0
+N_MESSAGES = 500
+MESSAGE_INTERVAL = 0.002
+STOP = None
+
+class PolledQueue:
+    """
+    The original queue.Queue / get_nowait() / sleep(0.0005) consumer
+    """
+    def __init__(self) -> None:
+        self._queue = queue.Queue()
+
+    def bind(self) -> None:
+        pass
+
+    def put(self, item: any) -> None:
+        self._queue.put(item)
+
+    async def get(self) -> any:
+        while True:
+            try:
+                return self._queue.get_nowait()
+            except queue.Empty:
+                await asyncio.sleep(0.0005)
+
+async def consume(q, latencies: list) -> None:
+    """
+    The event loop side - record the latency of each timestamped message
+    """
+    q.bind()
+    while (sent := await q.get()) is not STOP:
+        latencies.append(time.perf_counter_ns() - sent)
+
+def produce(q, n_messages: int, delay: float) -> None:
+    """
+    The socket server thread side
+    """
+    time.sleep(delay)
+    for _ in range(n_messages):
+        q.put(time.perf_counter_ns())
+        time.sleep(MESSAGE_INTERVAL)
+    q.put(STOP)
+
+def measure(q, n_messages: int, delay: float) -> tuple:
+    """
+    Run the consumer on an event loop while a thread produces messages,
+    return the CPU time used and the list of latencies
+    """
+    latencies = []
+    producer = threading.Thread(target=produce, args=(q, n_messages, delay))
+    cpu_start = time.process_time()
+    producer.start()
+    asyncio.run(consume(q, latencies))
+    cpu = time.process_time() - cpu_start
+    producer.join()
+    return cpu, latencies
+
+def run(name: str, make_queue) -> None:
+    """
+    Measure idle CPU and dispatch latency for one queue type
+    """
+    idle_cpu, _ = measure(make_queue(), 0, IDLE_SECONDS)
+    _, latencies = measure(make_queue(), N_MESSAGES, 0.1)
+    latencies.sort()
+    p50 = statistics.median(latencies) / 1000
+    p99 = latencies[int(0.99 * (len(latencies) - 1))] / 1000
+    print(f"{name:>11}: idle CPU {100 * idle_cpu / IDLE_SECONDS:6.2f} %"
+          f"  dispatch p50 {p50:8.1f} us  p99 {p99:8.1f} us")
+
+def main():
+    """
+    Run both handoffs
+    """
+    run("polled", PolledQueue)
+    run("LoopQueue", LoopQueue)
+
+if __name__ == "__main__":
+    main()
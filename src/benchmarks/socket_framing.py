@@ -0,0 +1,93 @@
+"""
+Microbenchmark of the socket server message framing.
+
+Compares the original one byte recv() loop with the buffered
+LineReader, counting recv() calls (syscalls) and the time taken
+per command for a batch of commands sent over a local socket pair.
+"""
+import socket
+import threading
+import time
+
+from decs_visa_components.simple_socket_server import LineReader
+from decs_visa_tools.decs_visa_settings import READ_DELIM
+
+N_COMMANDS = 20000
+COMMANDS = ("get_MC_T", "set_MC_T:0.015", "*IDN?", "PUBLISH:[test,message]")
+# the recv(1) loop cannot decode multi-byte characters,
+# so this is only sent to the LineReader
+UTF8_COMMANDS = COMMANDS + ("PUBLISH:[test,T < 10 µK]",)
+
+class CountingSocket:
+    """
+    Thin wrapper that counts the recv() calls made on a socket
+    """
+    def __init__(self, conn: socket.socket) -> None:
+        self.conn = conn
+        self.n_recv = 0
+
+    def recv(self, bufsize: int) -> bytes:
+        self.n_recv += 1
+        return self.conn.recv(bufsize)
+
+def one_byte_reader(conn) -> list:
+    """
+    The original simple_server read loop
+    """
+    msgs = []
+    while True:
+        data = ""
+        while not data.endswith(READ_DELIM):
+            char_byte = conn.recv(1)
+            if not char_byte:
+                return msgs
+            data += char_byte.decode('utf-8')
+        msgs.append(data[:-1])
+
+def line_reader(conn) -> list:
+    """
+    The buffered LineReader
+    """
+    msgs = []
+    reader = LineReader(conn)
+    while (msg := reader.readline()) is not None:
+        msgs.append(msg)
+    return msgs
+
+def run(name: str, read_all, commands: tuple = COMMANDS) -> None:
+    """
+    Send N_COMMANDS commands and time how long it takes to frame them
+    """
+    client, server = socket.socketpair()
+    payload = (READ_DELIM.join(commands[i % len(commands)]
+                               for i in range(N_COMMANDS)) + READ_DELIM).encode('utf-8')
+
+    def send():
+        client.sendall(payload)
+        client.shutdown(socket.SHUT_WR)
+
+    sender = threading.Thread(target=send)
+    counted = CountingSocket(server)
+    start = time.perf_counter()
+    sender.start()
+    msgs = read_all(counted)
+    elapsed = time.perf_counter() - start
+    sender.join()
+    client.close()
+    server.close()
+    assert msgs == [commands[i % len(commands)] for i in range(N_COMMANDS)], \
+        f"{name}: messages incorrectly framed"
+    print(f"{name:>16}: {counted.n_recv / N_COMMANDS:8.3f} recv()/cmd"
+          f" {1e6 * elapsed / N_COMMANDS:8.2f} us/cmd")
+
+def main():
+    """
+    Run both readers
+    """
+    print(f"Framing {N_COMMANDS} commands")
+    run("recv(1)", one_byte_reader)
+    run("LineReader", line_reader)
+    run("LineReader utf-8", line_reader, UTF8_COMMANDS)
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,27 @@ Contains the main DECS<->VISA application.
 
 Starts the simple_socket_server in its own thread and then
 starts the WAMP component - providing each with two queue
-objects for IPC
+objects for IPC.
+
+Alternatively (SERVER_MODE="asyncio") the WAMP component runs
+an asyncio socket server on its own event loop, serving several
+clients at once without the server thread or queues.
+
+With SIMULATOR="true" the WAMP component talks to a simulated
+oi.DECS system rather than the router.
+
+With RECONNECT="true" a lost WAMP session is re-established and
+control re-claimed, without closing the socket server.
+
+With SYSTEMS="FRIDGE1=fridge1.env,..." several oi.DECS systems are
+served from this process, each with its own WAMP session, on the one
+event loop.
 """
+import time
+# start up is timed from here
+STARTED = time.perf_counter()
+
+import asyncio
 import queue
 import threading
 import os
@@ -14,23 +33,70 @@ from sys import version_info
 from dotenv import load_dotenv
 
 from autobahn.asyncio.wamp import ApplicationRunner
+from autobahn.wamp.types import ComponentConfig
 
-from decs_visa_components.simple_socket_server import simple_server
 from decs_visa_components.wamp_component import Component
+from decs_visa_components.wamp_component import run_reconnecting
 from decs_visa_tools.base_logger import logger
+from decs_visa_tools.loop_queue import LoopQueue
+from decs_visa_tools.startup_timer import PhaseTimer
+# the socket server thread, simulator and multi-system modules
+# are only imported if they are used, to keep start up quick
 
 # Import some settings
 from decs_visa_tools.decs_visa_settings import PYTHON_MIN_MAJOR
 from decs_visa_tools.decs_visa_settings import PYTHON_MIN_MINOR
 from decs_visa_tools.decs_visa_settings import SHUTDOWN
+from decs_visa_tools.decs_visa_settings import SERVER_MODE
+from decs_visa_tools.decs_visa_settings import SERVER_MODE_THREADED
+from decs_visa_tools.decs_visa_settings import SERVER_MODE_ASYNCIO
+from decs_visa_tools.decs_visa_settings import SIMULATOR
+from decs_visa_tools.decs_visa_settings import SIMULATOR_LATENCY
+from decs_visa_tools.decs_visa_settings import SIMULATOR_JITTER
+from decs_visa_tools.decs_visa_settings import RECONNECT
 # and the path to the system settings .env file
 from decs_visa_tools.decs_visa_settings import DOT_ENV_PATH
 
+def stop_socket_server(responses: queue.Queue | None) -> None:
+    """
+    Ask the socket server thread (if there is one) to close
+    """
+    if responses is not None:
+        # Will cause the socket server to
+        # close so the thread can join() below
+        # (the WAMP component may have already
+        # asked it to - a second SHUTDOWN is
+        # harmless once it has closed)
+        responses.put(SHUTDOWN)
+
+def run_several_systems(systems: str, interface: str | None, port: str | None) -> None:
+    """
+    Serve the systems in SYSTEMS from this process - the socket
+    servers all run on the WAMP event loop
+    """
+    from decs_visa_components.multi_system import load_profiles, run_systems
+    try:
+        assert isinstance(interface,
+                          str), f"Failed to read BIND_SERVER_TO_INTERFACE from .env {DOT_ENV_PATH}"
+        profiles = load_profiles(systems, os.path.dirname(DOT_ENV_PATH))
+    except (AssertionError, ValueError) as e:
+        logger.info(e)
+        logger.info("Abort and exit 1")
+        sys.exit(1)
+    try:
+        asyncio.run(run_systems(profiles, interface, port))
+    except KeyboardInterrupt:
+        logger.info("Keyboard Interrupt - shutdown")
+    logger.info("DECS<->VISA stopped")
+    sys.exit(0)
+
 def main():
     """
     The application loop
     """
     logger.info('DECS<->VISA start up')
+    startup_timer = PhaseTimer("Start up", STARTED)
+    startup_timer.mark("imports")
 
     # Read in user / router / server details
     print(f"load_dotenv from: {DOT_ENV_PATH}")
@@ -43,48 +109,90 @@ def main():
     realm =        os.getenv("WAMP_REALM")
     interface =    os.getenv("BIND_SERVER_TO_INTERFACE")
     port =         os.getenv("SERVER_PORT")
+    server_mode =  os.getenv("SERVER_MODE", SERVER_MODE)
+    simulator =    os.getenv("SIMULATOR", str(SIMULATOR)).lower() == "true"
+    reconnect =    os.getenv("RECONNECT", str(RECONNECT)).lower() == "true"
+    systems =      os.getenv("SYSTEMS")
+
+    if systems:
+        # several systems, each with its own profile
+        run_several_systems(systems, interface, port)
+        return
 
     try:
         assert isinstance(user,
                           str), f"Failed to read WAMP_USER from .env {DOT_ENV_PATH}"
-        assert isinstance(user_secret,
+        # the router details aren't needed by the simulator
+        assert simulator or isinstance(user_secret,
                           str), f"Failed to read WAMP_USER_SECRET from .env {DOT_ENV_PATH}"
-        assert isinstance(url,
+        assert simulator or isinstance(url,
                           str), f"Failed to read WAMP_ROUTER_URL from .env {DOT_ENV_PATH}"
-        assert isinstance(realm,
+        assert simulator or isinstance(realm,
                           str), f"Failed to read WAMP_REALM from .env {DOT_ENV_PATH}"
         assert isinstance(interface,
                           str), f"Failed to read BIND_SERVER_TO_INTERFACE from .env {DOT_ENV_PATH}"
         assert isinstance(port,
                           str), f"Failed to read SERVER_PORT from .env {DOT_ENV_PATH}"
+        assert server_mode in (SERVER_MODE_THREADED,
+                               SERVER_MODE_ASYNCIO), f"Unknown SERVER_MODE: {server_mode}"
     except AssertionError as e:
         logger.info(e)
         # we know we don't have the info to run, so as this cannot work
         logger.info("Abort and exit 1")
         sys.exit(1)
+    startup_timer.mark("settings")
 
-    # Create the shared queues and launch socket server thread
-    queries = queue.Queue(maxsize=1)
-    responses = queue.Queue(maxsize=1)
-
-    # Start the socket server thread
-    server_thread = threading.Thread(target = simple_server,
-                                     args =(interface, port, queries, responses, ))
-    server_thread.start()
-
-    # Start the WAMP session
-    runner = ApplicationRunner(url, realm, extra=dict(
-                                            input_queue=queries,
-                                            output_queue=responses,
-                                            user_name=user,
-                                            user_secret=user_secret))
+    queries = None
+    responses = None
+    server_thread = None
+    if server_mode == SERVER_MODE_THREADED:
+        from decs_visa_components.simple_socket_server import simple_server
+        # Create the shared queues and launch socket server thread
+        # queries wake the WAMP event loop as they are queued
+        queries = LoopQueue()
+        # unbounded, so the event loop never waits on a slow client
+        responses = queue.Queue()
+
+        # Start the socket server thread
+        server_thread = threading.Thread(target = simple_server,
+                                         args =(interface, port, queries, responses, ))
+        server_thread.start()
+    else:
+        logger.info("Socket server will run on the WAMP event loop")
+
+    extra = dict(input_queue=queries,
+                 output_queue=responses,
+                 server_mode=server_mode,
+                 interface=interface,
+                 server_port=port,
+                 user_name=user,
+                 user_secret=user_secret,
+                 startup_timer=startup_timer)
     try:
-        # Run the WAMP component
-        # ideally disable logging from autobahn
-        # but that doesn't quite work...
-        runner.run(Component, log_level='critical')
-        # if running in a linux terminal you could always
-        # python3 ./decs_visa.py > /dev/null
+        if simulator:
+            # No WAMP session - run the component against the
+            # simulated system as though it had just joined
+            logger.info("Running against the oi.DECS simulator")
+            from decs_visa_tools.simulator import DecsSimulator
+            extra['backend'] = DecsSimulator(SIMULATOR_LATENCY, SIMULATOR_JITTER, user)
+            asyncio.run(Component(ComponentConfig(realm, extra=extra)).onJoin(None))
+            # no onDisconnect to close the socket server
+            stop_socket_server(responses)
+        elif reconnect:
+            # Resilient mode - WAMP sessions come and go
+            # while the socket server carries on
+            logger.info("Resilient mode - the WAMP session will be re-established if lost")
+            asyncio.run(run_reconnecting(url, realm, extra))
+            stop_socket_server(responses)
+        else:
+            # Start the WAMP session
+            runner = ApplicationRunner(url, realm, extra=extra)
+            # Run the WAMP component
+            # ideally disable logging from autobahn
+            # but that doesn't quite work...
+            runner.run(Component, log_level='critical')
+            # if running in a linux terminal you could always
+            # python3 ./decs_visa.py > /dev/null
     # Some WAMP methods raise at the Exception level
     except (KeyboardInterrupt, Exception) as e:
         # Catch keyboard / kernel interrupt here.
@@ -95,19 +203,10 @@ def main():
             logger.info("Keyboard Interrupt - shutdown")
         else:
             logger.info("WAMP component error: %s", e)
-        try:
-            # WAMP component may have requested
-            # the socket server to close on exit
-            # unless the WAMP connection was never
-            # established, so just in case
-            _ = responses.get_nowait()
-        except queue.Empty:
-            pass
-        # Will cause the socket server to
-        # close so the thread can join() below
-        responses.put(SHUTDOWN)
+        stop_socket_server(responses)
 
-    server_thread.join()
+    if server_thread is not None:
+        server_thread.join()
     logger.info("DECS<->VISA stopped")
     sys.exit(0)
 
@@ -0,0 +1,144 @@
+"""
+An asyncio implementation of the TCP/IP socket server
+
+Runs on the same event loop as the WAMP component and can
+serve several client connections concurrently - each client
+message is passed straight to the WAMP message handler.
+"""
+import asyncio
+import functools
+
+from decs_visa_components.client_connection import ClientConnection
+from decs_visa_components.request_pipeline import RequestPipeline
+from decs_visa_tools.base_logger import logger
+from decs_visa_tools.tracer import TRACER
+from decs_visa_tools.metrics import METRICS
+from decs_visa_tools.socket_messages import format_message
+
+# response read delimiter
+from decs_visa_tools.decs_visa_settings import READ_DELIM
+# shutdown message
+from decs_visa_tools.decs_visa_settings import SHUTDOWN
+# number of messages that can be waiting for a response
+from decs_visa_tools.decs_visa_settings import PIPELINE_DEPTH
+# bytes waiting to be sent above which pushed lines are dropped
+from decs_visa_tools.decs_visa_settings import STREAM_MAX_BUFFERED
+
+async def async_server(interface: str, server_port: int, handler, can_overlap,
+                       shutdown: asyncio.Event | None = None, coalesce=None) -> None:
+    """
+    The asyncio server - returns once a shutdown has been
+    requested by a client, or a WAMP error has occurred.
+
+    handler is a coroutine function taking the client message (and
+    the ClientConnection as client=) and returning the response, it
+    raises on WAMP level errors.
+    can_overlap(message) decides whether a pipelined message can
+    be processed concurrently with the messages around it.
+    Servers sharing a shutdown event all close together.
+    coalesce(message) gives the (key, window) of writes that can be
+    replaced by a later one (see RequestPipeline), None otherwise.
+    """
+    server_port = int(server_port)
+    delim = READ_DELIM.encode('utf-8')
+    shutdown = asyncio.Event() if shutdown is None else shutdown
+    # client connection writer -> task
+    clients = {}
+
+    async def send_responses(writer: asyncio.StreamWriter, replies: asyncio.Queue,
+                             window: asyncio.Semaphore) -> None:
+        # return the responses in the order the messages were received
+        while (item := await replies.get()) is not None:
+            task, trace = item
+            try:
+                resp = await task
+            except Exception as e:
+                # This is a WAMP level error - probably
+                # nothing we can do to fix this, so
+                logger.info("WAMP error: %s", e)
+                shutdown.set()
+                # don't leave the reader waiting for a response slot
+                window.release()
+                return
+            logger.debug("Socket server Sending: %s", resp)
+            msg = format_message(resp)
+            writer.write(msg)
+            await writer.drain()
+            if METRICS is not None:
+                METRICS.bytes_out += len(msg)
+            if trace is not None:
+                TRACER.finish(trace)
+            window.release()
+
+    async def handle_client(reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        addr = writer.get_extra_info('peername')
+        logger.info("Server connection: %s", str(addr))
+        clients[writer] = asyncio.current_task()
+        client = ClientConnection(
+            lambda line: writer.write(format_message(line)),
+            lambda: writer.transport.get_write_buffer_size() >= STREAM_MAX_BUFFERED)
+        pipeline = RequestPipeline(functools.partial(handler, client=client), can_overlap,
+                                   coalesce)
+        replies = asyncio.Queue()
+        # up to PIPELINE_DEPTH messages can be waiting for a response
+        window = asyncio.Semaphore(PIPELINE_DEPTH)
+        responder = asyncio.ensure_future(send_responses(writer, replies, window))
+        try:
+            while not shutdown.is_set() and not responder.done():
+                try:
+                    data = await reader.readuntil(delim)
+                except asyncio.IncompleteReadError:
+                    logger.info("Client disconnected: %s", str(addr))
+                    break
+                if METRICS is not None:
+                    METRICS.bytes_in += len(data)
+                    METRICS.queued(replies.qsize())
+                msg = data[:-len(delim)].decode('utf-8', errors='replace')
+                logger.debug("Socket server received: \"%s\"", msg)
+                if msg == SHUTDOWN: # shutdown request from user
+                    shutdown.set()
+                    break
+                await window.acquire()
+                if responder.done():
+                    break
+                if TRACER is not None:
+                    msg = TRACER.start(msg)
+                replies.put_nowait((await pipeline.submit(msg), getattr(msg, 'trace', None)))
+            if not shutdown.is_set() and not responder.done():
+                # send any outstanding responses
+                replies.put_nowait(None)
+                await responder
+        except (asyncio.LimitOverrunError, ConnectionError) as e:
+            logger.info("Client connection error: %s", e)
+        finally:
+            responder.cancel()
+            pipeline.cancel()
+            client.close()
+            clients.pop(writer, None)
+            writer.close()
+
+    try:
+        # Interface that the server will accept connections from.
+        # Can be restricted to 'localhost' (i.e. this machine) as an added security
+        # feature, or change to "" if you want to accept general network traffic.
+        server = await asyncio.start_server(handle_client, interface, server_port,
+                                            reuse_address=True)
+    except OSError as e:
+        logger.info('Unable to bind socket server: %s', e)
+        return
+    logger.info("Server listening: %s:%s", interface, str(server_port))
+
+    async with server:
+        await shutdown.wait()
+        logger.info("Socket server shutting down")
+        # let any connected clients know the server is going away
+        tasks = list(clients.values())
+        for writer in list(clients):
+            try:
+                writer.write(format_message(SHUTDOWN))
+                writer.close()
+            except ConnectionError:
+                pass
+        if tasks:
+            await asyncio.wait(tasks, timeout=1)
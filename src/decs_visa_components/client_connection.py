@@ -0,0 +1,58 @@
+"""
+State held for each socket server client connection
+"""
+import asyncio
+
+from decs_visa_tools.base_logger import logger
+from decs_visa_tools.metrics import METRICS
+
+class ClientConnection:
+    """
+    A socket server client connection, as seen by the
+    WAMP component.
+
+    send(line) hands a pushed line to the socket server without
+    blocking, congested() is True while the client is too far
+    behind to take another.
+    binary is True if the client has asked for bulk responses
+    as binary blocks (FORMAT:BINARY).
+    """
+    def __init__(self, send, congested=None) -> None:
+        self.send = send
+        self.congested = congested
+        self.streams = set()
+        self.binary = False
+        # pushed lines dropped as the client was too far behind
+        self.dropped = 0
+
+    def push(self, line: str) -> None:
+        """
+        Send a line to the client outside of the normal message /
+        response sequence (e.g. streamed values) - dropped rather
+        than waiting if the client isn't keeping up
+        """
+        if self.congested is not None and self.congested():
+            self.dropped += 1
+            if METRICS is not None:
+                METRICS.stream_drops += 1
+            return
+        self.send(line)
+
+    def add_stream(self, task: asyncio.Task) -> None:
+        """
+        Keep track of a task streaming to this client
+        """
+        self.streams.add(task)
+        task.add_done_callback(self.streams.discard)
+
+    def close(self) -> None:
+        """
+        Stop anything streaming to this client, and return
+        to the default response format for the next client
+        """
+        for task in list(self.streams):
+            task.cancel()
+        if self.dropped:
+            logger.info("Pushed lines dropped for a slow client: %d", self.dropped)
+            self.dropped = 0
+        self.binary = False
@@ -0,0 +1,44 @@
+"""
+A minimal HTTP endpoint serving the runtime metrics in the
+Prometheus text format - runs on the WAMP component event loop
+until cancelled
+"""
+import asyncio
+
+from decs_visa_tools.base_logger import logger
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+async def metrics_server(interface: str, port: int, render) -> None:
+    """
+    Serve render() (the metrics as Prometheus text) to any
+    GET request, until the task is cancelled
+    """
+    async def handle_request(reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            method = request.split(b" ", 1)[0]
+            if method == b"GET":
+                body = render().encode('utf-8')
+                header = (f"HTTP/1.0 200 OK\r\nContent-Type: {PROMETHEUS_CONTENT_TYPE}\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n")
+            else:
+                body = b""
+                header = "HTTP/1.0 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n"
+            writer.write(header.encode('ascii') + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError) as e:
+            logger.debug("Metrics request failed: %s", e)
+        finally:
+            writer.close()
+
+    try:
+        server = await asyncio.start_server(handle_request, interface, port,
+                                            reuse_address=True)
+    except OSError as e:
+        logger.info("Unable to bind metrics server: %s", e)
+        return
+    logger.info("Metrics available at http://%s:%s/metrics", interface, str(port))
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,265 @@
+"""
+Serves several oi.DECS systems from one process - one WAMP Component
+(and session) per system, all on the same event loop.
+
+Each system can be served on its own port (SERVER_PORT in its
+profile), and every system is served on the shared port, where
+messages are routed by a system prefix, e.g. FRIDGE2/get_MC_T
+(messages without a prefix go to the first system).
+"""
+import asyncio
+import collections
+import os
+from typing import NamedTuple
+
+from dotenv import dotenv_values
+
+from autobahn.wamp.types import ComponentConfig
+
+from decs_visa_components.async_socket_server import async_server
+from decs_visa_components.client_connection import ClientConnection
+from decs_visa_components.metrics_server import metrics_server
+from decs_visa_components.wamp_component import Component, stay_connected
+from decs_visa_tools.base_logger import logger
+from decs_visa_tools.binary_block import definite_length_block, text_to_floats
+from decs_visa_tools.command_dictionary import SYSTEM_TYPES
+from decs_visa_tools.command_parser import system_commands, DEFAULT_SYSTEM_TYPE
+from decs_visa_tools.metrics import METRICS
+from decs_visa_tools.simulator import DecsSimulator
+from decs_visa_tools.tracer import TracedLine
+
+# socket server mode
+from decs_visa_tools.decs_visa_settings import SERVER_MODE_ASYNCIO
+# multi-get request prefix and response delimiter
+from decs_visa_tools.decs_visa_settings import MGET
+from decs_visa_tools.decs_visa_settings import MGET_DELIM
+# system prefix delimiter
+from decs_visa_tools.decs_visa_settings import SYSTEM_DELIM
+# background recorder
+from decs_visa_tools.decs_visa_settings import RECORDER
+from decs_visa_tools.decs_visa_settings import ARCHIVE_PATH
+# runtime metrics
+from decs_visa_tools.decs_visa_settings import METRICS_INTERFACE
+from decs_visa_tools.decs_visa_settings import METRICS_PORT
+# offline simulator
+from decs_visa_tools.decs_visa_settings import SIMULATOR_LATENCY
+from decs_visa_tools.decs_visa_settings import SIMULATOR_JITTER
+
+class SystemProfile(NamedTuple):
+    """
+    The details of one system, from its profile .env file
+    """
+    name: str
+    user: str
+    user_secret: str | None
+    url: str | None
+    realm: str | None
+    server_port: str | None
+    system_type: str
+    simulator: bool
+
+    @classmethod
+    def from_env(cls, name: str, values: dict) -> "SystemProfile":
+        """
+        Build the profile from the values read from its .env file
+        """
+        simulator = str(values.get("SIMULATOR", "false")).lower() == "true"
+        profile = cls(name, values.get("WAMP_USER"), values.get("WAMP_USER_SECRET"),
+                      values.get("WAMP_ROUTER_URL"), values.get("WAMP_REALM"),
+                      values.get("SERVER_PORT"),
+                      values.get("SYSTEM_TYPE", DEFAULT_SYSTEM_TYPE), simulator)
+        try:
+            assert isinstance(profile.user, str), f"{name}: no WAMP_USER in profile"
+            # the router details aren't needed by the simulator
+            assert simulator or isinstance(profile.user_secret,
+                                           str), f"{name}: no WAMP_USER_SECRET in profile"
+            assert simulator or isinstance(profile.url,
+                                           str), f"{name}: no WAMP_ROUTER_URL in profile"
+            assert simulator or isinstance(profile.realm,
+                                           str), f"{name}: no WAMP_REALM in profile"
+            assert profile.system_type in SYSTEM_TYPES, \
+                f"{name}: unknown SYSTEM_TYPE {profile.system_type}"
+        except AssertionError as e:
+            raise ValueError(e) from e
+        return profile
+
+def load_profiles(systems: str, base_path: str) -> list:
+    """
+    The SystemProfiles for SYSTEMS - name=profile.env items, delimited
+    by commas, with the profile paths relative to base_path
+    """
+    profiles = []
+    for item in systems.split(','):
+        name, _, path = item.partition('=')
+        name = name.strip()
+        path = os.path.join(base_path, path.strip())
+        try:
+            assert name and SYSTEM_DELIM not in name, f"Bad system name: {item}"
+            assert name not in [profile.name for profile in profiles], \
+                f"System named twice: {name}"
+            assert os.path.isfile(path), f"System profile not found: {path}"
+        except AssertionError as e:
+            raise ValueError(e) from e
+        profiles.append(SystemProfile.from_env(name, dotenv_values(path)))
+    return profiles
+
+class SystemRouter:
+    """
+    Routes the messages on the shared port to the Component of
+    the system in their prefix (the first system if there isn't one)
+    """
+    def __init__(self, components: dict) -> None:
+        self.components = components
+        self.default = next(iter(components.values()))
+
+    def route(self, data: str) -> tuple:
+        """
+        The Component for a message, and the message without its prefix
+        """
+        system, delim, message = data.partition(SYSTEM_DELIM)
+        component = self.components.get(system.strip()) if delim else None
+        if component is None:
+            return self.default, data
+        trace = getattr(data, 'trace', None)
+        if trace is not None:
+            message = TracedLine(message)
+            message.trace = trace
+        return component, message
+
+    def can_overlap(self, data: str) -> bool:
+        """
+        As decided by the system's Component
+        """
+        if data.upper().startswith(MGET):
+            return True
+        component, message = self.route(data)
+        return component.can_overlap(message)
+
+    def coalesce_set(self, data: str) -> tuple | None:
+        """
+        As decided by the system's Component - keyed by the
+        Component too, as systems can share uris
+        """
+        component, message = self.route(data)
+        coalesce = component.coalesce_set(message)
+        if coalesce is None:
+            return None
+        uri, window = coalesce
+        return (component, uri), window
+
+    async def process_message(self, data: str, client: ClientConnection = None) -> any:
+        """
+        Pass the message to the system's Component - an MGET can
+        request values from several systems
+        """
+        if data.upper().startswith(MGET):
+            return await self.process_multi_get(data, client)
+        component, message = self.route(data)
+        return await component.process_message(message, client)
+
+    async def process_multi_get(self, data: str, client: ClientConnection = None) -> str | bytes:
+        """
+        Process a MGET:FRIDGE1/get_A,FRIDGE2/get_B,... request - the
+        aliases of each system are requested as a single MGET to that
+        system, and the systems are requested concurrently
+        """
+        routed = [self.route(alias.strip()) for alias in data[len(MGET):].split(',')]
+        batches = collections.defaultdict(list)
+        for i, (component, _) in enumerate(routed):
+            batches[component].append(i)
+        resps = await asyncio.gather(*(
+            component.process_message(MGET + ','.join(routed[i][1] for i in indices))
+            for component, indices in batches.items()))
+        values = [""] * len(routed)
+        for indices, resp in zip(batches.values(), resps):
+            if isinstance(resp, str):
+                parts = resp.split(MGET_DELIM)
+            else:
+                # the whole batch failed
+                parts = [str(resp)] * len(indices)
+            for i, value in zip(indices, parts):
+                values[i] = value
+        if client is not None and client.binary:
+            return definite_length_block([x for value in values for x in text_to_floats(value)])
+        return MGET_DELIM.join(values)
+
+    def prometheus_stats(self) -> str:
+        """
+        The runtime metrics, with the counters of every system
+        """
+        counters = collections.Counter()
+        for component in self.components.values():
+            counters.update(component.stats_counters())
+        return METRICS.prometheus(dict(counters))
+
+def system_component(profile: SystemProfile, interface: str) -> Component:
+    """
+    A resilient mode Component for the system, with its
+    own command table, archive and (optional) simulator
+    """
+    extra = dict(input_queue=None,
+                 output_queue=None,
+                 server_mode=SERVER_MODE_ASYNCIO,
+                 interface=interface,
+                 server_port=profile.server_port,
+                 user_name=profile.user,
+                 user_secret=profile.user_secret,
+                 reconnect=True,
+                 commands=system_commands(profile.system_type),
+                 archive_path=os.path.join(ARCHIVE_PATH, profile.name))
+    if profile.simulator:
+        extra['backend'] = DecsSimulator(SIMULATOR_LATENCY, SIMULATOR_JITTER, profile.user,
+                                         host_name=profile.name)
+    return Component(ComponentConfig(profile.realm or profile.name, extra=extra))
+
+async def run_systems(profiles: list, interface: str, port: str | None) -> None:
+    """
+    Run a Component for each system, serving each on its own port
+    (if it has one) and all of them on the shared port, until a client
+    requests a shutdown.  A system that loses its router is
+    reconnected without affecting the others
+    """
+    components = {profile.name: system_component(profile, interface) for profile in profiles}
+    router = SystemRouter(components)
+    # a SHUTDOWN on any port closes every server
+    shutdown = asyncio.Event()
+    servers = []
+    if port:
+        servers.append(async_server(interface, port, router.process_message,
+                                    router.can_overlap, shutdown, router.coalesce_set))
+    for profile in profiles:
+        if profile.server_port:
+            component = components[profile.name]
+            servers.append(async_server(interface, profile.server_port, component.process_message,
+                                        component.can_overlap, shutdown, component.coalesce_set))
+    if not servers:
+        logger.info("No SERVER_PORT for any system - nothing to serve")
+        return
+
+    # the sessions are kept until the servers have closed
+    closed = asyncio.get_running_loop().create_future()
+    sessions = []
+    for profile in profiles:
+        component = components[profile.name]
+        if profile.simulator:
+            # no router - 'join' once
+            sessions.append(asyncio.ensure_future(component.rejoin()))
+        else:
+            sessions.append(asyncio.ensure_future(
+                stay_connected(component, profile.url, profile.realm, closed)))
+    background = []
+    if RECORDER:
+        background += [asyncio.ensure_future(component.record_values())
+                       for component in components.values()]
+    if METRICS is not None and METRICS_PORT:
+        background.append(asyncio.ensure_future(
+            metrics_server(METRICS_INTERFACE, METRICS_PORT, router.prometheus_stats)))
+    logger.info("Serving %d systems: %s", len(components), ", ".join(components))
+
+    await asyncio.gather(*servers)
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*(component.close_session() for component in components.values()
+                           if component.session_ready.is_set()))
+    closed.set_result(None)
+    await asyncio.gather(*sessions, return_exceptions=True)
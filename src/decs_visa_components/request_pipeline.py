@@ -0,0 +1,123 @@
+"""
+Dispatch of pipelined client messages to the WAMP component
+"""
+import asyncio
+
+# reply to a held write replaced by a later one
+from decs_visa_tools.decs_visa_settings import SUPERSEDED
+
+class RequestPipeline:
+    """
+    Starts processing each message from one client connection
+    as soon as it arrives.
+
+    Messages that can overlap (get_ requests) run concurrently,
+    anything else waits for all earlier messages to complete and
+    then completes before the next message is started - so a get_
+    always sees the result of an earlier set_.  The caller returns
+    the responses in order by awaiting the tasks in turn.
+
+    Writes that coalesce(message) gives a (key, window) for are held
+    for up to window seconds, a later write with the same key replaces
+    one still held (which is answered with SUPERSEDED).  The window is
+    timed from the first write held for the key and isn't restarted by
+    a replacement, so a steady stream of writes is still sent every
+    window seconds.  Any other message sends the held writes first.
+    """
+    def __init__(self, handler, can_overlap, coalesce=None) -> None:
+        self._handler = handler
+        self._can_overlap = can_overlap
+        self._coalesce = coalesce
+        self._in_flight = set()
+        # held writes that have been sent, and are still in flight
+        self._writes = set()
+        # key -> (message, future for its response, window timer)
+        self._held = {}
+
+    async def submit(self, data: str) -> asyncio.Future:
+        """
+        Start processing a message, returns the task (or future)
+        that will hold the response
+        """
+        coalesce = self._coalesce(data) if self._coalesce is not None else None
+        if coalesce is not None:
+            return await self._hold(data, *coalesce)
+        self._send_held()
+        if self._can_overlap(data):
+            if self._writes:
+                # a get_ sees the result of the writes sent before it
+                await asyncio.wait(self._writes)
+            return self._start(data)
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+        task = asyncio.ensure_future(self._handler(data))
+        await asyncio.wait({task})
+        return task
+
+    async def _hold(self, data: str, key, window: float) -> asyncio.Future:
+        """
+        Hold a write for its window, replacing an earlier write with
+        the same key that is still held (and keeping its timer)
+        """
+        loop = asyncio.get_running_loop()
+        held = self._held.pop(key, None)
+        if held is not None:
+            _, replaced, timer = held
+            replaced.set_result(SUPERSEDED)
+        else:
+            if self._in_flight:
+                await asyncio.wait(self._in_flight)
+            timer = loop.call_later(window, self._send, key)
+        response = loop.create_future()
+        self._held[key] = (data, response, timer)
+        return response
+
+    def _send(self, key) -> None:
+        """
+        Send a held write, its response is passed on to the held future
+        """
+        data, response, timer = self._held.pop(key)
+        timer.cancel()
+        task = self._start(data)
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        def done(task, response=response):
+            if response.done():
+                # cancelled - but don't leave an error unretrieved
+                if not task.cancelled():
+                    task.exception()
+                return
+            if task.cancelled():
+                response.cancel()
+            elif task.exception() is not None:
+                response.set_exception(task.exception())
+            else:
+                response.set_result(task.result())
+        task.add_done_callback(done)
+
+    def _send_held(self) -> None:
+        """
+        Send every held write now, in the order they were held
+        """
+        for key in list(self._held):
+            self._send(key)
+
+    def _start(self, data: str) -> asyncio.Task:
+        """
+        Start handling a message, tracked until it completes
+        """
+        task = asyncio.ensure_future(self._handler(data))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return task
+
+    def cancel(self) -> None:
+        """
+        Cancel any messages still being processed or held
+        """
+        for _, response, timer in self._held.values():
+            timer.cancel()
+            response.cancel()
+        self._held.clear()
+        for task in list(self._in_flight):
+            task.cancel()
@@ -3,15 +3,24 @@ A basing implemention of a TCP/IP socket server
 """
 import socket
 import queue
+import threading
+from collections import deque
 
 from decs_visa_tools.base_logger import logger
+from decs_visa_tools.loop_queue import LoopQueue
+from decs_visa_tools.tracer import TRACER
+from decs_visa_tools.metrics import METRICS
+from decs_visa_tools.socket_messages import StreamLine, format_message
+from decs_visa_tools.socket_messages import CLIENT_DISCONNECTED, CONNECTION_CLOSED
 
 # response read delimiter
 from decs_visa_tools.decs_visa_settings import READ_DELIM
-# response write delimiter
-from decs_visa_tools.decs_visa_settings import WRITE_DELIM
 # shutdown message
 from decs_visa_tools.decs_visa_settings import SHUTDOWN
+# socket receive buffer size
+from decs_visa_tools.decs_visa_settings import RECV_CHUNK_SIZE
+# number of messages that can be waiting for a response
+from decs_visa_tools.decs_visa_settings import PIPELINE_DEPTH
 
 def parse_data(data: str) -> str:
     """
@@ -23,15 +32,152 @@ def parse_data(data: str) -> str:
     else:
         return data
 
-def format_message(resp: str) -> bytes:
+class LineReader:
     """
-    Utility function to add a delimiter and
-    utf-8 encode a WAMP response for sending
+    Buffered reader that frames the bytes received on a
+    socket connection into READ_DELIM delimited messages.
+
+    Data is read in chunks of up to RECV_CHUNK_SIZE bytes,
+    any partial message is kept until the rest arrives.
+    Splitting is done on the raw bytes before decoding, so
+    multi-byte utf-8 characters split across chunks are
+    decoded correctly.
+    """
+    def __init__(self, conn: socket.socket,
+                 delim: str = READ_DELIM,
+                 chunk_size: int = RECV_CHUNK_SIZE) -> None:
+        self._conn = conn
+        self._delim = delim.encode('utf-8')
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._lines = deque()
+
+    def readline(self) -> str | None:
+        """
+        Return the next message (without the delimiter),
+        or None if the client has disconnected
+        """
+        while not self._lines:
+            chunk = self._conn.recv(self._chunk_size)
+            if not chunk:
+                return None
+            if METRICS is not None:
+                METRICS.bytes_in += len(chunk)
+            # only search the new data (plus enough of the
+            # old data to catch a delimiter split across chunks)
+            start = max(0, len(self._buffer) - len(self._delim) + 1)
+            self._buffer += chunk
+            if self._buffer.find(self._delim, start) >= 0:
+                *lines, rest = self._buffer.split(self._delim)
+                self._lines.extend(lines)
+                self._buffer = bytearray(rest)
+        return self._lines.popleft().decode('utf-8', errors='replace')
+
+def send_responses(conn: socket.socket, r: queue.Queue,
+                   window: threading.Semaphore, closing: threading.Event,
+                   traces: deque) -> None:
+    """
+    Return the WAMP responses to the client, in the order the
+    messages were received, until the connection is closed
+    (traces holds the Traces of the messages awaiting a response,
+    if tracing is enabled)
+    """
+    connected = True
+    while True:
+        resp = r.get(block=True, timeout=None)
+        if resp is CONNECTION_CLOSED:
+            return
+        streamed = isinstance(resp, StreamLine)
+        if connected:
+            logger.debug("Socket server Sending: %s", resp)
+            try:
+                msg = format_message(resp)
+                conn.sendall(msg)
+                if METRICS is not None:
+                    METRICS.bytes_out += len(msg)
+            except OSError as e:
+                # client has gone - any outstanding responses
+                # are still read, so they aren't sent to the
+                # next client
+                logger.info("Unable to send response: %s", e)
+                connected = False
+        if resp == SHUTDOWN: # shutdown request as a result of a WAMP error
+            closing.set()
+            # wake the reader if it is waiting for the client
+            try:
+                conn.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+            return
+        if not streamed:
+            if traces:
+                TRACER.finish(traces.popleft())
+            window.release()
+
+def serve_connection(conn: socket.socket, q: LoopQueue, r: queue.Queue) -> bool:
     """
-    msg = str(resp)+WRITE_DELIM
-    return msg.encode('utf-8')
+    Pass the messages from a client connection to the WAMP queue,
+    returns False if the server should shut down.
+
+    Up to PIPELINE_DEPTH messages can be waiting for a response, so
+    clients can write several commands before reading the responses.
+    With PIPELINE_DEPTH = 1 each message must be answered before the
+    next is read (lock-step).
+    """
+    can_run = True
+    reader = LineReader(conn)
+    window = threading.Semaphore(PIPELINE_DEPTH)
+    closing = threading.Event()
+    traces = deque()
+    writer = threading.Thread(target=send_responses, args=(conn, r, window, closing, traces))
+    writer.start()
+
+    def acquire_window() -> bool:
+        # wait for a response slot, unless a WAMP error closes the server
+        while not window.acquire(timeout=1):
+            if closing.is_set():
+                return False
+        return True
+
+    while can_run:
+        # Read one command at a time...
+        try:
+            msg = reader.readline()
+        except OSError as e:
+            logger.info("Client connection error: %s", e)
+            msg = None
+        if closing.is_set():
+            can_run = False
+            break
+        if msg is None:
+            logger.info("Client disconnected")
+            break
+        logger.debug("Socket server received: \"%s\"", msg)
+        if msg == SHUTDOWN: # shutdown request from user
+            q.put(msg)
+            can_run = False
+            break
+        if not acquire_window():
+            can_run = False
+            break
+        if TRACER is not None:
+            msg = TRACER.start(msg)
+            traces.append(msg.trace)
+        # Add message to the WAMP queue for processing
+        q.put(msg)
+
+    if can_run:
+        # the WAMP component replies with CONNECTION_CLOSED once any
+        # outstanding responses have been sent and streaming stopped
+        q.put(CLIENT_DISCONNECTED)
+    elif writer.is_alive():
+        r.put(CONNECTION_CLOSED)
+    writer.join()
+    if closing.is_set():
+        can_run = False
+    return can_run
 
-def simple_server(interface: str, server_port: int, q: queue.Queue, r: queue.Queue) -> None:
+def simple_server(interface: str, server_port: int, q: LoopQueue, r: queue.Queue) -> None:
     """
     The simple server
     """
@@ -75,34 +221,7 @@ def simple_server(interface: str, server_port: int, q: queue.Queue, r: queue.Que
         else:
             with conn:
                 logger.info("Server connection: %s", str(addr))
-                while can_run:
-                    data = ""
-                    # Read one command at a time...
-                    while not data.endswith(READ_DELIM):
-                        char_byte = conn.recv(1)
-                        if not char_byte:
-                            logger.info("Client disconnected")
-                            data = None
-                            break
-                        char = char_byte.decode('utf-8')
-                        data += char
-                    if data is None:
-                        break
-                    msg = parse_data(data)
-                    logger.debug("Socket server received: \"%s\"", msg)
-                    # Add message to the WAMP queue for processing
-                    q.put(msg)
-                    if msg == SHUTDOWN: # shutdown request from user
-                        can_run = False
-                        break
-                    # This will now block until WAMP call is processed...
-                    resp = r.get(block=True, timeout=None)
-                    logger.debug("Socket server Sending: %s", (str(resp)))
-                    # Return the response to the client
-                    conn.sendall(format_message(resp)) # - could throw?
-                    if resp == SHUTDOWN: # shutdown request as a result of a WAMP error
-                        can_run = False
-                        break
+                can_run = serve_connection(conn, q, r)
 
     logger.info("Socket server shutting down")
     simple_socket_server.close()
@@ -2,21 +2,116 @@
 The WAMP portion of the DECS<->VISA implementation
 """
 import asyncio
+import functools
+import os
 import queue
+import time
 
 from autobahn.asyncio.wamp import ApplicationSession
+from autobahn.asyncio.wamp import ApplicationRunner
 from autobahn.wamp import exception as wamp_exceptions
 from autobahn.wamp import auth
 from autobahn.wamp.message import Welcome
 from autobahn.wamp.types import CloseDetails
 from autobahn.wamp.types import CallResult
+from autobahn.wamp.types import ComponentConfig
 
+from decs_visa_components.async_socket_server import async_server
+from decs_visa_components.client_connection import ClientConnection
+from decs_visa_components.request_pipeline import RequestPipeline
+from decs_visa_components.metrics_server import metrics_server
 from decs_visa_tools.base_logger import logger
+from decs_visa_tools.loop_queue import LoopQueue
+from decs_visa_tools.socket_messages import StreamLine
+from decs_visa_tools.socket_messages import CLIENT_DISCONNECTED
+from decs_visa_tools.socket_messages import CONNECTION_CLOSED
 from decs_visa_tools.command_parser import decs_command_parser, decs_request_parser
+from decs_visa_tools.command_parser import request_uris, get_cache_ttls
+from decs_visa_tools.command_parser import decs_subscription_parser
+from decs_visa_tools.command_parser import decs_sweep_parser
+from decs_visa_tools.command_parser import lookup_command, command_name
+from decs_visa_tools.command_parser import GET, SET, PUBLISH, COMMANDS
+from decs_visa_tools.live_values import LiveValueTable
+from decs_visa_tools.ttl_cache import TTLCache
 from decs_visa_tools.response_parser import decs_response_parser
+from decs_visa_tools.response_parser import decs_record, decs_batch_parser
+from decs_visa_tools.response_parser import decs_batch_records
+from decs_visa_tools.archive import Archive
+from decs_visa_tools.history import History
+from decs_visa_tools.session_metadata import SessionMetadata
+from decs_visa_tools.session_metadata import METADATA_URIS, CONTROL_STATE_URIS
+from decs_visa_tools.binary_block import definite_length_block, text_to_floats
+from decs_visa_tools.metrics import METRICS, UNKNOWN_COMMAND
+from decs_visa_tools.startup_timer import PhaseTimer
 
 # shutdown message
 from decs_visa_tools.decs_visa_settings import SHUTDOWN
+# socket server mode
+from decs_visa_tools.decs_visa_settings import SERVER_MODE_ASYNCIO
+# multi-get request prefix and response delimiter
+from decs_visa_tools.decs_visa_settings import MGET
+from decs_visa_tools.decs_visa_settings import MGET_DELIM
+# streaming commands
+from decs_visa_tools.decs_visa_settings import SUBSCRIBE
+from decs_visa_tools.decs_visa_settings import UNSUBSCRIBE
+from decs_visa_tools.decs_visa_settings import STREAM_MIN_INTERVAL
+from decs_visa_tools.decs_visa_settings import STREAM_MAX_QUEUED
+# server-side sweeps
+from decs_visa_tools.decs_visa_settings import SWEEP
+from decs_visa_tools.decs_visa_settings import SWEEP_DONE
+from decs_visa_tools.decs_visa_settings import SWEEP_FAILED
+# background recorder
+from decs_visa_tools.decs_visa_settings import RECORDER
+from decs_visa_tools.decs_visa_settings import RECORD_INTERVAL
+from decs_visa_tools.decs_visa_settings import RECORD_ALIASES
+from decs_visa_tools.decs_visa_settings import ARCHIVE_PATH
+# in-memory history
+from decs_visa_tools.decs_visa_settings import HIST
+from decs_visa_tools.decs_visa_settings import HISTORY_CAPACITY
+# bulk data response format
+from decs_visa_tools.decs_visa_settings import FORMAT
+from decs_visa_tools.decs_visa_settings import FORMAT_BINARY
+from decs_visa_tools.decs_visa_settings import FORMAT_ASCII
+# live value (pub/sub) cache settings
+from decs_visa_tools.decs_visa_settings import LIVE_VALUES
+from decs_visa_tools.decs_visa_settings import LIVE_VALUE_MAX_AGE
+# get_ read-through cache settings
+from decs_visa_tools.decs_visa_settings import GET_CACHE
+from decs_visa_tools.decs_visa_settings import GET_CACHE_SIZE
+from decs_visa_tools.decs_visa_settings import GET_CACHE_DEFAULT_TTL
+from decs_visa_tools.decs_visa_settings import GET_CACHE_TTL
+# single-flight get_ requests
+from decs_visa_tools.decs_visa_settings import COALESCE_GETS
+# last-writer-wins set_ coalescing (of pipelined requests)
+from decs_visa_tools.decs_visa_settings import SET_COALESCE_WINDOWS
+from decs_visa_tools.decs_visa_settings import PIPELINE_DEPTH
+# runtime metrics
+from decs_visa_tools.decs_visa_settings import STATS
+from decs_visa_tools.decs_visa_settings import METRICS_INTERFACE
+from decs_visa_tools.decs_visa_settings import METRICS_PORT
+# resilient mode
+from decs_visa_tools.decs_visa_settings import RECONNECT_INITIAL_DELAY
+from decs_visa_tools.decs_visa_settings import RECONNECT_MAX_DELAY
+from decs_visa_tools.decs_visa_settings import RECONNECT_REQUEST_DEADLINE
+
+# *IDN? query
+IDN = "*IDN?"
+
+# component commands that don't change the system state
+READ_ONLY_COMMANDS = {command_name(MGET), command_name(HIST)}
+
+# component commands answered without a WAMP session
+SESSIONLESS_COMMANDS = {command_name(HIST), command_name(FORMAT),
+                        command_name(UNSUBSCRIBE), STATS}
+
+@functools.lru_cache(maxsize=8)
+def derived_key(secret: str, salt: str, iterations: int, keylen: int) -> bytes:
+    """
+    The salted WAMP-CRA key - PBKDF2 is deliberately slow, so the key
+    is derived once for each secret / salt / iteration count and kept
+    in memory (never written to disk) for later authentications
+    """
+    return auth.derive_key(secret, salt, iterations, keylen)
 
 class Component(ApplicationSession):
     """
@@ -25,13 +120,65 @@ class Component(ApplicationSession):
     #is_controllable = False
     #existing_controller = False
 
+    def __init__(self, config=None):
+        super().__init__(config)
+        # latest published values, if LIVE_VALUES is enabled
+        self.live_values = None
+        # get_ response cache, if GET_CACHE is enabled
+        self.get_cache = TTLCache(GET_CACHE_SIZE) if GET_CACHE else None
+        # get_ rRPCs in flight (uri -> task) and
+        # the number of rRPCs saved by sharing them
+        self.in_flight_gets = {}
+        self.coalesced_gets = 0
+        # get_ requests answered from the live values
+        self.live_value_hits = 0
+        # recent values returned for each get_ uri
+        self.history = History(HISTORY_CAPACITY) if HISTORY_CAPACITY > 0 else None
+        # simulated oi.DECS system answering the WAMP calls
+        # instead of the router (None for the router)
+        self.backend = (self.config.extra or {}).get('backend')
+        # the compiled command table and archive of this system
+        self.commands = (self.config.extra or {}).get('commands', COMMANDS)
+        self.archive_path = (self.config.extra or {}).get('archive_path', ARCHIVE_PATH)
+        # get_ cache TTLs by uri, as the cache is keyed by uri
+        self.cache_ttls = get_cache_ttls(GET_CACHE_TTL, self.commands) if GET_CACHE else {}
+        # host / control state of the current session, and
+        # the task refreshing it once it is out of date
+        self.session_metadata = None
+        self.metadata_refresh = None
+        # controlling sessions established
+        self.sessions = 0
+        # resilient mode - the session is re-established when it is
+        # lost, and requests wait for session_ready
+        self.reconnect = (self.config.extra or {}).get('reconnect', False)
+        self.session_ready = asyncio.Event()
+        # sweeps in progress, by set_ uri, and the number started
+        self.sweeps = {}
+        self.sweeps_started = 0
+        # times the phases until the component is ready (None once reported)
+        self.startup_timer = (self.config.extra or {}).get('startup_timer')
+        # the commands handled by the component itself (rather than
+        # the command dictionary), by command name
+        self.command_handlers = {
+            command_name(MGET)        : self.process_multi_get,
+            command_name(HIST)        : self.process_history,
+            command_name(FORMAT)      : self.process_format,
+            command_name(SUBSCRIBE)   : self.process_subscribe,
+            command_name(UNSUBSCRIBE) : self.process_unsubscribe,
+            command_name(SWEEP)       : self.process_sweep,
+            IDN                       : self.process_idn,
+            STATS                     : self.process_stats,
+        }
+
     def onWelcome(self, welcome: Welcome):
         logger.info("Established session: %s", str(welcome.session))
+        self.startup_phase("authenticate")
         return super().onWelcome(welcome)
 
     def onConnect(self):
         user=self.config.extra['user_name']
         logger.info("WAMP connection made")
+        self.startup_phase("connect")
         try:
             self.join(self.config.realm, ["wampcra"], user)
         except Exception as e:
@@ -45,12 +192,14 @@ class Component(ApplicationSession):
         user_secret=self.config.extra['user_secret']
         if challenge.method == "wampcra":
             logger.debug("WAMP-CRA challenge received: %s", challenge)
+            self.startup_phase("challenge")
             if 'salt' in challenge.extra:
                 # salted secret
-                key = auth.derive_key(user_secret,
-                                        challenge.extra['salt'],
-                                        challenge.extra['iterations'],
-                                        challenge.extra['keylen'])
+                key = derived_key(user_secret,
+                                  challenge.extra['salt'],
+                                  challenge.extra['iterations'],
+                                  challenge.extra['keylen'])
+                self.startup_phase("derive key")
             else:
                 # plain, unsalted secret
                 key = user_secret
@@ -67,38 +216,155 @@ class Component(ApplicationSession):
     # Somebody else may already have a controlling session, or the system
     # could be in local mode etc
 
+        if self.reconnect:
+            await self.rejoin()
+            return
+
         # Try to establish a controlling WAMP session with the router
         if await self.claim_system_control():
-            logger.info("Ready to process WAMP RPCs")
+            if LIVE_VALUES:
+                await self.subscribe_live_values()
+                self.startup_phase("live values")
+            await self.serve()
+        await self.close_session()
+
+    async def rejoin(self) -> None:
+        """
+        Resilient mode - claim control for a new session and let
+        the waiting requests through.  If control can't be claimed
+        the session is left, to be tried again after the backoff
+        """
+        if not await self.claim_system_control():
+            if self.is_attached():
+                self.leave()
+            return
+        if LIVE_VALUES:
+            await self.subscribe_live_values()
+            self.startup_phase("live values")
+        if self.sessions > 1:
+            logger.info("Controlling session re-established")
+        self.session_ready.set()
+        self.startup_report()
+
+    async def serve_across_sessions(self) -> None:
+        """
+        Resilient mode - serve the socket clients whether or not there
+        is a session, closing the current one (if any) once a shutdown
+        is requested
+        """
+        await self.serve()
+        if self.session_ready.is_set():
+            await self.close_session()
+
+    async def serve(self) -> None:
+        """
+        Serve the socket clients (and the recorder / metrics
+        exporter) until a shutdown is requested
+        """
+        recorder = asyncio.ensure_future(self.record_values()) if RECORDER else None
+        exporter = None
+        if METRICS is not None and METRICS_PORT:
+            exporter = asyncio.ensure_future(metrics_server(METRICS_INTERFACE, METRICS_PORT,
+                                                            self.prometheus_stats))
+        logger.info("Ready to process WAMP RPCs")
+        if not self.reconnect:
+            self.startup_report()
+        if self.config.extra['server_mode'] == SERVER_MODE_ASYNCIO:
+            # serve socket clients directly on this event loop
+            await self.serve_clients()
+        else:
             # start processing the server queue
             await self.process_queue()
+        if recorder is not None:
+            recorder.cancel()
+        if exporter is not None:
+            exporter.cancel()
 
-        # queue processing is closing down
+    async def close_session(self) -> None:
+        """
+        Queue processing is closing down - relinquish
+        control and leave the session
+        """
         logger.info("WAMP closing session")
+        if self.get_cache is not None:
+            logger.info("get_ cache hits: %d misses: %d evictions: %d",
+                        self.get_cache.hits, self.get_cache.misses,
+                        self.get_cache.evictions)
+        if COALESCE_GETS:
+            logger.info("get_ rRPCs saved by coalescing: %d", self.coalesced_gets)
+        for task in list(self.sweeps.values()):
+            task.cancel()
         try:
             # Might error if not controlling, but as we're leaving anyway...
             await self.checked_rpc('oi.decs.sessionmanager.relinquish_system_control')
         except Exception:
             pass
-        self.leave()
+        if self.is_attached():
+            self.leave()
 
     def onLeave(self, details: CloseDetails):
         logger.info("Leaving WAMP session: %s", details.reason)
+        self.session_metadata = None
+        # hold new requests until the next session
+        self.session_ready.clear()
         return super().onLeave(details)
 
     def onDisconnect(self):
+        if self.reconnect:
+            # run_reconnecting will reconnect, or finish
+            # if a shutdown has been requested
+            logger.info("WAMP connection closed")
+            return
         # If user attempts Keyboard interrupt, this will
         # shutdown the socket_server as the WAMP component
         # stops
-        r=self.config.extra['output_queue']
-        try:
-            _ = r.get_nowait()
-        except queue.Empty:
-            pass
-        r.put(SHUTDOWN)
+        r=self.config.extra.get('output_queue')
+        if r is not None:
+            # the reply queue is unbounded, so this can't block - and
+            # any replies / stream lines still queued go out first
+            r.put(SHUTDOWN)
         logger.info("Stopping WAMP event_loop")
         asyncio.get_event_loop().stop()
 
+    def startup_phase(self, phase: str) -> None:
+        """
+        A start up phase has finished
+        """
+        if self.startup_timer is not None:
+            self.startup_timer.mark(phase)
+
+    def startup_report(self) -> None:
+        """
+        The component is ready - log the start up phases
+        """
+        if self.startup_timer is not None:
+            logger.info(self.startup_timer.report())
+            self.startup_timer = None
+
+    def call(self, procedure, *args, **kwargs):
+        """
+        A WAMP rRPC - answered by the simulated system if there is one
+        """
+        if self.backend is not None:
+            return self.backend.call(procedure, *args)
+        return super().call(procedure, *args, **kwargs)
+
+    def publish(self, topic, *args, **kwargs):
+        """
+        A WAMP publication - to the simulated system if there is one
+        """
+        if self.backend is not None:
+            return self.backend.publish(topic, *args)
+        return super().publish(topic, *args, **kwargs)
+
+    def subscribe(self, handler, topic=None, options=None, check_types=None):
+        """
+        A WAMP subscription - to the simulated system if there is one
+        """
+        if self.backend is not None:
+            return self.backend.subscribe(handler, topic)
+        return super().subscribe(handler, topic, options, check_types)
+
     def package_plain_response(self, value: any) -> CallResult:
         """
         Short function to work around a WAMP (non?)feature that
@@ -116,36 +382,108 @@ class Component(ApplicationSession):
         """
         Wraps a WAMP rRPC call with logging and error checking
         """
-        logger.debug("get_ request uri: \"%s\"", str(rpc_uri))
+        logger.debug("get_ request uri: \"%s\"", rpc_uri)
+        start = time.perf_counter()
         try:
             resp = await self.call(rpc_uri)
             if not isinstance(resp, CallResult):
                 resp = self.package_plain_response(resp)
-            logger.debug("WAMP response: %s", str(resp.results))
+            logger.debug("WAMP response: %s", resp.results)
+            if METRICS is not None:
+                METRICS.wamp_call(rpc_uri, time.perf_counter() - start, False)
             return resp
         except wamp_exceptions.ApplicationError as e:
             logger.info("WAMP call ApplicationError: %s", e.error_message())
+            if METRICS is not None:
+                METRICS.wamp_call(rpc_uri, time.perf_counter() - start, True)
             raise
         except Exception as e:
             logger.info("WAMP call failed: %s", e)
+            if METRICS is not None:
+                METRICS.wamp_call(rpc_uri, time.perf_counter() - start, True)
             raise
 
+    async def checked_get(self, rpc_uri):
+        """
+        A get_ request - answered from the latest published value
+        or the get_ cache if possible, otherwise via checked_rpc
+        """
+        if self.live_values is not None:
+            resp = self.live_values.get(rpc_uri, LIVE_VALUE_MAX_AGE)
+            if resp is not None:
+                logger.debug("get_ request uri: \"%s\" from live value", rpc_uri)
+                self.live_value_hits += 1
+                return resp
+        if self.get_cache is None:
+            return await self.coalesced_rpc(rpc_uri)
+        resp = self.get_cache.get(rpc_uri)
+        if resp is not None:
+            logger.debug("get_ request uri: \"%s\" from cache", rpc_uri)
+            return resp
+        generation = self.get_cache.generation
+        resp = await self.coalesced_rpc(rpc_uri)
+        ttl = self.cache_ttls.get(rpc_uri, GET_CACHE_DEFAULT_TTL)
+        self.get_cache.put(rpc_uri, resp, ttl, generation)
+        return resp
+
+    async def coalesced_rpc(self, rpc_uri):
+        """
+        checked_rpc for get_ requests - a request for a uri that is
+        already in flight shares its response (or error)
+        """
+        if not COALESCE_GETS:
+            return await self.checked_rpc(rpc_uri)
+        task = self.in_flight_gets.get(rpc_uri)
+        if task is not None:
+            self.coalesced_gets += 1
+            logger.debug("get_ request uri: \"%s\" joined in flight request", rpc_uri)
+        else:
+            task = asyncio.ensure_future(self.checked_rpc(rpc_uri))
+            self.in_flight_gets[rpc_uri] = task
+            def done(_, rpc_uri=rpc_uri, task=task):
+                if self.in_flight_gets.get(rpc_uri) is task:
+                    del self.in_flight_gets[rpc_uri]
+            task.add_done_callback(done)
+        # shielded so one waiter being cancelled doesn't cancel the rest
+        return await asyncio.shield(task)
+
+    def invalidate_cached(self, rpc_uri):
+        """
+        After a set_ - remove the cached get_ responses and live
+        values in the same uri family, later get_ requests won't
+        join those in flight
+        """
+        family = rpc_uri.rsplit('.', 1)[0] + '.'
+        for uri in [uri for uri in self.in_flight_gets if uri.startswith(family)]:
+            del self.in_flight_gets[uri]
+        if self.get_cache is not None:
+            self.get_cache.invalidate_prefix(family)
+        if self.live_values is not None:
+            self.live_values.invalidate_prefix(family)
+
     async def checked_rpc_args(self, rpc_uri, args):
         """
         Wraps a WAMP rRPC call including args with logging and error checking
         """
-        logger.debug("set_ command uri: \"%s\" args: %s", str(rpc_uri), str(args))
+        logger.debug("set_ command uri: \"%s\" args: %s", rpc_uri, args)
+        start = time.perf_counter()
         try:
             resp = await self.call(rpc_uri, *args)
             if not isinstance(resp, CallResult):
                 resp = self.package_plain_response(resp)
-            logger.debug("WAMP response: %s", str(resp.results))
+            logger.debug("WAMP response: %s", resp.results)
+            if METRICS is not None:
+                METRICS.wamp_call(rpc_uri, time.perf_counter() - start, False)
             return resp
         except wamp_exceptions.ApplicationError as e:
             logger.info("WAMP call ApplicationError: %s", e.error_message())
+            if METRICS is not None:
+                METRICS.wamp_call(rpc_uri, time.perf_counter() - start, True)
             raise
         except Exception as e:
             logger.info("WAMP call Error: %s", e)
+            if METRICS is not None:
+                METRICS.wamp_call(rpc_uri, time.perf_counter() - start, True)
             raise
         
 
@@ -153,7 +491,7 @@ class Component(ApplicationSession):
         """
         Wraps a WAMP topic publication with logging and error checking
         """
-        logger.debug("Publication uri: \"%s\" args: %s", str(rpc_uri), str(args))
+        logger.debug("Publication uri: \"%s\" args: %s", rpc_uri, args)
         try:
             self.publish(rpc_uri, *args)
         except (Exception) as e:
@@ -161,6 +499,62 @@ class Component(ApplicationSession):
             raise
         logger.debug("Publication made")
 
+    async def subscribe_live_values(self) -> None:
+        """
+        Subscribe to the topics published for the get_ uris,
+        keeping the latest value of each in self.live_values
+        """
+        self.live_values = LiveValueTable()
+        n_subscribed = 0
+        for uri in sorted(request_uris(self.commands)):
+            def on_event(*args, uri=uri, **kwargs):
+                self.live_values.update(uri, args)
+            try:
+                await self.subscribe(on_event, uri)
+                n_subscribed += 1
+            except Exception as e:
+                # not every uri is published - these
+                # will always be requested by rRPC
+                logger.debug("Unable to subscribe to \"%s\": %s", uri, e)
+        logger.info("Subscribed to %d live value topics", n_subscribed)
+
+    async def fetch_session_metadata(self) -> SessionMetadata:
+        """
+        Request the host details and control state concurrently
+        """
+        resps = await asyncio.gather(*(self.checked_rpc(uri) for uri in METADATA_URIS))
+        self.session_metadata = SessionMetadata.from_responses(resps)
+        logger.debug("Session metadata: %s", self.session_metadata)
+        return self.session_metadata
+
+    async def get_session_metadata(self) -> SessionMetadata:
+        """
+        The session metadata - requested again only if a control
+        state change has been published since it was fetched
+        """
+        if self.session_metadata is not None:
+            return self.session_metadata
+        if self.metadata_refresh is None:
+            # one refresh, however many requests are waiting for it
+            self.metadata_refresh = asyncio.ensure_future(self.fetch_session_metadata())
+            def done(_):
+                self.metadata_refresh = None
+            self.metadata_refresh.add_done_callback(done)
+        return await asyncio.shield(self.metadata_refresh)
+
+    async def subscribe_control_state(self) -> None:
+        """
+        Drop the session metadata whenever a control
+        state change is published
+        """
+        def on_event(*args, **kwargs):
+            self.session_metadata = None
+        for uri in CONTROL_STATE_URIS:
+            try:
+                await self.subscribe(on_event, uri)
+            except Exception as e:
+                logger.debug("Unable to subscribe to \"%s\": %s", uri, e)
+
     async def claim_system_control(self) -> bool:
         """
         Attempt to establish a controlling
@@ -168,21 +562,24 @@ class Component(ApplicationSession):
         """
         logger.info("Attempt to establish a controlling session")
         try:
-            # is the system in remote mode?
-            resp = await self.checked_rpc('oi.decs.sessionmanager.system_control_mode')
-            is_controllable = int(resp.results[0]) == 1
-            if not is_controllable:
+            # is the system in remote mode, and under control?
+            metadata = await self.fetch_session_metadata()
+            self.startup_phase("session metadata")
+            if not metadata.is_controllable:
                 logger.info("DECS system is not in remote control mode")
                 return False
-            resp = await self.checked_rpc('oi.decs.sessionmanager.system_controller')
-            existing_controller = int(resp.results[0]) != 0
-            if existing_controller:
-                logger.info("DECS system is under control: %s", str(resp.results[1]))
+            if metadata.controller:
+                logger.info("DECS system is under control: %s", metadata.controller)
                 return False
             resp = await self.checked_rpc('oi.decs.sessionmanager.claim_system_control')
             if resp.results[1] != self.config.extra['user_name']:
                 logger.info("Failed to claim system control")
                 return False
+            self.session_metadata = metadata._replace(controller=str(resp.results[1]))
+            self.sessions += 1
+            self.startup_phase("claim")
+            await self.subscribe_control_state()
+            self.startup_phase("control state")
             return True
         except wamp_exceptions.ApplicationError as e:
             logger.info("WAMP ApplicationError during establishment of controlling session: %s", e.error_message())
@@ -192,114 +589,635 @@ class Component(ApplicationSession):
 
     async def process_queue(self) -> None:
         """
-        Monitor the message queue and process the
+        Wait on the message queue and process the
         WAMP queries as required.
         """
         q=self.config.extra['input_queue']
         r=self.config.extra['output_queue']
-        can_run = True
-        while can_run:
-            try:
-                data = q.get_nowait()
-                if data == SHUTDOWN:
-                    logger.info("WAMP shutdown request from queue")
-                    break
-                # set something
-                if "set_" in data:
-                    # It's a command, so
-                    try:
-                        rpc_uri, args = decs_command_parser(data)
-                    except (ValueError, NotImplementedError) as e:
-                        # Unknown command / bad arguments / not yet
-                        # implemented - as nothing has ben sent
-                        # to WAMP there will be no WAMP level error,
-                        # so we can just return this error message to
-                        # the client
-                        r.put(e)
-                    else:
-                        try:
-                            resp = await self.checked_rpc_args(rpc_uri, args)
-                            # Determine what is returned
-                            r.put(decs_response_parser(resp))
-                        except Exception:
-                            logger.info("WAMP error: %s", e)
-                            # This is a WAMP level error - probably
-                            # nothing we can do to fix this, so
-                            can_run = False
-
-                # get a parameter
-                elif "get_" in data:
-                    # It's a request, so
-                    try:
-                        rpc_uri = decs_request_parser(data)
-                    except ValueError as e:
-                        # Unknown request as nothing has ben sent
-                        # to WAMP there will be no WAMP level error,
-                        # so we can just return this error message to
-                        # the client
-                        r.put(e)
-                    else:
-                        try:
-                            resp = await self.checked_rpc(rpc_uri)
-                            # Determine what is returned
-                            r.put(decs_response_parser(resp))
-                        except Exception as e:
-                            logger.info("WAMP error: %s", e)
-                            # This is a WAMP level error - probably
-                            # nothing we can do to fix this, so
-                            can_run = False
-
-                # publish something
-                elif "PUBLISH" in data:
-                    try:
-                        rpc_uri, args = decs_command_parser(data)
-                    except (ValueError, NotImplementedError) as e:
-                        # Unknown command / bad arguments / not yet
-                        # implemented - as nothing has ben sent
-                        # to WAMP there will be no WAMP level error,
-                        # so we can just return this error message to
-                        # the client
-                        r.put(e)
-                    else:
-                        try:
-                            resp = await self.checked_publication(rpc_uri, args)
-                            # can just assume this has publication has
-                            # been made
-                            r.put("PUBLISHED")
-                        except Exception:
-                            logger.info("WAMP error: %s", e)
-                            # This is a WAMP level error - probably
-                            # nothing we can do to fix this, so
-                            can_run = False
-
-                elif "IDN" in data:
-                    # Process the IDN query as correctly as we can.
-                    # Left as a special case here as multiple WAMP calls
-                    # are required to collate all the required data
-                    try:
-                        rpc_uri = 'oi.decs.host.name'
-                        host_name_full = await self.checked_rpc(rpc_uri)
-                        host_name = str(host_name_full.results[0])
-                        logger.debug("Extractracted values: %s", host_name)
-                        rpc_uri = 'oi.decs.host.decs_version'
-                        host_version_full = await self.checked_rpc(rpc_uri)
-                        version = str(host_version_full.results[0])
-                        logger.debug("Extractracted values: %s", version)
-                        idn_string = f"Oxford Instruments, oi.DECS, {host_name}, {version}"
-                        logger.debug("IDN string: %s", idn_string)
-                        r.put(idn_string)
-                    except Exception:
-                        can_run = False
-
-                else:
-                    # unknown command
-                    logger.info("Unkown command: %s", str(data))
-                    r.put(f"Unkown command: {str(data)}")
-
-            except queue.Empty:
-                await asyncio.sleep(0.0005)
+        # the socket server thread wakes this event loop
+        # directly as each message is queued
+        q.bind()
+        # the threaded server has one client connection at a time
+        # r is unbounded, so nothing put on it blocks this event loop -
+        # responses are limited by PIPELINE_DEPTH, pushed lines by
+        # STREAM_MAX_QUEUED
+        client = ClientConnection(lambda line: r.put_nowait(StreamLine(line)),
+                                  lambda: r.qsize() >= STREAM_MAX_QUEUED)
+        pipeline = RequestPipeline(functools.partial(self.process_message, client=client),
+                                   self.can_overlap, self.coalesce_set)
+        replies = asyncio.Queue()
+        responder = asyncio.ensure_future(self.send_responses(replies, r, q))
+        while True:
+            data = await q.get()
+            if METRICS is not None:
+                METRICS.queued(q.qsize())
+            if data == SHUTDOWN:
+                logger.info("WAMP shutdown request from queue")
+                break
+            if data is CLIENT_DISCONNECTED:
+                # stop streaming to the client, then let the server
+                # know once its outstanding responses have been sent
+                client.close()
+                replies.put_nowait(CONNECTION_CLOSED)
+                continue
+            replies.put_nowait(await pipeline.submit(data))
+        responder.cancel()
+        pipeline.cancel()
+        client.close()
+
+    async def send_responses(self, replies: asyncio.Queue, r: queue.Queue, q: LoopQueue) -> None:
+        """
+        Put the responses onto the output queue, in the order
+        the messages were received
+        """
+        while True:
+            task = await replies.get()
+            if task is CONNECTION_CLOSED:
+                r.put_nowait(task)
                 continue
+            try:
+                r.put_nowait(await task)
             except Exception as e:
                 # Something bad has happened to the WAMP connection
                 # perhaps Admin has put the system into local mode...?
-                can_run = False
+                logger.info("WAMP error: %s", e)
+                q.put(SHUTDOWN)
+                return
+
+    async def serve_clients(self) -> None:
+        """
+        Run the asyncio socket server on this event loop,
+        client messages are passed straight to process_message
+        """
+        await async_server(self.config.extra['interface'],
+                           self.config.extra['server_port'],
+                           self.process_message,
+                           self.can_overlap,
+                           coalesce=self.coalesce_set)
+
+    def can_overlap(self, data: str) -> bool:
+        """
+        get_ requests don't change the system state, so
+        can be processed concurrently when pipelined
+        """
+        name, spec = lookup_command(data, self.commands)
+        if spec is not None:
+            return spec.kind == GET
+        return name.upper() in READ_ONLY_COMMANDS
+
+    def coalesce_set(self, data: str) -> tuple | None:
+        """
+        The (uri, window) of a set_ that can be replaced by a later
+        set_ to the same setpoint - None if it has to be sent as it
+        is (no window for the alias, or a heater _OFF command)
+        """
+        if PIPELINE_DEPTH <= 1:
+            # lock-step clients never send a later set_ in the window
+            return None
+        name, spec = lookup_command(data, self.commands)
+        window = SET_COALESCE_WINDOWS.get(name)
+        if not window or spec is None or spec.kind != SET or name.upper().endswith("_OFF"):
+            return None
+        return spec.uri, window
+
+    async def process_message(self, data: str, client: ClientConnection = None) -> any:
+        """
+        Process a single message from a socket server client
+        and return the response to be sent back, counting it
+        in the runtime metrics
+        """
+        if METRICS is None:
+            return await self.checked_message(data, client)
+        start = time.perf_counter()
+        name, spec = lookup_command(data, self.commands)
+        if spec is None and name.upper() not in self.command_handlers:
+            name = UNKNOWN_COMMAND
+        error = True
+        try:
+            resp = await self.checked_message(data, client)
+            error = isinstance(resp, Exception) or name == UNKNOWN_COMMAND
+            return resp
+        finally:
+            METRICS.request(name, time.perf_counter() - start, error)
+
+    async def checked_message(self, data: str, client: ClientConnection = None) -> any:
+        """
+        handle_message - in resilient mode the request waits (up to
+        RECONNECT_REQUEST_DEADLINE seconds) for a session, is retried
+        if the session is lost while it is in progress, and other WAMP
+        level errors are returned rather than closing the server
+        """
+        if not self.reconnect or command_name(data).upper() in SESSIONLESS_COMMANDS:
+            return await self.handle_message(data, client)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RECONNECT_REQUEST_DEADLINE
+        while True:
+            if not self.session_ready.is_set():
+                try:
+                    await asyncio.wait_for(self.session_ready.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    return ConnectionError("WAMP session not re-established within "
+                                           f"{RECONNECT_REQUEST_DEADLINE} s")
+            try:
+                return await self.handle_message(data, client)
+            except Exception as e:
+                if self.session_ready.is_set():
+                    # the session is still up, so it's this request that failed
+                    logger.info("WAMP error: %s", e)
+                    if isinstance(e, wamp_exceptions.ApplicationError):
+                        return RuntimeError(e.error_message())
+                    return e
+                logger.info("WAMP session lost, request will be retried: %s", e)
+
+    async def handle_message(self, data: str, client: ClientConnection = None) -> any:
+        """
+        Process a single message from a socket server client
+        and return the response to be sent back.
+
+        Errors in the message itself (unknown command, bad
+        arguments...) are returned as the response, WAMP level
+        errors are raised as there is probably nothing we can
+        do to fix them.
+        """
+        # one lookup for the component's own commands, one in the
+        # compiled command dictionary for everything else
+        trace = getattr(data, 'trace', None)
+        if trace is not None:
+            trace.stamp("queued")
+        name, spec = lookup_command(data, self.commands)
+        if trace is not None:
+            trace.stamp("parse")
+        handler = self.command_handlers.get(name.upper())
+        if handler is not None:
+            resp = await handler(data, client)
+            if trace is not None:
+                trace.stamp("handled")
+            return resp
+        kind = spec.kind if spec is not None else None
+
+        # set something
+        if kind == SET:
+            # It's a command, so
+            try:
+                rpc_uri, args = decs_command_parser(data, self.commands)
+            except (ValueError, NotImplementedError) as e:
+                # Unknown command / bad arguments / not yet
+                # implemented - as nothing has ben sent
+                # to WAMP there will be no WAMP level error,
+                # so we can just return this error message to
+                # the client
+                return e
+            resp = await self.checked_rpc_args(rpc_uri, args)
+            if trace is not None:
+                trace.stamp("wamp")
+            self.invalidate_cached(rpc_uri)
+            # Determine what is returned
+            value = decs_response_parser(resp)
+            if trace is not None:
+                trace.stamp("decode")
+            return value
+
+        # get a parameter
+        if kind == GET:
+            # It's a request, so
+            rpc_uri = spec.uri
+            resp = await self.checked_get(rpc_uri)
+            if trace is not None:
+                trace.stamp("wamp")
+            # Determine what is returned
+            value = self.parse_get(rpc_uri, resp)
+            if trace is not None:
+                trace.stamp("decode")
+            if client is not None and client.binary and ',' in value:
+                # a vector record
+                return definite_length_block(text_to_floats(value))
+            return value
+
+        # publish something
+        if kind == PUBLISH:
+            try:
+                rpc_uri, args = decs_command_parser(data, self.commands)
+            except (ValueError, NotImplementedError) as e:
+                # Unknown command / bad arguments / not yet
+                # implemented - as nothing has ben sent
+                # to WAMP there will be no WAMP level error,
+                # so we can just return this error message to
+                # the client
+                return e
+            await self.checked_publication(rpc_uri, args)
+            if trace is not None:
+                trace.stamp("wamp")
+            # can just assume this has publication has
+            # been made
+            return "PUBLISHED"
+
+        # an alias that isn't in the command dictionary - nothing
+        # has been sent to WAMP, so just return the error
+        if name.startswith(("get_", "set_")):
+            return ValueError("uri not returned from command_dictionary")
+
+        # unknown command
+        logger.info("Unkown command: %s", str(data))
+        return f"Unkown command: {str(data)}"
+
+    async def process_idn(self, data: str, client: ClientConnection = None) -> str:
+        """
+        Answer the IDN query from the session metadata
+        """
+        metadata = await self.get_session_metadata()
+        return metadata.idn()
+
+    async def process_stats(self, data: str, client: ClientConnection = None) -> str:
+        """
+        Process a STATS? request - the runtime metrics as a JSON line
+        """
+        if METRICS is None:
+            return "Metrics are disabled"
+        return METRICS.json(self.stats_counters())
+
+    def prometheus_stats(self) -> str:
+        """
+        The runtime metrics in Prometheus text format
+        """
+        return METRICS.prometheus(self.stats_counters())
+
+    def stats_counters(self) -> dict:
+        """
+        The component's own cache and coalescing counters
+        """
+        counters = {"live_value_hits": self.live_value_hits,
+                    "coalesced_gets": self.coalesced_gets,
+                    "sessions": self.sessions}
+        if self.get_cache is not None:
+            counters.update(get_cache_hits=self.get_cache.hits,
+                            get_cache_misses=self.get_cache.misses,
+                            get_cache_evictions=self.get_cache.evictions)
+        return counters
+
+    async def process_unsubscribe(self, data: str, client: ClientConnection = None) -> str:
+        """
+        Stop everything streaming to the client
+        """
+        if client is not None:
+            client.close()
+        return "UNSUBSCRIBED"
+
+    def parse_get(self, rpc_uri: str, resp: CallResult) -> str:
+        """
+        Parse the response to a get_ request, keeping
+        numeric values in the history
+        """
+        record = decs_record(resp)
+        if self.history is not None:
+            try:
+                self.history.record(rpc_uri,
+                                    record.timestamp or time.time(),
+                                    float(record.value))
+            except ValueError:
+                # not a single numeric value
+                pass
+        return record.value
+
+    async def process_history(self, data: str, client: ClientConnection = None) -> str | bytes:
+        """
+        Process a HIST:get_A[:<since_timestamp>] request - the values
+        held for the alias newer than since_timestamp are returned as
+        timestamp,value pairs delimited by MGET_DELIM (or interleaved
+        in a binary block)
+        """
+        if self.history is None:
+            return "History is disabled"
+        alias, _, since = data[len(HIST):].partition(':')
+        try:
+            rpc_uri = decs_request_parser(alias.strip(), self.commands)
+            since = float(since) if since.strip() else 0.0
+        except ValueError as e:
+            return e
+        timestamps, values = self.history.since(rpc_uri, since)
+        if client is not None and client.binary:
+            return definite_length_block([x for pair in zip(timestamps, values) for x in pair])
+        return MGET_DELIM.join(f"{t!r},{v!r}" for t, v in zip(timestamps, values))
+
+    async def process_format(self, data: str, client: ClientConnection = None) -> str:
+        """
+        Process a FORMAT:BINARY / FORMAT:ASCII request to set the
+        format of bulk data responses for the client connection
+        """
+        if client is None:
+            return "FORMAT requires a client connection"
+        data_format = data[len(FORMAT):].strip().upper()
+        if data_format not in (FORMAT_BINARY, FORMAT_ASCII):
+            return f"Unknown format: {data_format}"
+        client.binary = data_format == FORMAT_BINARY
+        return data.strip().upper()
+
+    async def process_multi_get(self, data: str, client: ClientConnection = None) -> str | bytes:
+        """
+        Process a MGET:get_A,get_B,... request - the WAMP calls are
+        made concurrently and the values returned as a single
+        MGET_DELIM delimited response, in the order requested (or a
+        binary block, where vectors give one float per element and
+        errors give NaN)
+        """
+        aliases = [alias.strip() for alias in data[len(MGET):].split(',')]
+        values = await self.get_values(aliases)
+        if client is not None and client.binary:
+            return definite_length_block([x for value in values for x in text_to_floats(value)])
+        return MGET_DELIM.join(values)
+
+    async def get_values(self, aliases: list) -> list:
+        """
+        Request a batch of get_ aliases concurrently and decode the
+        responses together (keeping numeric values in the history) -
+        errors (including WAMP ApplicationErrors) are returned inline
+        so they don't fail the whole batch
+        """
+        values = [""] * len(aliases)
+        requests = []
+        for i, alias in enumerate(aliases):
+            if not alias.startswith("get_"):
+                values[i] = f"Not a get_ request: {alias}"
+                continue
+            try:
+                requests.append((i, decs_request_parser(alias, self.commands)))
+            except ValueError as e:
+                values[i] = str(e)
+        resps = await asyncio.gather(*(self.checked_get(rpc_uri)
+                                       for _, rpc_uri in requests),
+                                     return_exceptions=True)
+        for j, resp in enumerate(resps):
+            if isinstance(resp, wamp_exceptions.ApplicationError):
+                resps[j] = RuntimeError(resp.error_message())
+            elif isinstance(resp, BaseException):
+                # a WAMP level error fails the batch
+                raise resp
+        texts, timestamps, numbers = decs_batch_records(resps)
+        now = time.time()
+        for (i, rpc_uri), text, timestamp, number in zip(requests, texts,
+                                                         timestamps.tolist(),
+                                                         numbers.tolist()):
+            values[i] = text
+            if self.history is not None and number == number:
+                # a 'flat' response has no (a NaN) timestamp
+                self.history.record(rpc_uri, timestamp if timestamp == timestamp else now,
+                                    number)
+        return values
+
+    async def process_subscribe(self, data: str, client: ClientConnection = None) -> str:
+        """
+        Process a SUBSCRIBE:get_A,get_B@<interval>s[,deadband=<value>]
+        request - the first sample is returned as the response, later
+        samples are pushed to the client until UNSUBSCRIBE
+        """
+        if client is None:
+            return "SUBSCRIBE requires a client connection"
+        try:
+            aliases, interval, deadband = decs_subscription_parser(data, self.commands)
+        except ValueError as e:
+            return e
+        interval = max(interval, STREAM_MIN_INTERVAL)
+        values = await self.sample_values(aliases)
+        client.add_stream(asyncio.ensure_future(
+            self.stream_values(aliases, interval, deadband, values, client)))
+        return self.format_sample(values)
+
+    async def stream_values(self, aliases: list, interval: float, deadband: float | None,
+                            last_sent: list, client: ClientConnection) -> None:
+        """
+        Sample the get_ aliases every interval seconds and push them to
+        the client - every sample, or only when a value has moved by more
+        than the deadband since it was last sent
+        """
+        loop = asyncio.get_running_loop()
+        next_sample = loop.time()
+        while True:
+            next_sample += interval
+            await asyncio.sleep(max(0, next_sample - loop.time()))
+            if self.reconnect and not self.session_ready.is_set():
+                # no session - skip the sample
+                continue
+            try:
+                values = await self.sample_values(aliases)
+            except Exception as e:
+                # WAMP level error - the client will find out
+                # with its next message
+                logger.info("Stopping stream: %s", e)
+                return
+            if deadband is not None and not self.outside_deadband(values, last_sent, deadband):
+                continue
+            last_sent = values
+            client.push(self.format_sample(values))
+
+    async def process_sweep(self, data: str, client: ClientConnection = None) -> str:
+        """
+        Process a SWEEP:set_A:<start>,<stop>,<step>,dwell=<s>;measure=get_B
+        request - the sweep runs as a task, pushing a line for each point
+        to the client (and / or recording it), and the response is
+        SWEEPING and the number of points
+        """
+        try:
+            alias, points, dwell, measure, record = decs_sweep_parser(data, self.commands)
+        except (ValueError, OverflowError, NotImplementedError) as e:
+            return e
+        if client is None and not record:
+            return "SWEEP requires a client connection or record=true"
+        rpc_uri = self.commands[alias].uri
+        if rpc_uri in self.sweeps:
+            return f"Already sweeping {rpc_uri}"
+        self.sweeps_started += 1
+        archive_path = None
+        if record:
+            # a directory of its own, as sweeps of other setpoints can
+            # start in the same second
+            archive_path = os.path.join(self.archive_path, "sweep-"
+                                        f"{time.strftime('%Y%m%d-%H%M%S')}-{alias}-"
+                                        f"{self.sweeps_started}")
+            try:
+                os.makedirs(archive_path)
+            except OSError as e:
+                return e
+        task = asyncio.ensure_future(self.run_sweep(alias, points, dwell, measure,
+                                                    archive_path, client))
+        self.sweeps[rpc_uri] = task
+        task.add_done_callback(lambda _, rpc_uri=rpc_uri: self.sweeps.pop(rpc_uri, None))
+        if client is not None:
+            # stopped by UNSUBSCRIBE, or when the client disconnects
+            client.add_stream(task)
+        return MGET_DELIM.join(["SWEEPING", str(len(points))])
+
+    async def run_sweep(self, alias: str, points: list, dwell: float, measure: list,
+                        archive_path: str | None, client: ClientConnection | None) -> None:
+        """
+        Set each point in turn, and measure the get_ aliases dwell
+        seconds after the set_ completes - the dwell is timed by the
+        event loop, not by the client and the network
+        """
+        archive = Archive(archive_path) if archive_path is not None else None
+        logger.info("Sweeping %s over %d points", alias, len(points))
+        loop = asyncio.get_running_loop()
+        try:
+            for point in points:
+                rpc_uri, args = decs_command_parser(f"{alias}:{point!r}", self.commands)
+                resp = await self.checked_rpc_args(rpc_uri, args)
+                self.invalidate_cached(rpc_uri)
+                measure_at = loop.time() + dwell
+                setpoint = decs_response_parser(resp)
+                await asyncio.sleep(max(0, measure_at - loop.time()))
+                values = await self.sample_values(measure)
+                if client is not None:
+                    client.push(self.format_sample([str(setpoint), *values]))
+                if archive is not None:
+                    now = time.time()
+                    archive.append(alias, now, point)
+                    for get_alias, value in zip(measure, values):
+                        try:
+                            archive.append(get_alias, now, float(value))
+                        except ValueError:
+                            # not a single numeric value
+                            pass
+                    archive.flush()
+        except asyncio.CancelledError:
+            logger.info("Sweep of %s stopped", alias)
+            raise
+        except Exception as e:
+            # a WAMP level error - end the sweep, but not the server
+            if isinstance(e, wamp_exceptions.ApplicationError):
+                e = e.error_message()
+            logger.info("Sweep of %s failed: %s", alias, e)
+            if client is not None:
+                client.push(MGET_DELIM.join([SWEEP_FAILED, str(e)]))
+            return
+        finally:
+            if archive is not None:
+                archive.close()
+        logger.info("Sweep of %s done", alias)
+        if client is not None:
+            client.push(SWEEP_DONE)
+
+    async def sample_values(self, aliases: list) -> list:
+        """
+        Request the current values of the get_ aliases concurrently
+        """
+        return await self.get_values(aliases)
+
+    @staticmethod
+    def format_sample(values: list) -> str:
+        """
+        A timestamped line of streamed values
+        """
+        return MGET_DELIM.join([f"{time.time():.3f}", *values])
+
+    @staticmethod
+    def outside_deadband(values: list, last_sent: list, deadband: float) -> bool:
+        """
+        Has any value moved by more than deadband since it was last sent
+        (non-numeric values are sent whenever they change)
+        """
+        for value, sent in zip(values, last_sent):
+            try:
+                if abs(float(value) - float(sent)) > deadband:
+                    return True
+            except ValueError:
+                if value != sent:
+                    return True
+        return False
+
+    async def record_values(self) -> None:
+        """
+        Background recorder - sample the RECORD_ALIASES every
+        RECORD_INTERVAL seconds and append new records to the archive
+        """
+        archive = Archive(self.archive_path)
+        channels = []
+        for alias in RECORD_ALIASES:
+            try:
+                channels.append((alias, decs_request_parser(alias, self.commands)))
+            except ValueError as e:
+                logger.info("Not recording %s: %s", alias, e)
+        # only append records newer than those already archived
+        last = {alias: archive.channel(alias).last_timestamp() for alias, _ in channels}
+        logger.info("Recording %d channels to %s", len(channels), self.archive_path)
+        loop = asyncio.get_running_loop()
+        next_sample = loop.time()
+        try:
+            while True:
+                if self.reconnect and not self.session_ready.is_set():
+                    # no session - skip the sample
+                    next_sample += RECORD_INTERVAL
+                    await asyncio.sleep(max(0, next_sample - loop.time()))
+                    continue
+                resps = await asyncio.gather(*(self.checked_get(uri)
+                                               for _, uri in channels),
+                                             return_exceptions=True)
+                now = time.time()
+                timestamps, values = decs_batch_parser(resps)
+                for (alias, uri), resp, timestamp, value in zip(channels, resps,
+                                                                 timestamps.tolist(),
+                                                                 values.tolist()):
+                    if isinstance(resp, Exception):
+                        logger.debug("Recorder: %s failed: %s", alias, resp)
+                        continue
+                    if timestamp != timestamp:
+                        # NaN - a 'flat' response without a timestamp
+                        timestamp = now
+                    if last[alias] is not None and timestamp <= last[alias]:
+                        # value hasn't been updated since the last sample
+                        continue
+                    archive.append(alias, timestamp, value)
+                    if self.history is not None and value == value:
+                        self.history.record(uri, timestamp, value)
+                    last[alias] = timestamp
+                archive.flush()
+                next_sample += RECORD_INTERVAL
+                await asyncio.sleep(max(0, next_sample - loop.time()))
+        finally:
+            archive.close()
+
+async def run_reconnecting(url: str, realm: str, extra: dict) -> None:
+    """
+    Resilient mode - run a Component against the router, reconnecting
+    (with exponential backoff) whenever the connection is lost, until
+    a socket client requests a shutdown
+    """
+    component = Component(ComponentConfig(realm, extra=dict(extra, reconnect=True)))
+    # the socket clients are served from the start, their
+    # requests wait for the first session
+    stopped = asyncio.ensure_future(component.serve_across_sessions())
+    await stay_connected(component, url, realm, stopped)
+    # raise any error from serving the clients
+    stopped.result()
+
+async def stay_connected(component: Component, url: str, realm: str,
+                         stopped: asyncio.Future) -> None:
+    """
+    Keep a (resilient mode) Component connected to the router until
+    stopped is done.  The same Component is used for every connection,
+    so the socket clients and any waiting requests carry over to the
+    next session
+    """
+    runner = ApplicationRunner(url, realm, extra=component.config.extra)
+    delay = RECONNECT_INITIAL_DELAY
+    while not stopped.done():
+        sessions = component.sessions
+        if component.startup_timer is None:
+            component.startup_timer = PhaseTimer("Reconnect" if sessions else "Start up")
+        try:
+            _, protocol = await asyncio.wait_for(
+                runner.run(lambda config: component, start_loop=False), RECONNECT_MAX_DELAY)
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.info("Unable to connect to the WAMP router %s: %s", url, e or "timed out")
+        else:
+            await asyncio.wait([protocol.is_closed, stopped],
+                               return_when=asyncio.FIRST_COMPLETED)
+            if stopped.done():
+                # give the GOODBYE a chance to go through
+                await asyncio.wait([protocol.is_closed], timeout=1.0)
+                break
+            if component.sessions > sessions:
+                # a controlling session was established - start the backoff again
+                delay = RECONNECT_INITIAL_DELAY
+        # time the next attempt from its start
+        component.startup_timer = None
+        logger.info("Reconnecting to the WAMP router %s in %.1f s", url, delay)
+        await asyncio.wait([stopped], timeout=delay)
+        delay = min(2 * delay, RECONNECT_MAX_DELAY)
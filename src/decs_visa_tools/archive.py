@@ -0,0 +1,191 @@
+"""
+Module that implements the append-only columnar archive
+written by the background recorder.
+
+Each channel (get_ alias) is a file of fixed-width little-endian
+(timestamp, value) float64 records, in time order.  Files are
+read as numpy memory-maps, so a time range can be found with a
+binary search of the timestamps without reading the whole file.
+
+The archive can be exported from the command line, e.g.
+
+    python -m decs_visa_tools.archive ./archive --csv history.csv --start 1705056000
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([('timestamp', '<f8'), ('value', '<f8')])
+CHANNEL_SUFFIX = ".f8x2"
+
+class ChannelArchive:
+    """
+    The archive file for a single channel
+    """
+    def __init__(self, directory: str, channel: str) -> None:
+        self.channel = channel
+        self.path = os.path.join(directory, channel + CHANNEL_SUFFIX)
+        self._file = None
+
+    def append(self, timestamp: float, value: float) -> None:
+        """
+        Append a record - flush() to make it visible to readers
+        """
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(np.array([(timestamp, value)], dtype=RECORD_DTYPE).tobytes())
+
+    def flush(self) -> None:
+        """
+        Write any buffered records to disk
+        """
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """
+        Close the file (it will be re-opened by the next append)
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def records(self) -> np.ndarray | None:
+        """
+        The records written to disk, as a (read only) memory-map -
+        None if there aren't any
+        """
+        if not os.path.exists(self.path):
+            return None
+        # ignore any partly written record at the end of the file
+        n_records = os.path.getsize(self.path) // RECORD_DTYPE.itemsize
+        if n_records == 0:
+            return None
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', shape=(n_records,))
+
+    def last_timestamp(self) -> float | None:
+        """
+        The timestamp of the last record written to disk
+        """
+        records = self.records()
+        return float(records[-1]['timestamp']) if records is not None else None
+
+    def read(self, start: float | None = None, end: float | None = None) -> np.ndarray:
+        """
+        The records with start <= timestamp < end
+        """
+        records = self.records()
+        if records is None:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        timestamps = records['timestamp']
+        first = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+        last = len(records) if end is None else np.searchsorted(timestamps, end, side='left')
+        return np.array(records[first:last])
+
+class Archive:
+    """
+    A directory of channel archives
+    """
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._channels = {}
+
+    def channel(self, channel: str) -> ChannelArchive:
+        """
+        The archive for a channel
+        """
+        if channel not in self._channels:
+            self._channels[channel] = ChannelArchive(self.directory, channel)
+        return self._channels[channel]
+
+    def channels(self) -> list:
+        """
+        The channels stored in the archive directory
+        """
+        return sorted(name[:-len(CHANNEL_SUFFIX)] for name in os.listdir(self.directory)
+                      if name.endswith(CHANNEL_SUFFIX))
+
+    def append(self, channel: str, timestamp: float, value: float) -> None:
+        """
+        Append a record to a channel
+        """
+        self.channel(channel).append(timestamp, value)
+
+    def flush(self) -> None:
+        """
+        Make all appended records visible to readers
+        """
+        for channel in self._channels.values():
+            channel.flush()
+
+    def close(self) -> None:
+        """
+        Close all the channel files
+        """
+        for channel in self._channels.values():
+            channel.close()
+
+    def read(self, channel: str, start: float | None = None,
+             end: float | None = None) -> np.ndarray:
+        """
+        The records for a channel with start <= timestamp < end
+        """
+        return self.channel(channel).read(start, end)
+
+    def export_csv(self, path: str, channels: list | None = None,
+                   start: float | None = None, end: float | None = None) -> int:
+        """
+        Write the records as channel,timestamp,value rows,
+        returns the number of rows written
+        """
+        n_rows = 0
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(("channel", "timestamp", "value"))
+            for channel in channels or self.channels():
+                records = self.read(channel, start, end)
+                writer.writerows((channel, repr(t), repr(v))
+                                 for t, v in zip(records['timestamp'].tolist(),
+                                                 records['value'].tolist()))
+                n_rows += len(records)
+        return n_rows
+
+    def export_npy(self, directory: str, channels: list | None = None,
+                   start: float | None = None, end: float | None = None) -> list:
+        """
+        Write each channel as a <channel>.npy structured array,
+        returns the paths written
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for channel in channels or self.channels():
+            path = os.path.join(directory, channel + ".npy")
+            np.save(path, self.read(channel, start, end))
+            paths.append(path)
+        return paths
+
+def main():
+    """
+    Export (part of) an archive to CSV and/or .npy files
+    """
+    parser = argparse.ArgumentParser(description="Export a DECS<->VISA archive")
+    parser.add_argument("archive", help="archive directory")
+    parser.add_argument("--channel", action="append", help="channel(s) to export (default all)")
+    parser.add_argument("--start", type=float, help="start timestamp (seconds since the epoch)")
+    parser.add_argument("--end", type=float, help="end timestamp (seconds since the epoch)")
+    parser.add_argument("--csv", help="CSV file to write")
+    parser.add_argument("--npy", help="directory to write .npy files to")
+    args = parser.parse_args()
+    archive = Archive(args.archive)
+    if args.csv:
+        n_rows = archive.export_csv(args.csv, args.channel, args.start, args.end)
+        print(f"Wrote {n_rows} rows to {args.csv}")
+    if args.npy:
+        for path in archive.export_npy(args.npy, args.channel, args.start, args.end):
+            print(f"Wrote {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Module that packs values into IEEE 488.2 definite-length
+binary blocks:  #<n><length><payload>
+
+where <length> is the payload length in bytes, written with
+<n> digits.  The payload is packed little-endian float64s, as
+read by PyVISA with
+
+    query_binary_values(cmd, datatype='d', is_big_endian=False)
+"""
+import struct
+
+def definite_length_block(values: list) -> bytes:
+    """
+    Pack a list of floats into a definite-length block
+    """
+    payload = struct.pack(f"<{len(values)}d", *values)
+    length = str(len(payload))
+    if len(length) > 9:
+        raise ValueError("Binary block too long")
+    return b"#" + str(len(length)).encode('ascii') + length.encode('ascii') + payload
+
+def text_to_floats(text: str) -> list:
+    """
+    The float(s) in a parsed response - , delimited vectors give
+    one float per element, anything non-numeric gives a single NaN
+    """
+    try:
+        return [float(item) for item in str(text).split(',')]
+    except ValueError:
+        return [float('nan')]
@@ -77,3 +77,10 @@ someOtherSystemType = {
     # Implement other/further cmd_dict(s) as required
     "short_cmd"         : "wamp.uri"
 }
+
+# The command dictionary for each system type (SYSTEM_TYPE
+# in a system profile .env file)
+SYSTEM_TYPES = {
+    "Proteox"           : Proteox_cmd_uri,
+    "Teslatron"         : Teslatron_cmd_uri,
+}
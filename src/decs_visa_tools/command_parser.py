@@ -4,125 +4,365 @@
  WAMP uri / argument lists.
 """
 
+import functools
+import math
 import time
-import typing 
+import typing
 
 from .base_logger import logger
 
 from .command_dictionary import Proteox_cmd_uri as cmd_uri
+from .command_dictionary import SYSTEM_TYPES
 
-def decs_request_parser(cmd: str) -> str:
+# longest sweep accepted
+from .decs_visa_settings import SWEEP_MAX_POINTS
+
+# the parsers take the compiled command table of the system
+# (commands=), the Proteox table (COMMANDS) by default
+
+def decs_request_parser(cmd: str, commands: dict | None = None) -> str:
     """
     From the cmd string passed to the socket server, determine the correct
     WAMP uri to call - requests shouldn't have a :<payload>
     """
     # assume it is a get_ command
-    uri = cmd_uri.get(cmd)
+    spec = (COMMANDS if commands is None else commands).get(cmd)
     try:
-        assert isinstance(uri, str), "uri not returned from command_dictionary"
+        assert spec is not None, "uri not returned from command_dictionary"
     except AssertionError as e:
         raise ValueError(e) from e
     # if the uri is found, it can be returned
-    return uri
+    return spec.uri
 
-def decs_command_parser(cmd: str) -> tuple:
+def request_uris(commands: dict | None = None) -> set:
     """
-    From the cmd string passed to the socket server, determine the correct
-    WAMP uri to call/publish and package the arguments to suit
+    The set of WAMP uris used by the get_ requests
+    in the command dictionary
     """
+    commands = COMMANDS if commands is None else commands
+    return {spec.uri for spec in commands.values() if spec.kind == GET}
 
-    # Check to see if there is a 'payload' for a
-    # 'set_' command - delimiter :
-    cmd_parts = cmd.split(':')
-    try:
-        assert len(cmd_parts) > 1, "set_ commands must have a :<payload>"
-    except AssertionError as e:
-        raise ValueError(e) from e
-    uri = cmd_uri.get(cmd_parts[0].strip())
+def get_cache_ttls(alias_ttls: dict, commands: dict | None = None) -> dict:
+    """
+    The get_ cache time-to-live of each uri, from the TTLs set per
+    get_ alias (the cache is keyed by uri) - aliases of the same uri
+    given different TTLs get the shortest of them
+    """
+    commands = COMMANDS if commands is None else commands
+    ttls = {}
+    for alias, ttl in alias_ttls.items():
+        spec = commands.get(alias)
+        if spec is None or spec.kind != GET:
+            logger.debug("No get_ cache TTL for %s - not a get_ alias", alias)
+            continue
+        ttls[spec.uri] = min(ttl, ttls.get(spec.uri, ttl))
+    return ttls
+
+def decs_subscription_parser(cmd: str, commands: dict | None = None) -> tuple:
+    """
+    From a SUBSCRIBE:get_A,get_B@<interval>s[,deadband=<value>] string
+    determine the get_ aliases to stream, the interval (seconds) between
+    samples and the deadband (None to send every sample)
+    """
+    cmd_parts = cmd.split(':', 1)
     try:
-        assert isinstance(uri, str), "uri not returned from cmd_dict"
+        assert len(cmd_parts) > 1, "SUBSCRIBE must have a :<payload>"
     except AssertionError as e:
         raise ValueError(e) from e
-    args: list[typing.Any]
-    args = []
-    # Given the cmd and the uri - decide how to process the information
-    # to form the correct WAMP messages for DECS
-    if "temperature_control" in uri and uri.endswith("setpoint"):
-        # set_ command for temperature
-        args.append(float(str(cmd_parts[1]).strip()))
-        args.append(1)
-    elif "temperature_control" in uri and uri.endswith("power"):
-        # set_ command for power
-        args.append(float(str(cmd_parts[1]).strip()))
-        if cmd_parts[0].endswith("OFF"):
-            # utility function to ensure heater output is disabled
-            args.append(False)
-        else:
-            # ensure heater output is enabled
-            args.append(True)
-    elif "pressure_control" in uri and uri.endswith("setpoint"):
-        # set_ command for pressure
-        args.append(float(str(cmd_parts[1]).strip()))
-        args.append(1)
-    
-    elif uri.endswith("set_valve_open_percentage") or uri.endswith("set_target_position") or uri.endswith("pulse_width"):
-        # set_ command for valves / rotators
-        args.append(float(str(cmd_parts[1]).strip()))
-    elif "magnetic_field_control" in uri and uri.endswith("set_field_target"):
-        # set_ command for magnetic field setpoint
-        # cmd_parts[1] should be a , delimited list
-        cmd_args = (cmd_parts[1].strip()).split(',')
+    aliases, _, options = cmd_parts[1].partition('@')
+    aliases = [alias.strip() for alias in aliases.split(',')]
+    for alias in aliases:
         try:
-            assert len(cmd_args) == 7, "Incorrect arguments to set field"
+            assert alias.startswith("get_"), f"Not a get_ request: {alias}"
         except AssertionError as e:
             raise ValueError(e) from e
-        args.append(int(cmd_args[0].strip('[')))
-        args.append(float(cmd_args[1]))
-        args.append(float(cmd_args[2]))
-        args.append(float(cmd_args[3]))
-        args.append(int(cmd_args[4]))
-        args.append(float(cmd_args[5]))
-        if cmd_args[6].strip(']') == 'true' or cmd_args[6].strip(']') == ' True':
-            args.append(True)
-        elif cmd_args[6].strip(']') == 'false' or cmd_args[6].strip(']') == ' False':
-            args.append(False)
-    elif "magnetic_field_control" in uri and uri.endswith("set_output_current_target"):
-        # set_ command for psu current setpoint
-        # cmd_parts[1] should be a , delimited list
-        cmd_args = (cmd_parts[1].strip()).split(',')
+        # check the alias is in the command dictionary
+        decs_request_parser(alias, commands)
+    interval = None
+    deadband = None
+    for option in options.split(','):
+        option = option.strip()
+        if not option:
+            continue
+        if option.startswith("deadband="):
+            deadband = abs(float(option[len("deadband="):]))
+        else:
+            interval = float(option.removesuffix('s'))
+    try:
+        assert interval is not None and interval > 0, "SUBSCRIBE must have an @<interval>s"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    return aliases, interval, deadband
+
+def decs_sweep_parser(cmd: str, commands: dict | None = None) -> tuple:
+    """
+    From a SWEEP:set_A:<start>,<stop>,<step>,dwell=<s>;measure=get_B,get_C
+    [;record=true] string determine the set_ alias, the setpoints from
+    start to stop (inclusive), the dwell (seconds) at each setpoint, the
+    get_ aliases to measure and whether the points are to be recorded
+    """
+    cmd_parts = cmd.split(':', 2)
+    try:
+        assert len(cmd_parts) > 2, "SWEEP must have a set_ command and a :<payload>"
+        alias = cmd_parts[1].strip()
+        assert alias.startswith("set_"), f"Not a set_ command: {alias}"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    # <start>,<stop>,<step> then name=value options - the items
+    # following an option (e.g. measure=get_B,get_C) are its values
+    limits = []
+    options = {"dwell": ["0"], "measure": [], "record": ["false"]}
+    option = None
+    for item in cmd_parts[2].replace(';', ',').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, delim, value = item.partition('=')
         try:
-            assert len(cmd_args) == 6, "Incorrect arguments to set current"
+            if delim:
+                option = name.strip().lower()
+                assert option in options, f"Unknown SWEEP option: {option}"
+                options[option] = [value.strip()]
+            elif option is None:
+                limits.append(float(item))
+            else:
+                assert option == "measure", f"SWEEP {option} takes a single value"
+                options[option].append(item)
         except AssertionError as e:
             raise ValueError(e) from e
-        args.append(float(cmd_args[0].strip('[')))
-        args.append(float(cmd_args[1]))
-        args.append(float(cmd_args[2]))
-        args.append(int(cmd_args[3]))
-        args.append(float(cmd_args[4]))
-        if cmd_args[5].strip(']') == 'true' or cmd_args[5].strip(']') == ' True':
-            args.append(True)
-        elif cmd_args[5].strip(']') == 'false' or cmd_args[5].strip(']') == ' False':
-            args.append(False)
-    elif "magnetic_field_control" in uri and uri.endswith("set_state"):
-        args.append((int(str(cmd_parts[1]).strip())))
-    elif "PUBLISH" in cmd:
-        # A publication to the event log
-        cmd_args = (cmd_parts[1].strip()).split(',')
+    try:
+        assert len(limits) == 3, "SWEEP must have <start>,<stop>,<step>"
+        start, stop, step = limits
+        assert all(math.isfinite(limit) for limit in limits), \
+            "SWEEP <start>,<stop>,<step> must be finite"
+        assert step != 0, "SWEEP step must not be 0"
+        # the span (in steps) may overflow to inf for finite limits
+        span = abs(stop - start) / abs(step)
+        assert span <= SWEEP_MAX_POINTS, f"SWEEP of too many points (at most {SWEEP_MAX_POINTS})"
+        count = math.floor(span + 1e-9) + 1
+        assert count <= SWEEP_MAX_POINTS, \
+            f"SWEEP of {count} points (at most {SWEEP_MAX_POINTS})"
+        dwell = float(options["dwell"][0])
+        assert math.isfinite(dwell) and dwell >= 0, \
+            "SWEEP dwell must be finite and not negative"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    step = math.copysign(step, stop - start)
+    points = [round(start + i * step, 12) for i in range(count)]
+    # check the set_ alias can be sent, and the get_ aliases requested
+    decs_command_parser(f"{alias}:{start}", commands)
+    measure = [value for value in options["measure"] if value]
+    for value in measure:
         try:
-            assert len(cmd_args) == 2, "Incorrect arguments for publication"
+            assert value.startswith("get_"), f"Not a get_ request: {value}"
         except AssertionError as e:
             raise ValueError(e) from e
-        ts = str(int(time.time()))
-        args.append(int(10008))
-        args.append(int(0))
-        args.append(int(ts))
-        args.append(int(0))
-        args.append(int(0))
-        args.append(int(10008))
-        args.append(str((cmd_args[0]).strip('[')))
-        args.append(str((cmd_args[1]).strip(']')))
-    else:
+        decs_request_parser(value, commands)
+    record = options["record"][0].lower() == "true"
+    return alias, points, dwell, measure, record
+
+def decs_command_parser(cmd: str, commands: dict | None = None) -> tuple:
+    """
+    From the cmd string passed to the socket server, determine the correct
+    WAMP uri to call/publish and package the arguments to suit
+    """
+
+    # Check to see if there is a 'payload' for a
+    # 'set_' command - delimiter :
+    cmd_parts = cmd.split(':', 1)
+    try:
+        assert len(cmd_parts) > 1, "set_ commands must have a :<payload>"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    spec = (COMMANDS if commands is None else commands).get(cmd_parts[0].strip())
+    try:
+        assert spec is not None, "uri not returned from cmd_dict"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    if spec.packer is None:
         # currently no match for command
         raise NotImplementedError("Command / uri pattern incorrect, or not yet implemented")
+    return spec.uri, spec.packer(cmd_parts[1])
+
+# The argument packers - each takes the :<payload> of a command and
+# returns the list of arguments for the WAMP message
+
+def pack_setpoint(payload: str) -> list:
+    """
+    set_ command for temperature / pressure control setpoint
+    """
+    return [float(str(payload).strip()), 1]
+
+def pack_heater_power(payload: str, enable: bool) -> list:
+    """
+    set_ command for power - enable is False for the _OFF
+    utility commands, to ensure heater output is disabled
+    """
+    return [float(str(payload).strip()), enable]
+
+def pack_float(payload: str) -> list:
+    """
+    set_ command for valves / rotators
+    """
+    return [float(str(payload).strip())]
+
+def pack_int(payload: str) -> list:
+    """
+    set_ command for magnet states
+    """
+    return [int(str(payload).strip())]
+
+def pack_bool(text: str) -> list:
+    """
+    A true/false argument - nothing if not recognised
+    """
+    if text.strip(']') == 'true' or text.strip(']') == ' True':
+        return [True]
+    if text.strip(']') == 'false' or text.strip(']') == ' False':
+        return [False]
+    return []
+
+def pack_field_target(payload: str) -> list:
+    """
+    set_ command for magnetic field setpoint
+    payload should be a , delimited list
+    """
+    cmd_args = (payload.strip()).split(',')
+    try:
+        assert len(cmd_args) == 7, "Incorrect arguments to set field"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    args = [int(cmd_args[0].strip('[')),
+            float(cmd_args[1]),
+            float(cmd_args[2]),
+            float(cmd_args[3]),
+            int(cmd_args[4]),
+            float(cmd_args[5])]
+    return args + pack_bool(cmd_args[6])
+
+def pack_current_target(payload: str) -> list:
+    """
+    set_ command for psu current setpoint
+    payload should be a , delimited list
+    """
+    cmd_args = (payload.strip()).split(',')
+    try:
+        assert len(cmd_args) == 6, "Incorrect arguments to set current"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    args = [float(cmd_args[0].strip('[')),
+            float(cmd_args[1]),
+            float(cmd_args[2]),
+            int(cmd_args[3]),
+            float(cmd_args[4])]
+    return args + pack_bool(cmd_args[5])
+
+def pack_publication(payload: str) -> list:
+    """
+    A publication to the event log
+    """
+    cmd_args = (payload.strip()).split(',')
+    try:
+        assert len(cmd_args) == 2, "Incorrect arguments for publication"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    ts = str(int(time.time()))
+    return [int(10008),
+            int(0),
+            int(ts),
+            int(0),
+            int(0),
+            int(10008),
+            str((cmd_args[0]).strip('[')),
+            str((cmd_args[1]).strip(']'))]
+
+def select_packer(cmd: str, uri: str) -> typing.Callable | None:
+    """
+    Given the cmd and the uri - decide how to process the information
+    to form the correct WAMP messages for DECS
+    """
+    if "temperature_control" in uri and uri.endswith("setpoint"):
+        return pack_setpoint
+    if "temperature_control" in uri and uri.endswith("power"):
+        return functools.partial(pack_heater_power, enable=not cmd.endswith("OFF"))
+    if "pressure_control" in uri and uri.endswith("setpoint"):
+        return pack_setpoint
+    if uri.endswith("set_valve_open_percentage") or uri.endswith("set_target_position") \
+            or uri.endswith("pulse_width"):
+        return pack_float
+    if "magnetic_field_control" in uri and uri.endswith("set_field_target"):
+        return pack_field_target
+    if "magnetic_field_control" in uri and uri.endswith("set_output_current_target"):
+        return pack_current_target
+    if "magnetic_field_control" in uri and uri.endswith("set_state"):
+        return pack_int
+    if "PUBLISH" in cmd:
+        return pack_publication
+    return None
+
+class CommandSpec(typing.NamedTuple):
+    """
+    A command dictionary entry, compiled for dispatch
+    """
+    uri: str
+    kind: str
+    packer: typing.Callable | None
+
+def compile_commands(cmd_dict: dict) -> dict:
+    """
+    Compile a command dictionary into a table mapping each alias to its
+    uri, kind (GET / SET / PUBLISH, None if it doesn't follow the naming
+    convention) and argument packer - so the uri pattern matching is
+    done once at start up, not for every message
+    """
+    commands = {}
+    for cmd, uri in cmd_dict.items():
+        if cmd.startswith("get_"):
+            kind = GET
+        elif cmd.startswith("set_"):
+            kind = SET
+        elif cmd == "PUBLISH":
+            kind = PUBLISH
+        else:
+            kind = None
+        packer = select_packer(cmd, uri) if kind in (SET, PUBLISH) else None
+        commands[cmd] = CommandSpec(uri, kind, packer)
+    logger.debug("Compiled %d commands", len(commands))
+    return commands
+
+def command_name(cmd: str) -> str:
+    """
+    The command name - the part of a message before any :<payload>
+    """
+    return cmd.split(':', 1)[0].strip()
+
+def lookup_command(cmd: str, commands: dict | None = None) -> tuple:
+    """
+    Split a message into its command name and the CommandSpec for
+    that name (None if it is not in the command dictionary)
+    """
+    name = command_name(cmd)
+    return name, (COMMANDS if commands is None else commands).get(name)
+
+@functools.cache
+def system_commands(system_type: str) -> dict:
+    """
+    The compiled command table for a system type
+    (compiled once, however many systems share it)
+    """
+    try:
+        assert system_type in SYSTEM_TYPES, f"Unknown system type: {system_type}"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    if system_type == DEFAULT_SYSTEM_TYPE:
+        return COMMANDS
+    return compile_commands(SYSTEM_TYPES[system_type])
+
+# command kinds
+GET = "get"
+SET = "set"
+PUBLISH = "publish"
+
+DEFAULT_SYSTEM_TYPE = "Proteox"
 
-    return uri, args
+COMMANDS = compile_commands(cmd_uri)
@@ -29,6 +29,15 @@ PYTHON_MIN_MINOR = 10
 PORT = 33576
 HOST = "localhost"
 
+# Socket server mode - SERVER_MODE_THREADED runs the
+# simple_socket_server in its own thread (one client at a
+# time), SERVER_MODE_ASYNCIO runs an asyncio server on the
+# WAMP event loop that can serve many clients concurrently.
+# Can be overridden with SERVER_MODE in the .env file
+SERVER_MODE_THREADED = "threaded"
+SERVER_MODE_ASYNCIO = "asyncio"
+SERVER_MODE = SERVER_MODE_THREADED
+
 # queue message to indicate system should stop
 # this can be sent from the client.
 SHUTDOWN = "SHUTDOWN"
@@ -38,3 +47,167 @@ WRITE_DELIM = "\n"
 
 # socket server read delimiter
 READ_DELIM = "\n"
+
+# socket server receive buffer size (bytes)
+# commands are read in chunks of up to this size
+# and split on READ_DELIM
+RECV_CHUNK_SIZE = 4096
+
+# Maximum number of messages from a client connection that
+# can be waiting for a response.  With PIPELINE_DEPTH > 1
+# clients can write several commands before reading the
+# responses, get_ requests are then sent to WAMP concurrently
+# and the responses returned in order.
+# PIPELINE_DEPTH = 1 is the lock-step query/response protocol
+PIPELINE_DEPTH = 1
+
+# multi-get request prefix, e.g. MGET:get_MC_T,get_STILL_T
+# and the delimiter between the values in the response
+# (values such as field vectors are already , delimited)
+MGET = "MGET:"
+MGET_DELIM = ";"
+
+# Subscribe to the topics published by oi.DECS for the get_
+# uris in the command dictionary, and answer get_ requests
+# from the latest published value when it was received less
+# than LIVE_VALUE_MAX_AGE seconds ago (otherwise make the rRPC)
+LIVE_VALUES = False
+LIVE_VALUE_MAX_AGE = 1.0
+
+# Read-through cache for get_ requests.  Responses are kept for
+# the time-to-live (seconds) set per get_ alias in GET_CACHE_TTL,
+# or GET_CACHE_DEFAULT_TTL for aliases not listed (0 = not cached).
+# Entries are kept by uri - aliases of the same uri share one, with
+# the shortest TTL given to any of them.
+# A successful set_ invalidates every cached get_ in the same
+# uri family, e.g. set_MC_T invalidates get_MC_T_SP.
+GET_CACHE = False
+GET_CACHE_SIZE = 256
+GET_CACHE_DEFAULT_TTL = 0.0
+GET_CACHE_TTL = {
+    "get_OVC_P"     : 1.0,
+    "get_P1_P"      : 1.0,
+    "get_P2_P"      : 1.0,
+    "get_P3_P"      : 1.0,
+    "get_P4_P"      : 1.0,
+    "get_P5_P"      : 1.0,
+    "get_P6_P"      : 1.0,
+    "get_MAG_STATE" : 0.0,
+}
+
+# Coalesce identical get_ requests - a get_ for a uri that
+# is already being requested waits for, and shares, the
+# response of the request in flight rather than making
+# another rRPC
+COALESCE_GETS = True
+
+# Streaming - SUBSCRIBE:get_A,get_B@<interval>s[,deadband=<value>]
+# pushes timestamped MGET_DELIM delimited lines of values to the
+# client until UNSUBSCRIBE.  Intervals shorter than
+# STREAM_MIN_INTERVAL (seconds) are increased to it.
+SUBSCRIBE = "SUBSCRIBE:"
+UNSUBSCRIBE = "UNSUBSCRIBE"
+STREAM_MIN_INTERVAL = 0.1
+# Pushed lines never wait for a slow client - they are dropped (and
+# counted) while STREAM_MAX_QUEUED lines are waiting to be sent by the
+# threaded server, or STREAM_MAX_BUFFERED bytes by the asyncio server
+STREAM_MAX_QUEUED = 100
+STREAM_MAX_BUFFERED = 64 * 1024
+
+# Background recorder - samples the RECORD_ALIASES every
+# RECORD_INTERVAL seconds and appends the values, with their
+# oi.DECS record timestamps, to the archive in ARCHIVE_PATH
+# (see decs_visa_tools/archive.py for export to CSV / .npy)
+RECORDER = False
+RECORD_INTERVAL = 10.0
+RECORD_ALIASES = (
+    "get_MC_T",
+    "get_STILL_T",
+    "get_CP_T",
+    "get_PT2_T1",
+    "get_PT1_T1",
+    "get_OVC_P",
+)
+ARCHIVE_PATH = os.path.join(parent_directory, "archive")
+
+# In-memory history - the last HISTORY_CAPACITY values returned
+# for each get_ uri are kept, and can be requested with
+# HIST:get_A:<since_timestamp>  (0 disables the history)
+HIST = "HIST:"
+HISTORY_CAPACITY = 3600
+
+# Response format for bulk data (HIST, MGET and vector records)
+# FORMAT:BINARY - IEEE 488.2 definite-length blocks of
+# little-endian float64s, FORMAT:ASCII - delimited text (default)
+FORMAT = "FORMAT:"
+FORMAT_BINARY = "BINARY"
+FORMAT_ASCII = "ASCII"
+
+# Per-request latency tracing - each request is given an id and the
+# time (ns) spent in each stage (socket read -> queue -> parse -> WAMP
+# call -> response parse -> send) is written as a JSON line to a
+# rotating trace file in TRACE_PATH.  Off by default
+TRACE = False
+TRACE_PATH = os.path.join(parent_directory, "trace", "decs_visa_trace.jsonl")
+TRACE_MAX_BYTES = 10_000_000
+TRACE_BACKUPS = 3
+
+# Runtime metrics - request / error counts and latency histograms per
+# command, WAMP call latency per uri, queue depth and bytes in/out.
+# STATS? returns them as a JSON line, and with METRICS_PORT != 0 they
+# are also served in Prometheus text format at
+# http://METRICS_INTERFACE:METRICS_PORT/metrics
+COLLECT_METRICS = True
+STATS = "STATS?"
+METRICS_INTERFACE = "localhost"
+METRICS_PORT = 0
+
+# Offline simulator - with SIMULATOR = True (or SIMULATOR="true" in
+# the .env file) the WAMP component talks to a simulated oi.DECS
+# system (decs_visa_tools/simulator.py) rather than the router, with
+# SIMULATOR_LATENCY +/- SIMULATOR_JITTER seconds per call
+SIMULATOR = False
+SIMULATOR_LATENCY = 0.005
+SIMULATOR_JITTER = 0.001
+
+# Resilient mode - with RECONNECT = True (or RECONNECT="true" in the
+# .env file) a lost WAMP session is re-established (with exponential
+# backoff from RECONNECT_INITIAL_DELAY up to RECONNECT_MAX_DELAY
+# seconds) and control re-claimed, while the socket server and its
+# clients stay connected.  Requests wait up to RECONNECT_REQUEST_DEADLINE
+# seconds for the session, and are retried if it is lost mid-request
+RECONNECT = False
+RECONNECT_INITIAL_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+RECONNECT_REQUEST_DEADLINE = 10.0
+
+# Several systems from one process - SYSTEMS="FRIDGE1=fridge1.env,..."
+# in the .env file names each system and its profile (a .env file,
+# relative to this one, with the WAMP_ settings, an optional
+# SERVER_PORT, SYSTEM_TYPE and SIMULATOR).  SERVER_PORT then serves
+# every system, with messages routed by a prefix, e.g. FRIDGE2/get_MC_T
+SYSTEM_DELIM = "/"
+
+# Last-writer-wins set_ coalescing - a set_ for an alias in
+# SET_COALESCE_WINDOWS is held for its window (seconds) and replaced
+# by a later set_ to the same setpoint that arrives in that time (the
+# window isn't restarted, so a stream of set_ commands is still sent
+# once a window).  The replaced set_ is answered with SUPERSEDED.  Any
+# other message sends the held set_ commands first.  The heater _OFF
+# aliases are never held, and nothing is held with PIPELINE_DEPTH = 1.
+# Empty (off) by default, e.g. {"set_MC_T": 0.05}
+SET_COALESCE_WINDOWS = {}
+SUPERSEDED = "SUPERSEDED"
+
+# Sweeps - SWEEP:set_A:<start>,<stop>,<step>,dwell=<seconds>;measure=get_B,get_C
+# steps the setpoint from start to stop (inclusive), measuring the get_
+# aliases dwell seconds after each set_.  A MGET_DELIM delimited line
+# (timestamp, set_ response, measured values) is pushed to the client
+# for each point, then SWEEP_DONE (or SWEEP_FAILED and the error).
+# ;record=true also archives the points, in a new
+# sweep-<time>-<set_ alias>-<n> directory of the archive.
+# UNSUBSCRIBE stops it
+SWEEP = "SWEEP:"
+SWEEP_MAX_POINTS = 10000
+SWEEP_DONE = "SWEEP_DONE"
+SWEEP_FAILED = "SWEEP_FAILED"
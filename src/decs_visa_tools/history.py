@@ -0,0 +1,75 @@
+"""
+Module that keeps a bounded in-memory history of the
+values returned for each get_ uri
+"""
+from array import array
+
+class RingBuffer:
+    """
+    Fixed capacity buffer of (timestamp, value) pairs held in
+    typed (double) arrays - the oldest pair is overwritten when
+    the buffer is full.  Timestamps are kept strictly increasing.
+    """
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._count = 0
+
+    def append(self, timestamp: float, value: float) -> bool:
+        """
+        Add a pair, unless it isn't newer than the last one
+        (e.g. the same record read again).  Returns True if added
+        """
+        if self._count and timestamp <= self._timestamps[(self._count - 1) % self._capacity]:
+            return False
+        i = self._count % self._capacity
+        self._timestamps[i] = timestamp
+        self._values[i] = value
+        self._count += 1
+        return True
+
+    def since(self, timestamp: float) -> tuple:
+        """
+        The timestamps and values (oldest first) of the
+        pairs newer than timestamp
+        """
+        n_held = min(self._count, self._capacity)
+        first = self._count - n_held
+        # walk back from the newest pair
+        i = self._count
+        while i > first and self._timestamps[(i - 1) % self._capacity] > timestamp:
+            i -= 1
+        indices = [j % self._capacity for j in range(i, self._count)]
+        return ([self._timestamps[j] for j in indices],
+                [self._values[j] for j in indices])
+
+    def __len__(self) -> int:
+        return min(self._count, self._capacity)
+
+class History:
+    """
+    A RingBuffer per uri, created as values arrive
+    """
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._buffers = {}
+
+    def record(self, uri: str, timestamp: float, value: float) -> None:
+        """
+        Add a value for a uri
+        """
+        buffer = self._buffers.get(uri)
+        if buffer is None:
+            buffer = self._buffers[uri] = RingBuffer(self._capacity)
+        buffer.append(timestamp, value)
+
+    def since(self, uri: str, timestamp: float) -> tuple:
+        """
+        The timestamps and values held for a uri
+        that are newer than timestamp
+        """
+        buffer = self._buffers.get(uri)
+        if buffer is None:
+            return [], []
+        return buffer.since(timestamp)
@@ -0,0 +1,44 @@
+"""
+Module that holds the latest values published by oi.DECS
+for the subscribed get_ uris
+"""
+import time
+
+from autobahn.wamp.types import CallResult
+
+class LiveValueTable:
+    """
+    Latest published record for each subscribed uri, with the
+    (monotonic) time it was received
+    """
+    def __init__(self) -> None:
+        self._values = {}
+
+    def update(self, uri: str, results: tuple) -> None:
+        """
+        Store a newly published record
+        """
+        self._values[uri] = (time.monotonic(), results)
+
+    def get(self, uri: str, max_age: float) -> CallResult | None:
+        """
+        Return the record for the uri as a CallResult if it was
+        received less than max_age seconds ago, otherwise None
+        """
+        entry = self._values.get(uri)
+        if entry is None:
+            return None
+        received, results = entry
+        if time.monotonic() - received > max_age:
+            return None
+        resp = CallResult()
+        resp.results = list(results)
+        return resp
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        """
+        Remove the record of every uri that starts with prefix -
+        they are stored again as they are next published
+        """
+        for uri in [uri for uri in self._values if uri.startswith(prefix)]:
+            del self._values[uri]
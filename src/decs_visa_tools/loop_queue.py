@@ -0,0 +1,67 @@
+"""
+Module that implements a thread-safe handoff of messages from
+the socket server thread to the WAMP component event loop
+"""
+import asyncio
+import threading
+
+from .base_logger import logger
+
+class LoopQueue:
+    """
+    A queue that can be put() to from any thread and awaited
+    on an asyncio event loop.
+
+    put() wakes the event loop with call_soon_threadsafe, so the
+    consumer does not need to poll.  Messages put before the
+    event loop is bound (i.e. before the WAMP session is ready)
+    are held and delivered once it is.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._pending = []
+
+    def bind(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """
+        Bind the queue to the (running) event loop that will consume it
+        """
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        with self._lock:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            for item in self._pending:
+                self._queue.put_nowait(item)
+            self._pending.clear()
+
+    def put(self, item: any) -> None:
+        """
+        Add an item to the queue - safe to call from any thread
+        """
+        with self._lock:
+            if self._loop is None:
+                self._pending.append(item)
+                return
+            loop = self._loop
+        try:
+            loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError as e:
+            # event loop has been closed
+            logger.debug("Unable to queue message: %s", e)
+
+    async def get(self) -> any:
+        """
+        Wait for the next item - must be awaited on the bound event loop
+        """
+        return await self._queue.get()
+
+    def qsize(self) -> int:
+        """
+        Number of items waiting in the queue
+        """
+        with self._lock:
+            if self._queue is None:
+                return len(self._pending)
+            return self._queue.qsize()
@@ -0,0 +1,215 @@
+"""
+Module that keeps the runtime metrics - counters and latency
+histograms per command, per WAMP uri and per request stage -
+and renders them as JSON (STATS?) or Prometheus text
+"""
+import json
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from .decs_visa_settings import COLLECT_METRICS
+
+# histogram bucket upper bounds (seconds) - 1, 1.5, 2, 3, 5, 7
+# in each decade, so percentiles interpolated within a bucket
+# are close to those measured
+LATENCY_BUCKETS = (30e-6, 50e-6, 70e-6,
+                   100e-6, 150e-6, 200e-6, 300e-6, 500e-6, 700e-6,
+                   1e-3, 1.5e-3, 2e-3, 3e-3, 5e-3, 7e-3,
+                   10e-3, 15e-3, 20e-3, 30e-3, 50e-3, 70e-3,
+                   100e-3, 150e-3, 200e-3, 300e-3, 500e-3, 700e-3,
+                   1.0, 1.5, 2.0, 3.0, 5.0, 7.0, 10.0)
+
+# commands that aren't recognised are counted together,
+# so a misbehaving client can't grow the tables without limit
+UNKNOWN_COMMAND = "unknown"
+
+class LatencyHistogram:
+    """
+    Counts of latencies in the buckets (LATENCY_BUCKETS by default,
+    plus an overflow bucket), with their total and maximum - memory
+    use is fixed however many latencies are added
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """
+        Add a latency
+        """
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Estimate (seconds) of the latency below which the given fraction
+        of the latencies fall - interpolated linearly within its bucket,
+        as Prometheus histogram_quantile() does.  Never more than the
+        largest latency seen (which is all the overflow bucket gives)
+        """
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = bound
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Count, mean, maximum and estimated percentiles (milliseconds)
+        """
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count,
+                "mean_ms": round(1e3 * self.total / self.count, 3),
+                "max_ms": round(1e3 * self.max, 3),
+                "p50_est_ms": round(1e3 * self.percentile(0.5), 3),
+                "p90_est_ms": round(1e3 * self.percentile(0.9), 3),
+                "p99_est_ms": round(1e3 * self.percentile(0.99), 3)}
+
+class Metrics:
+    """
+    The metrics collected since DECS<->VISA started
+    """
+    def __init__(self) -> None:
+        self.started = time.time()
+        # by command name
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.latency = defaultdict(LatencyHistogram)
+        # by WAMP uri
+        self.wamp_calls = defaultdict(LatencyHistogram)
+        self.wamp_errors = defaultdict(int)
+        # by request stage (when tracing)
+        self.stages = defaultdict(LatencyHistogram)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # pushed lines dropped for clients that weren't keeping up
+        self.stream_drops = 0
+
+    def request(self, name: str, seconds: float, error: bool) -> None:
+        """
+        A client message has been handled
+        """
+        self.requests[name] += 1
+        if error:
+            self.errors[name] += 1
+        self.latency[name].observe(seconds)
+
+    def wamp_call(self, uri: str, seconds: float, error: bool) -> None:
+        """
+        A WAMP rRPC has returned
+        """
+        self.wamp_calls[uri].observe(seconds)
+        if error:
+            self.wamp_errors[uri] += 1
+
+    def stage(self, stage: str, seconds: float) -> None:
+        """
+        A request stage has completed
+        """
+        self.stages[stage].observe(seconds)
+
+    def queued(self, depth: int) -> None:
+        """
+        The number of messages waiting to be processed
+        """
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def snapshot(self, counters: dict | None = None) -> dict:
+        """
+        The metrics (plus any other counters) as a dict
+        """
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "stream_drops": self.stream_drops,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "counters": counters or {},
+            "commands": {name: {"requests": self.requests[name],
+                                "errors": self.errors[name],
+                                **histogram.summary()}
+                         for name, histogram in list(self.latency.items())},
+            "wamp": {uri: {"errors": self.wamp_errors[uri], **histogram.summary()}
+                     for uri, histogram in list(self.wamp_calls.items())},
+            "stages": {stage: histogram.summary()
+                       for stage, histogram in list(self.stages.items())},
+        }
+
+    def json(self, counters: dict | None = None) -> str:
+        """
+        The snapshot as a single line of JSON
+        """
+        return json.dumps(self.snapshot(counters), separators=(',', ':'))
+
+    def prometheus(self, counters: dict | None = None) -> str:
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        lines = []
+        def metric(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP decs_visa_{name} {help_text}")
+            lines.append(f"# TYPE decs_visa_{name} {kind}")
+        def histogram(name: str, label: str, histograms: dict) -> None:
+            for key, hist in list(histograms.items()):
+                labels = f'{label}="{escape(key)}"'
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f'decs_visa_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'decs_visa_{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f'decs_visa_{name}_sum{{{labels}}} {hist.total}')
+                lines.append(f'decs_visa_{name}_count{{{labels}}} {hist.count}')
+
+        metric("requests_total", "counter", "Client messages handled")
+        for name, count in list(self.requests.items()):
+            lines.append(f'decs_visa_requests_total{{command="{escape(name)}"}} {count}')
+        metric("errors_total", "counter", "Client messages that failed")
+        for name, count in list(self.errors.items()):
+            lines.append(f'decs_visa_errors_total{{command="{escape(name)}"}} {count}')
+        metric("request_seconds", "histogram", "Time to handle a client message")
+        histogram("request_seconds", "command", self.latency)
+        metric("wamp_call_seconds", "histogram", "WAMP rRPC latency")
+        histogram("wamp_call_seconds", "uri", self.wamp_calls)
+        metric("wamp_errors_total", "counter", "WAMP rRPCs that failed")
+        for uri, count in list(self.wamp_errors.items()):
+            lines.append(f'decs_visa_wamp_errors_total{{uri="{escape(uri)}"}} {count}')
+        metric("stage_seconds", "histogram", "Time spent in each request stage")
+        histogram("stage_seconds", "stage", self.stages)
+        metric("queue_depth", "gauge", "Messages waiting to be processed")
+        lines.append(f"decs_visa_queue_depth {self.queue_depth}")
+        metric("received_bytes_total", "counter", "Bytes received from clients")
+        lines.append(f"decs_visa_received_bytes_total {self.bytes_in}")
+        metric("sent_bytes_total", "counter", "Bytes sent to clients")
+        lines.append(f"decs_visa_sent_bytes_total {self.bytes_out}")
+        metric("stream_drops_total", "counter", "Pushed lines dropped for slow clients")
+        lines.append(f"decs_visa_stream_drops_total {self.stream_drops}")
+        for name, value in (counters or {}).items():
+            metric(f"{name}_total", "counter", name.replace('_', ' '))
+            lines.append(f"decs_visa_{name}_total {value}")
+        return '\n'.join(lines) + '\n'
+
+def escape(label: str) -> str:
+    """
+    Escape a Prometheus label value
+    """
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# None unless metrics are being collected
+METRICS = Metrics() if COLLECT_METRICS else None
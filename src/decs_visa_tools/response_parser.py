@@ -2,6 +2,9 @@
 Module that implements the WAMP response parsing
 """
 from enum import IntEnum
+from typing import NamedTuple
+
+import numpy as np
 
 from autobahn.wamp.types import CallResult
 
@@ -21,14 +24,34 @@ class OIRecordType(IntEnum):
     POWER = 70
     FREQUENCY = 80
     RESISTANCE = 90
+    QUADRATURE = 100
+    VALVE_STATE = 1000
+    PUMP_SPEED = 1010
     SW_STATE = 1020
+    ON_OFF_STATE = 1030
     HTR_POWER = 1040
     CONTROL_LOOP = 1050
+    UPS_STATE = 1060
     PRES_CONTROL_LOOP = 1070
     ANGULAR_POS = 1090
+    DIGITAL_INPUT_STATE = 1100
+    DIGITAL_OUTPUT_STATE = 1110
+    PRES_SWITCH_STATE = 1120
+    COUNT = 1200
+    PERCENTAGE = 1201
+    RATIO = 1202
     MAG_FIELD_VEC = 1400
     PSU_CURRENT_VEC = 1410
+    PSU_GROUP_STATE = 1420
+    EXCITATION = 1430
+    LAKESHORE_CONFIG = 1440
+    HE_READING_MODE = 1450
+    PROTEOX_STATE = 5000
+    RESERVOIR_STATE = 6000
+    UNKNOWN_INTEGER = 10000
     SPEED = 10010
+    UNKNOWN_STRING = 10020
+    UNKNOWN_BOOLEAN = 10030
 
 # | Value | Data Record Type                                                  |
 # |------:|:------------------------------------------------------------------|
@@ -72,75 +95,199 @@ class OIRecordType(IntEnum):
 # | 10030 | [OiUnknownBooleanRecord](#unknown-boolean-record)                 |
 
 
-def decs_response_parser(resp: CallResult) -> str:
+class RecordLayout(NamedTuple):
     """
-    Based on the response 'message type' (oiDataRecord) determine which
-    part(s) of the WAMP data record to return
+    Where the fields are in a data record - the expected number
+    of results (None if it varies), the indices of the value
+    field(s) and of the status field (None if there isn't one)
+    """
+    n_args: int | None
+    values: tuple
+    status: int | None
+
+class DecsRecord(NamedTuple):
+    """
+    A decoded data record - the value (vector values are comma
+    delimited), its status and the time (seconds since the epoch)
+    oi.DECS recorded it.  status and timestamp are None for the
+    'flat' responses that don't carry them
+    """
+    value: str
+    status: any
+    timestamp: float | None
+
+# The records have the shape
+#   [record type, ?, seconds, nanoseconds, value(s)..., status]
+# Records of the same shape share a layout - any future oi:DECS API
+# change may require these to be split out should the response
+# results be altered.
+SCALAR = RecordLayout(6, (4,), 5)
+# the value followed by the loop / switch parameters
+SCALAR_7 = RecordLayout(7, (4,), 6)
+SCALAR_8 = RecordLayout(8, (4,), 7)
+# x, y, z
+VECTOR = RecordLayout(8, (4, 5, 6), 7)
+# I, Q
+QUADRATURE = RecordLayout(7, (4, 5), 6)
+# the state records carry a variable number of detail fields
+# after the value, so their length isn't checked
+STATE = RecordLayout(None, (4,), -1)
+
+RECORD_LAYOUTS = {
+    OIRecordType.TEMPERATURE          : SCALAR,
+    OIRecordType.PRESSURE             : SCALAR,
+    OIRecordType.MASS_FLOW            : SCALAR,
+    OIRecordType.VOLUME_FLOW          : SCALAR,
+    OIRecordType.MAG_FIELD            : SCALAR,
+    OIRecordType.CURRENT              : SCALAR,
+    OIRecordType.VOLTAGE              : SCALAR,
+    OIRecordType.POWER                : SCALAR,
+    OIRecordType.FREQUENCY            : SCALAR,
+    OIRecordType.RESISTANCE           : SCALAR,
+    OIRecordType.QUADRATURE           : QUADRATURE,
+    OIRecordType.VALVE_STATE          : STATE,
+    OIRecordType.PUMP_SPEED           : STATE,
+    OIRecordType.SW_STATE             : SCALAR_7,
+    OIRecordType.ON_OFF_STATE         : STATE,
+    OIRecordType.HTR_POWER            : SCALAR_8,
+    OIRecordType.CONTROL_LOOP         : SCALAR_7,
+    OIRecordType.UPS_STATE            : STATE,
+    OIRecordType.PRES_CONTROL_LOOP    : RecordLayout(11, (5,), 10),
+    OIRecordType.ANGULAR_POS          : SCALAR_7,
+    OIRecordType.DIGITAL_INPUT_STATE  : STATE,
+    OIRecordType.DIGITAL_OUTPUT_STATE : STATE,
+    OIRecordType.PRES_SWITCH_STATE    : STATE,
+    OIRecordType.COUNT                : STATE,
+    OIRecordType.PERCENTAGE           : STATE,
+    OIRecordType.RATIO                : STATE,
+    OIRecordType.MAG_FIELD_VEC        : VECTOR,
+    OIRecordType.PSU_CURRENT_VEC      : VECTOR,
+    OIRecordType.PSU_GROUP_STATE      : STATE,
+    OIRecordType.EXCITATION           : STATE,
+    OIRecordType.LAKESHORE_CONFIG     : STATE,
+    OIRecordType.HE_READING_MODE      : STATE,
+    OIRecordType.PROTEOX_STATE        : STATE,
+    OIRecordType.RESERVOIR_STATE      : STATE,
+    OIRecordType.UNKNOWN_INTEGER      : STATE,
+    OIRecordType.SPEED                : SCALAR,
+    OIRecordType.UNKNOWN_STRING       : STATE,
+    OIRecordType.UNKNOWN_BOOLEAN      : STATE,
+}
+
+# Not all responses are consistent in the API - these catch and
+# return the 'flat' responses (e.g. magnet state) by their length
+# until the API fix is implemented
+FLAT_LAYOUTS = {
+    1 : RecordLayout(1, (0,), None),
+    2 : RecordLayout(2, (0,), None),
+    9 : RecordLayout(9, (0, 1, 2), None),
+}
+
+def record_layout(resp: CallResult) -> RecordLayout:
+    """
+    The layout of a response - raises AssertionError if the
+    response is shorter / longer than its record type allows and
+    NotImplementedError if the record type isn't known
     """
     n_args = len(resp.results)
-    if n_args == 1:
-        # Not all responses are consistent in the API - this will catch
-        # and retrun 'flat' responses until the API fix is implemented
-        logger.debug("Parsing flat response: %s", str(resp.results))
-        return str(resp.results[0])
-    if n_args == 2:
-        # Not all responses are consistent in the API - this will catch
-        # and retrun magnet state responses until the API fix is implemented
-        logger.debug("Parsing flat response: %s", str(resp.results))
-        return str(resp.results[0])
-    if n_args == 9:
-        # Not all responses are consistent in the API - this will catch
-        # and retrun magnet state responses until the API fix is implemented
-        print(resp.results)
-        logger.debug("Parsing flat response: %s", str(resp.results))
-        tuple_str = (str(resp.results[0]), str(resp.results[1]), str(resp.results[2]))
-        return ','.join(tuple_str)
-    
+    flat = FLAT_LAYOUTS.get(n_args)
+    if flat is not None:
+        return flat
     # For longer data records, the first data element
     # in the response results should be the record type
-    data_record_type = int(resp.results[0])
-
-    logger.debug("Parsing response: %s", str(resp.results))
-
-    # In principle each of these records could be handled separately, however
-    # many records have similar 'shape' so these are currently grouped together.
-    # Any future oi:DECS API change may require these to be split out should the
-    # response results be altered.
+    try:
+        record_type = int(resp.results[0])
+    except (IndexError, TypeError, ValueError):
+        record_type = resp.results[0] if n_args else None
+        layout = None
+    else:
+        layout = RECORD_LAYOUTS.get(record_type)
+    if layout is None:
+        # Shouldn't have gotten to here
+        raise NotImplementedError(f"Unable to match data record type: {str(record_type)}")
+    if layout.n_args is not None:
+        assert n_args == layout.n_args, "Length of data record inconsistent with record type"
+    else:
+        assert n_args > 4, "Length of data record inconsistent with record type"
+    return layout
 
-    # match the record type (requires python >= 3.10)
+def decs_record(resp: CallResult) -> DecsRecord:
+    """
+    Decode the value, status and timestamp of a WAMP data record -
+    errors are returned as the value
+    """
+    logger.debug("Parsing response: %s", resp.results)
     try:
-        if data_record_type == OIRecordType.TEMPERATURE or \
-                data_record_type == OIRecordType.PRESSURE or \
-                data_record_type == OIRecordType.MASS_FLOW or \
-                data_record_type == OIRecordType.VOLUME_FLOW or \
-                data_record_type == OIRecordType.MAG_FIELD or \
-                data_record_type == OIRecordType.CURRENT or \
-                data_record_type == OIRecordType.VOLTAGE or \
-                data_record_type == OIRecordType.POWER or \
-                data_record_type == OIRecordType.FREQUENCY or \
-                data_record_type == OIRecordType.RESISTANCE or \
-                data_record_type == OIRecordType.SPEED:
-            assert n_args == 6, "Length of data record inconsistent with record type"
-            return str(resp.results[4])
-        elif data_record_type == OIRecordType.CONTROL_LOOP or\
-                data_record_type == OIRecordType.ANGULAR_POS or\
-                data_record_type == OIRecordType.SW_STATE:
-            assert n_args == 7, "Length of data record inconsistent with record type"
-            return str(resp.results[4])
-        elif data_record_type == OIRecordType.HTR_POWER:
-            assert n_args == 8, "Length of data record inconsistent with record type"
-            return str(resp.results[4])
-        elif data_record_type == OIRecordType.MAG_FIELD_VEC or \
-                data_record_type == OIRecordType.PSU_CURRENT_VEC:
-            assert n_args == 8, "Length of data record inconsistent with record type"
-            tuple_str = (str(resp.results[4]), str(resp.results[5]), str(resp.results[6]))
-            return ','.join(tuple_str) 
-        elif data_record_type == OIRecordType.PRES_CONTROL_LOOP:
-            assert n_args == 11, "Length of data record inconsistent with record type"
-            return str(resp.results[5])
-        else:
-            # Shouldn't have gotten to here
-            raise NotImplementedError(f"Unable to match data record type: {str(data_record_type)}")
+        layout = record_layout(resp)
     except (AssertionError, NotImplementedError) as e:
         logger.info("Error parsing response: %s", e)
-        return str(e)
+        return DecsRecord(str(e), None, None)
+    results = resp.results
+    value = ','.join([str(results[i]) for i in layout.values])
+    if layout.status is None:
+        return DecsRecord(value, None, None)
+    try:
+        timestamp = int(results[2]) + int(results[3]) * 1e-9
+    except (TypeError, ValueError):
+        timestamp = None
+    return DecsRecord(value, results[layout.status], timestamp)
+
+def decs_response_parser(resp: CallResult) -> str:
+    """
+    Based on the response 'message type' (oiDataRecord) determine which
+    part(s) of the WAMP data record to return
+    """
+    return decs_record(resp).value
+
+def decs_record_timestamp(resp: CallResult) -> float | None:
+    """
+    The time (seconds since the epoch) that oi.DECS recorded a data
+    record, from its seconds and nanoseconds fields - or None for the
+    'flat' responses that don't carry a timestamp
+    """
+    return decs_record(resp).timestamp
+
+def decs_batch_parser(resps: list) -> tuple:
+    """
+    Decode a batch of responses in one pass into float64 arrays of
+    timestamps and values.  Entries that are exceptions (e.g. from
+    asyncio.gather(..., return_exceptions=True)), errors, vectors or
+    non-numeric values give NaN values, records without a timestamp
+    give NaN timestamps
+    """
+    _, timestamps, values = decs_batch_records(resps)
+    return timestamps, values
+
+def decs_batch_records(resps: list) -> tuple:
+    """
+    Decode a batch of responses in one pass into the value strings (as
+    decs_response_parser, with the message of any exception or error in
+    place of the value) and the float64 timestamp and value arrays of
+    decs_batch_parser
+    """
+    texts = []
+    timestamps = np.full(len(resps), np.nan)
+    values = np.full(len(resps), np.nan)
+    for i, resp in enumerate(resps):
+        if isinstance(resp, BaseException):
+            texts.append(str(resp))
+            continue
+        try:
+            layout = record_layout(resp)
+        except (AssertionError, NotImplementedError) as e:
+            logger.info("Error parsing response: %s", e)
+            texts.append(str(e))
+            continue
+        results = resp.results
+        texts.append(','.join([str(results[j]) for j in layout.values]))
+        if len(layout.values) == 1:
+            try:
+                values[i] = float(results[layout.values[0]])
+            except (TypeError, ValueError):
+                pass
+        if layout.status is not None:
+            try:
+                timestamps[i] = int(results[2]) + int(results[3]) * 1e-9
+            except (TypeError, ValueError):
+                pass
+    return texts, timestamps, values
@@ -0,0 +1,42 @@
+"""
+Module that holds the oi.DECS session metadata - the host
+details reported by *IDN? and the system control state
+"""
+from typing import NamedTuple
+
+# the uris requested (concurrently) for the metadata, in
+# the order of the SessionMetadata fields they fill
+HOST_NAME_URI = 'oi.decs.host.name'
+DECS_VERSION_URI = 'oi.decs.host.decs_version'
+CONTROL_MODE_URI = 'oi.decs.sessionmanager.system_control_mode'
+CONTROLLER_URI = 'oi.decs.sessionmanager.system_controller'
+METADATA_URIS = (HOST_NAME_URI, DECS_VERSION_URI, CONTROL_MODE_URI, CONTROLLER_URI)
+# published when the control state changes
+CONTROL_STATE_URIS = (CONTROL_MODE_URI, CONTROLLER_URI)
+
+class SessionMetadata(NamedTuple):
+    """
+    Host name and oi.DECS version, whether the system is in remote
+    control mode and the current controller ("" if uncontrolled)
+    """
+    host_name: str
+    version: str
+    is_controllable: bool
+    controller: str
+
+    @classmethod
+    def from_responses(cls, resps: list) -> "SessionMetadata":
+        """
+        Build the metadata from the CallResults for METADATA_URIS
+        """
+        host_name, version, control_mode, controller = (resp.results for resp in resps)
+        return cls(host_name=str(host_name[0]),
+                   version=str(version[0]),
+                   is_controllable=int(control_mode[0]) == 1,
+                   controller=str(controller[1]) if int(controller[0]) != 0 else "")
+
+    def idn(self) -> str:
+        """
+        The *IDN? response
+        """
+        return f"Oxford Instruments, oi.DECS, {self.host_name}, {self.version}"
@@ -0,0 +1,279 @@
+"""
+Module that simulates an oi.DECS system, so DECS<->VISA can be run
+(and its performance measured) without a router or hardware.
+
+The simulator keeps a plausible state for the temperatures, heaters,
+pressures, flows and the magnet, applies set_ commands with simple
+dynamics (first order lags towards the temperature targets, linear
+magnet ramps) and answers with records of the real OIRecordType
+layouts - including the 'flat' 1-, 2- and 9-element responses.
+"""
+import asyncio
+import collections
+import math
+import random
+import time
+
+from autobahn.wamp import exception as wamp_exceptions
+from autobahn.wamp.types import CallResult
+
+from .response_parser import OIRecordType
+from .session_metadata import HOST_NAME_URI, DECS_VERSION_URI
+from .session_metadata import CONTROL_MODE_URI, CONTROLLER_URI
+
+# base temperatures (K) of the sensors, by sensor name
+BASE_TEMPERATURES = {
+    "DRI_MIX_S" : 0.010,
+    "DRI_STL_S" : 0.80,
+    "DRI_CLD_S" : 0.10,
+    "SRB_GGS_S" : 4.0,
+    "DRI_PT2_S" : 3.5,
+    "PTR1_PT2_S": 3.2,
+    "DRI_PT1_S" : 45.0,
+    "PTR1_PT1_S": 42.0,
+    "MAG_MSP_S" : 3.8,
+}
+DEFAULT_TEMPERATURE = 4.0
+# pressures (mbar), by gauge name
+PRESSURES = {
+    "OVC_PG_01" : 1.5e-7,
+    "3CL_PG_01" : 2.0e-1,
+    "3CL_PG_02" : 5.0e-3,
+    "3CL_PG_03" : 1.2,
+    "3CL_PG_04" : 8.0e1,
+    "3CL_PG_05" : 1.0e2,
+    "3CL_PG_06" : 6.5e2,
+}
+# flow (umol/s) with no still heating, and its increase per unit still power
+BASE_FLOW = 250.0
+FLOW_PER_POWER = 2.0e5
+# K per unit of heater power
+HEATER_GAIN = 100.0
+# seconds for a temperature to move 63% of the way to its target
+TIME_CONSTANT = 10.0
+# relative noise on the readings
+NOISE = 1e-3
+# magnet ramp rate (T/min) if none is given
+DEFAULT_RAMP_RATE = 0.1
+# the publications kept
+EVENT_LOG_SIZE = 1000
+
+class TemperatureChannel:
+    """
+    A temperature following a first order lag towards its target
+    """
+    def __init__(self, base: float) -> None:
+        self.base = base
+        self.value = base
+        self.target = base
+        self.updated = time.monotonic()
+
+    def read(self, tau: float) -> float:
+        """
+        Advance the lag to now, and return a (noisy) reading
+        """
+        now = time.monotonic()
+        self.value += (self.target - self.value) * (1 - math.exp(-(now - self.updated) / tau))
+        self.updated = now
+        return self.value * (1 + random.gauss(0, NOISE))
+
+class MagnetAxis:
+    """
+    A magnet field / current ramping linearly to its target
+    """
+    def __init__(self) -> None:
+        self.start = 0.0
+        self.target = 0.0
+        self.rate = DEFAULT_RAMP_RATE / 60
+        self.started = time.monotonic()
+
+    def ramp_to(self, target: float, rate_per_min: float) -> None:
+        """
+        Start a ramp from the present value
+        """
+        self.start = self.value()
+        self.target = target
+        self.rate = abs(rate_per_min or DEFAULT_RAMP_RATE) / 60
+        self.started = time.monotonic()
+
+    def value(self) -> float:
+        """
+        The present value
+        """
+        moved = self.rate * (time.monotonic() - self.started)
+        if moved >= abs(self.target - self.start):
+            return self.target
+        return self.start + math.copysign(moved, self.target - self.start)
+
+    def ramping(self) -> bool:
+        """
+        Has the ramp still to reach its target
+        """
+        return self.value() != self.target
+
+class DecsSimulator:
+    """
+    A simulated oi.DECS system - call() answers a WAMP rRPC after
+    latency (+/- jitter, gaussian) seconds, publish() records to
+    the event log.  Unknown uris raise the WAMP no_such_procedure error
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 user_name: str = "simulator", time_constant: float = TIME_CONSTANT,
+                 host_name: str = "decs-simulator", version: str = "0.0.0-sim") -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.time_constant = time_constant
+        self.host_name = host_name
+        self.version = version
+        # the user that claims control
+        self.user_name = user_name
+        self.controller = ""
+        self.temperatures = {}
+        # control loop setpoints and heater powers, by uri prefix
+        self.setpoints = {}
+        self.powers = {}
+        self.field = [MagnetAxis() for _ in range(3)]
+        self.current = [MagnetAxis() for _ in range(3)]
+        self.magnet_state = 0
+        self.events = collections.deque(maxlen=EVENT_LOG_SIZE)
+
+    async def call(self, uri: str, *args) -> CallResult:
+        """
+        Answer a WAMP rRPC
+        """
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        return self.respond(uri, args)
+
+    def publish(self, topic: str, *args) -> None:
+        """
+        A publication - kept in the event log
+        """
+        self.events.append((topic, args))
+
+    async def subscribe(self, handler, topic: str) -> None:
+        """
+        A subscription - accepted, but the simulator doesn't publish
+        """
+        return None
+
+    def respond(self, uri: str, args: tuple) -> CallResult:
+        """
+        The record for a uri, after applying any set_ arguments
+        """
+        seconds, nanoseconds = divmod(time.time_ns(), 1_000_000_000)
+        stamp = (0, seconds, nanoseconds)
+        prefix, _, name = uri.rpartition('.')
+
+        # session / host
+        if uri == HOST_NAME_URI:
+            return CallResult(self.host_name)
+        if uri == DECS_VERSION_URI:
+            return CallResult(self.version)
+        if uri == CONTROL_MODE_URI:
+            return CallResult(1)
+        if uri == CONTROLLER_URI:
+            return CallResult(1 if self.controller else 0, self.controller)
+        if uri.endswith("claim_system_control"):
+            self.controller = self.user_name
+            return CallResult(1, self.controller)
+        if uri.endswith("relinquish_system_control"):
+            self.controller = ""
+            return CallResult(1)
+
+        # temperature control
+        if name == "temperature":
+            reading = self.temperature(prefix).read(self.time_constant)
+            return CallResult(int(OIRecordType.TEMPERATURE), *stamp, reading, 0)
+        if name == "setpoint":
+            if args:
+                self.setpoints[prefix] = float(args[0])
+                self.update_targets()
+            return CallResult(int(OIRecordType.CONTROL_LOOP), *stamp,
+                              self.setpoints.get(prefix, 0.0), 1, 1)
+        if name == "power":
+            if args:
+                enabled = len(args) < 2 or bool(args[1])
+                self.powers[prefix] = float(args[0]) if enabled else 0.0
+                self.update_targets()
+            return CallResult(int(OIRecordType.HTR_POWER), *stamp,
+                              self.powers.get(prefix, 0.0), 1, 1, 0)
+
+        # pressures / flows
+        if name == "pressure":
+            gauge = prefix.rpartition('.')[2]
+            reading = PRESSURES.get(gauge, 1.0) * (1 + random.gauss(0, NOISE))
+            return CallResult(int(OIRecordType.PRESSURE), *stamp, reading, 0)
+        if name == "flow":
+            still_power = sum(p for heater, p in self.powers.items() if "STL" in heater)
+            reading = (BASE_FLOW + FLOW_PER_POWER * still_power) * (1 + random.gauss(0, NOISE))
+            return CallResult(int(OIRecordType.MASS_FLOW), *stamp, reading, 0)
+
+        # magnet
+        if name == "set_field_target":
+            # [mode, x, y, z, ?, rate, ...]
+            rate = float(args[5]) if len(args) > 5 else DEFAULT_RAMP_RATE
+            for axis, target in zip(self.field, args[1:4]):
+                axis.ramp_to(float(target), rate)
+            return CallResult(int(OIRecordType.MAG_FIELD_VEC), *stamp,
+                              *(axis.target for axis in self.field), 0)
+        if name == "magnetic_field_vector":
+            return CallResult(int(OIRecordType.MAG_FIELD_VEC), *stamp,
+                              *(axis.value() for axis in self.field), 0)
+        if name == "set_output_current_target":
+            # [x, y, z, ?, rate, ...]
+            rate = float(args[4]) if len(args) > 4 else DEFAULT_RAMP_RATE
+            for axis, target in zip(self.current, args[0:3]):
+                axis.ramp_to(float(target), rate)
+            return CallResult(int(OIRecordType.PSU_CURRENT_VEC), *stamp,
+                              *(axis.target for axis in self.current), 0)
+        if name == "current_vector":
+            return CallResult(int(OIRecordType.PSU_CURRENT_VEC), *stamp,
+                              *(axis.value() for axis in self.current), 0)
+        if name == "output_current_target":
+            # 'flat' response
+            return CallResult(','.join(str(axis.target) for axis in self.current))
+        if name == "set_state":
+            if args:
+                self.magnet_state = int(args[0])
+            # 'flat' response
+            return CallResult(self.magnet_state)
+        if name == "state" and prefix.endswith("SWZ"):
+            # 'flat' switch heater response - state, and whether it is changing
+            return CallResult("ON" if self.magnet_state else "OFF", 0)
+        if name == "state":
+            # 'flat' magnet state response - state of each axis, and details
+            axes = ["RAMPING" if axis.ramping() else "HOLD" for axis in self.field]
+            return CallResult(*axes, self.magnet_state, *(axis.target for axis in self.field),
+                              DEFAULT_RAMP_RATE, 0)
+
+        raise wamp_exceptions.ApplicationError('wamp.error.no_such_procedure',
+                                               f"no callee registered for procedure <{uri}>")
+
+    def temperature(self, prefix: str) -> TemperatureChannel:
+        """
+        The channel for a sensor, created on first use
+        """
+        channel = self.temperatures.get(prefix)
+        if channel is None:
+            sensor = prefix.rpartition('.')[2]
+            channel = TemperatureChannel(BASE_TEMPERATURES.get(sensor, DEFAULT_TEMPERATURE))
+            self.temperatures[prefix] = channel
+            self.update_targets()
+        return channel
+
+    def update_targets(self) -> None:
+        """
+        Recompute the temperature targets from the setpoints and heaters -
+        a control loop (X_CL) holds the sensors under it at its setpoint, a
+        heater (X_H) warms its sensor (X_S) in proportion to its power
+        """
+        for prefix, channel in self.temperatures.items():
+            target = channel.base
+            for loop, setpoint in self.setpoints.items():
+                if prefix.startswith(loop + '.') and setpoint > 0:
+                    target = max(target, setpoint)
+            for heater, power in self.powers.items():
+                if heater.endswith("_H") and prefix.endswith(heater[:-2] + "_S"):
+                    target += HEATER_GAIN * power
+            channel.target = target
@@ -0,0 +1,29 @@
+"""
+The messages passed between the socket servers and the WAMP
+component - kept apart from the socket servers so the WAMP
+component can use them without importing the threaded server
+"""
+# response write delimiter
+from .decs_visa_settings import WRITE_DELIM
+
+# queue message to let the WAMP component know the client has
+# disconnected, and its reply once all responses have been sent
+CLIENT_DISCONNECTED = object()
+CONNECTION_CLOSED = object()
+
+class StreamLine(str):
+    """
+    A line pushed to the client (e.g. a streamed value) rather
+    than the response to a message
+    """
+
+def format_message(resp: str) -> bytes:
+    """
+    Utility function to add a delimiter and
+    utf-8 encode a WAMP response for sending
+    (binary block responses are sent as they are)
+    """
+    if isinstance(resp, bytes):
+        return resp + WRITE_DELIM.encode('utf-8')
+    msg = str(resp)+WRITE_DELIM
+    return msg.encode('utf-8')
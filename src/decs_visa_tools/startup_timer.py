@@ -0,0 +1,31 @@
+"""
+Module that times the phases of start up (and of re-establishing
+a lost WAMP session) - the breakdown is logged once the WAMP
+component is ready to process requests
+"""
+import time
+
+class PhaseTimer:
+    """
+    The durations of consecutive, named phases
+    """
+    def __init__(self, name: str, started: float | None = None) -> None:
+        self.name = name
+        self.started = time.perf_counter() if started is None else started
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, phase: str) -> None:
+        """
+        The phase has just finished
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self) -> str:
+        """
+        The phase durations and the total, in ms
+        """
+        phases = ", ".join(f"{phase} {1000 * seconds:.1f} ms" for phase, seconds in self.phases)
+        return f"{self.name}: {phases} (total {1000 * (self.last - self.started):.1f} ms)"
@@ -0,0 +1,89 @@
+"""
+Module that records per-request latency traces - the time spent
+in each stage of handling a client message, written as one compact
+JSON line per request to a rotating trace file
+"""
+import itertools
+import json
+import logging
+import os
+import time
+from logging.handlers import RotatingFileHandler
+
+from .decs_visa_settings import TRACE
+from .decs_visa_settings import TRACE_PATH
+from .decs_visa_settings import TRACE_MAX_BYTES
+from .decs_visa_settings import TRACE_BACKUPS
+from .metrics import METRICS
+
+class Trace:
+    """
+    The perf_counter_ns() time at which a request
+    completed each stage, starting from its socket read
+    """
+    __slots__ = ('trace_id', 'command', 'received', 'stamps')
+
+    def __init__(self, trace_id: int, command: str) -> None:
+        self.trace_id = trace_id
+        self.command = command
+        self.received = time.time()
+        self.stamps = [("read", time.perf_counter_ns())]
+
+    def stamp(self, stage: str) -> None:
+        """
+        Mark the end of a stage
+        """
+        self.stamps.append((stage, time.perf_counter_ns()))
+
+    def record(self) -> dict:
+        """
+        The trace as the time (ns) spent in each stage
+        """
+        stages = {stage: end - start for (_, start), (stage, end)
+                  in zip(self.stamps, self.stamps[1:])}
+        return {"id": self.trace_id, "cmd": self.command,
+                "t": round(self.received, 6),
+                "total": self.stamps[-1][1] - self.stamps[0][1],
+                "ns": stages}
+
+class TracedLine(str):
+    """
+    A client message carrying its Trace
+    """
+    trace = None
+
+class Tracer:
+    """
+    Hands out the Traces and writes the finished ones
+    """
+    def __init__(self, path: str, max_bytes: int, backups: int) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._ids = itertools.count(1)
+        self._writer = logging.getLogger(__name__)
+        self._writer.setLevel(logging.INFO)
+        self._writer.propagate = False
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._writer.addHandler(handler)
+
+    def start(self, msg: str) -> TracedLine:
+        """
+        Start tracing a message that has just been read
+        """
+        line = TracedLine(msg)
+        line.trace = Trace(next(self._ids), msg)
+        return line
+
+    def finish(self, trace: Trace) -> None:
+        """
+        Mark the response as sent and write the trace
+        """
+        trace.stamp("send")
+        record = trace.record()
+        if METRICS is not None:
+            for stage, ns in record["ns"].items():
+                METRICS.stage(stage, ns * 1e-9)
+        self._writer.info(json.dumps(record, separators=(',', ':')))
+
+# None unless tracing is enabled
+TRACER = Tracer(TRACE_PATH, TRACE_MAX_BYTES, TRACE_BACKUPS) if TRACE else None
@@ -0,0 +1,64 @@
+"""
+Module that implements a read-through cache for get_ responses
+"""
+import time
+from collections import OrderedDict
+
+from autobahn.wamp.types import CallResult
+
+class TTLCache:
+    """
+    Size bounded cache of WAMP responses keyed by uri, each
+    entry expires ttl seconds after it was stored.
+
+    The least recently used entry is evicted when the cache is
+    full.  Invalidation bumps a generation count, so a response
+    requested before an invalidation is not stored afterwards.
+    """
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, uri: str) -> CallResult | None:
+        """
+        Return the cached response for the uri, or None
+        if there isn't one or it has expired
+        """
+        entry = self._entries.get(uri)
+        if entry is not None:
+            expires, resp = entry
+            if time.monotonic() < expires:
+                self._entries.move_to_end(uri)
+                self.hits += 1
+                return resp
+            del self._entries[uri]
+        self.misses += 1
+        return None
+
+    def put(self, uri: str, resp: CallResult, ttl: float, generation: int) -> None:
+        """
+        Store a response for ttl seconds - unless the cache has been
+        invalidated since generation (when the request was made)
+        """
+        if ttl <= 0 or generation != self.generation:
+            return
+        self._entries[uri] = (time.monotonic() + ttl, resp)
+        self._entries.move_to_end(uri)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        """
+        Remove every entry whose uri starts with prefix
+        """
+        self.generation += 1
+        for uri in [uri for uri in self._entries if uri.startswith(prefix)]:
+            del self._entries[uri]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,253 @@
+"""
+Asynchronous load generator for soak testing the DECS<->VISA
+socket server.
+
+Opens several raw socket connections (and/or several pipelined
+streams on each connection), replays a weighted mix of commands at
+a target rate and reports the achieved throughput, the latency
+distribution and the error counts, e.g. from the /src folder:
+
+    python load_generator.py --connections 4 --rate 200 --duration 3600
+    python load_generator.py --connections 1 --depth 8 --mix get_MC_T=3 get_OVC_P=1
+
+By default the mix is every get_ alias in the command dictionary,
+so the load doesn't change the state of the system - set_ commands
+have to be given explicitly with --mix.  Pipelined streams (--depth
+> 1) need PIPELINE_DEPTH >= depth on the server.
+
+With a --rate, latencies are measured from when each command was
+scheduled to be sent, so time spent waiting for a free slot (the
+server falling behind) is included rather than hidden.  Latencies
+are kept in fixed size histograms, so memory use doesn't grow over
+a long soak.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import sys
+import time
+
+from decs_visa_tools.command_dictionary import Proteox_cmd_uri as cmd_uri
+from decs_visa_tools.decs_visa_settings import HOST, PORT
+from decs_visa_tools.decs_visa_settings import READ_DELIM, WRITE_DELIM
+from decs_visa_tools.decs_visa_settings import SHUTDOWN
+from decs_visa_tools.metrics import LatencyHistogram
+
+# histogram bucket upper bounds (seconds) - 20 log spaced buckets
+# per decade from 10 us to 100 s, so the percentiles are within ~6%
+SOAK_BUCKETS = tuple(1e-5 * 10 ** (i / 20) for i in range(141))
+
+# responses that report a failure
+ERROR_MARKERS = ("Unkown command", "uri not returned", "wamp.error",
+                 "Error", "Unable to", "not yet implemented", "Incorrect arguments")
+
+def default_mix() -> dict:
+    """
+    Every get_ alias, equally weighted (apart from
+    the ones that only exist to test WAMP errors)
+    """
+    return {alias: 1.0 for alias in cmd_uri
+            if alias.startswith("get_") and "WAMP_error" not in alias}
+
+def parse_mix(items: list) -> dict:
+    """
+    command=weight items (weight defaults to 1)
+    """
+    mix = {}
+    for item in items:
+        command, _, weight = item.rpartition('=') if '=' in item else (item, '', '1')
+        mix[command] = float(weight)
+    return mix
+
+class Results:
+    """
+    Round trip latency histograms (seconds) and error counts - in
+    total, and since the last interim report - with the commands sent
+    and the furthest sending fell behind the target rate
+    """
+    def __init__(self) -> None:
+        self.latencies = LatencyHistogram(SOAK_BUCKETS)
+        self.errors = collections.Counter()
+        self.sent = 0
+        self.max_send_lag = 0.0
+        self.interval_latencies = LatencyHistogram(SOAK_BUCKETS)
+        self.interval_errors = 0
+        self.interval_sent = 0
+
+    def sending(self, lag: float) -> None:
+        """
+        Record a command sent lag seconds after it was scheduled
+        """
+        self.sent += 1
+        self.interval_sent += 1
+        self.max_send_lag = max(self.max_send_lag, lag)
+
+    def response(self, command: str, resp: str, latency: float) -> None:
+        """
+        Record a response
+        """
+        self.latencies.observe(latency)
+        self.interval_latencies.observe(latency)
+        if any(marker in resp for marker in ERROR_MARKERS):
+            self.errors[command] += 1
+            self.interval_errors += 1
+
+    def error(self, kind: str) -> None:
+        """
+        Record a failure with no response
+        """
+        self.errors[kind] += 1
+        self.interval_errors += 1
+
+def summary(latencies: LatencyHistogram, elapsed: float) -> dict:
+    """
+    Throughput and latency percentiles (ms, estimated from the histogram)
+    """
+    if not latencies.count:
+        return {"responses": 0, "cmds_per_s": 0.0}
+    def pct(fraction: float) -> float:
+        return round(1e3 * latencies.percentile(fraction), 3)
+    return {"responses": latencies.count,
+            "cmds_per_s": round(latencies.count / elapsed, 1),
+            "mean_ms": round(1e3 * latencies.total / latencies.count, 3),
+            "p50_ms": pct(0.5), "p90_ms": pct(0.9), "p99_ms": pct(0.99),
+            "p999_ms": pct(0.999), "max_ms": round(1e3 * latencies.max, 3)}
+
+async def run_connection(host: str, port: int, commands: list, weights: list,
+                         rate: float, depth: int, deadline: float,
+                         timeout: float, results: Results) -> None:
+    """
+    One connection - send commands from the mix at rate (per second,
+    0 for as fast as possible) with up to depth waiting for a response.
+    At a rate the send times are scheduled in advance (and kept to, to
+    catch up, if sending falls behind) and latency is measured from
+    the scheduled time, not from when a slot became free
+    """
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        results.error(f"connect: {e.__class__.__name__}")
+        return
+    loop = asyncio.get_running_loop()
+    window = asyncio.Semaphore(depth)
+    # (command, scheduled send time) of the commands awaiting
+    # a response, None once sending has finished
+    in_flight = asyncio.Queue()
+    delim = WRITE_DELIM.encode('utf-8')
+
+    async def send() -> None:
+        next_send = loop.time()
+        while loop.time() < deadline:
+            if rate:
+                next_send += random.expovariate(rate)
+                await asyncio.sleep(max(0.0, next_send - loop.time()))
+                await window.acquire()
+                scheduled = next_send
+            else:
+                await window.acquire()
+                scheduled = loop.time()
+            command = random.choices(commands, weights)[0]
+            results.sending(loop.time() - scheduled)
+            in_flight.put_nowait((command, scheduled))
+            writer.write((command + READ_DELIM).encode('utf-8'))
+            await writer.drain()
+        in_flight.put_nowait(None)
+
+    async def receive() -> None:
+        while (item := await in_flight.get()) is not None:
+            command, sent = item
+            line = await asyncio.wait_for(reader.readuntil(delim), timeout)
+            resp = line[:-len(delim)].decode('utf-8', errors='replace')
+            if resp == SHUTDOWN:
+                raise ConnectionAbortedError("server shut down")
+            results.response(command, resp, loop.time() - sent)
+            window.release()
+
+    sender = asyncio.ensure_future(send())
+    try:
+        await receive()
+    except asyncio.TimeoutError:
+        results.error("timeout")
+    except (asyncio.IncompleteReadError, ConnectionError) as e:
+        results.error(f"connection: {e.__class__.__name__}")
+    finally:
+        sender.cancel()
+        writer.close()
+
+async def report(results: Results, interval: float, rate: float) -> None:
+    """
+    Print an interim report every interval seconds
+    """
+    target = f" (target {rate:.1f})" if rate else ""
+    while True:
+        await asyncio.sleep(interval)
+        stats = summary(results.interval_latencies, interval)
+        print(f"{time.strftime('%H:%M:%S')}  {stats['cmds_per_s']:8.1f} cmd/s"
+              f"  sent {results.interval_sent / interval:8.1f}/s{target}"
+              f"  p50 {stats.get('p50_ms', 0):7.2f} ms  p99 {stats.get('p99_ms', 0):7.2f} ms"
+              f"  errors {results.interval_errors}", flush=True)
+        results.interval_latencies = LatencyHistogram(SOAK_BUCKETS)
+        results.interval_errors = 0
+        results.interval_sent = 0
+
+async def run(args) -> dict:
+    """
+    Run the load and return the final report
+    """
+    mix = parse_mix(args.mix) if args.mix else default_mix()
+    commands, weights = list(mix), list(mix.values())
+    results = Results()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + args.duration
+    per_connection_rate = args.rate / args.connections
+    reporter = asyncio.ensure_future(report(results, args.report_interval, args.rate))
+    await asyncio.gather(*(run_connection(args.host, args.port, commands, weights,
+                                          per_connection_rate, args.depth, deadline,
+                                          args.timeout, results)
+                           for _ in range(args.connections)))
+    reporter.cancel()
+    elapsed = loop.time() - started
+    return {"connections": args.connections, "depth": args.depth,
+            "target_rate": args.rate, "duration_s": round(elapsed, 3),
+            "sent": results.sent, "sent_per_s": round(results.sent / elapsed, 1),
+            "max_send_lag_ms": round(1e3 * results.max_send_lag, 3),
+            "mix": mix, **summary(results.latencies, elapsed),
+            "errors": dict(results.errors), "error_count": sum(results.errors.values())}
+
+def main():
+    """
+    The load generator
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--connections', type=int, default=1,
+                        help="socket connections to open")
+    parser.add_argument('--depth', type=int, default=1,
+                        help="pipelined commands in flight per connection")
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help="target commands per second, in total (0 = as fast as possible)")
+    parser.add_argument('--duration', type=float, default=60.0, help="seconds")
+    parser.add_argument('--mix', nargs='+', metavar="COMMAND=WEIGHT",
+                        help="commands to send, with relative weights")
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help="seconds to wait for a response")
+    parser.add_argument('--report-interval', type=float, default=10.0,
+                        help="seconds between interim reports")
+    parser.add_argument('--output', help="write the final report as JSON")
+    args = parser.parse_args()
+
+    final = asyncio.run(run(args))
+    print(json.dumps(final, indent=1))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(final, f, indent=1)
+    if final["error_count"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
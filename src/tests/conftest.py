@@ -0,0 +1,33 @@
+"""
+The modules are imported as they are by decs_visa.py - from the /src folder
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autobahn.wamp.types import ComponentConfig
+
+from decs_visa_components.wamp_component import Component
+from decs_visa_tools.simulator import DecsSimulator
+
+@pytest.fixture
+def make_component():
+    """
+    Makes WAMP components answered by their own simulator, rather than oi.DECS
+    """
+    def make(**extra):
+        return Component(ComponentConfig("realm", extra=dict(
+            input_queue=None, output_queue=None, server_mode="asyncio", interface="localhost",
+            server_port=None, user_name="user", user_secret=None, backend=DecsSimulator(),
+            **extra)))
+    return make
+
+@pytest.fixture
+def component(make_component):
+    """
+    A WAMP component answered by the simulator, rather than oi.DECS
+    """
+    return make_component()
@@ -0,0 +1,39 @@
+"""
+Appending to and reading ranges from the columnar archive
+"""
+import os
+
+from decs_visa_tools.archive import Archive, RECORD_DTYPE
+
+def test_range_read(tmp_path):
+    archive = Archive(str(tmp_path))
+    for i in range(10):
+        archive.append("get_MC_T", 100.0 + i, 0.01 * i)
+    archive.flush()
+    records = archive.read("get_MC_T", 102.0, 105.0)
+    assert records['timestamp'].tolist() == [102.0, 103.0, 104.0]
+    assert records['value'].tolist() == [0.02, 0.03, 0.04]
+    # between records, and open ended
+    assert archive.read("get_MC_T", 102.5, 104.5)['timestamp'].tolist() == [103.0, 104.0]
+    assert archive.read("get_MC_T", start=108.0)['timestamp'].tolist() == [108.0, 109.0]
+    assert len(archive.read("get_MC_T", end=100.0)) == 0
+    assert len(archive.read("get_MC_T")) == 10
+    assert archive.channels() == ["get_MC_T"]
+    archive.close()
+
+def test_unflushed_and_partly_written_records_are_ignored(tmp_path):
+    archive = Archive(str(tmp_path))
+    channel = archive.channel("get_MC_T")
+    assert channel.last_timestamp() is None
+    assert len(channel.read()) == 0
+    channel.append(100.0, 0.01)
+    channel.append(101.0, 0.02)
+    channel.flush()
+    assert channel.last_timestamp() == 101.0
+    channel.close()
+    # a record cut short by the recorder stopping
+    with open(channel.path, 'ab') as f:
+        f.write(b'\0' * (RECORD_DTYPE.itemsize // 2))
+    assert os.path.getsize(channel.path) % RECORD_DTYPE.itemsize
+    assert channel.last_timestamp() == 101.0
+    assert len(channel.read()) == 2
@@ -0,0 +1,35 @@
+"""
+IEEE 488.2 definite-length binary blocks
+"""
+import math
+import struct
+
+from decs_visa_tools.binary_block import definite_length_block, text_to_floats
+
+def parse_block(block: bytes) -> list:
+    """
+    Read a block as an instrument client would
+    """
+    assert block[:1] == b"#"
+    n_digits = int(block[1:2])
+    length = int(block[2:2 + n_digits])
+    payload = block[2 + n_digits:]
+    assert len(payload) == length
+    return list(struct.unpack(f"<{length // 8}d", payload))
+
+def test_header_and_payload():
+    block = definite_length_block([0.1, -0.2, 0.3])
+    # 24 bytes, a 2 digit length
+    assert block.startswith(b"#224")
+    assert parse_block(block) == [0.1, -0.2, 0.3]
+
+def test_header_digits_grow_with_the_length():
+    assert definite_length_block([]) == b"#10"
+    assert definite_length_block([1.0]).startswith(b"#18")
+    assert definite_length_block([1.0] * 13).startswith(b"#3104")
+    assert parse_block(definite_length_block([2.5] * 200)) == [2.5] * 200
+
+def test_text_to_floats():
+    assert text_to_floats("0.1,0.2,0.3") == [0.1, 0.2, 0.3]
+    assert text_to_floats("1e-05") == [1e-05]
+    assert [math.isnan(value) for value in text_to_floats("HOLD")] == [True]
@@ -0,0 +1,80 @@
+"""
+Compiling the command dictionary and parsing the socket commands
+"""
+import pytest
+
+from decs_visa_tools.command_parser import (
+    COMMANDS, GET, PUBLISH, SET, command_name, compile_commands, decs_command_parser,
+    decs_sweep_parser, get_cache_ttls, lookup_command, pack_heater_power, pack_setpoint)
+
+MC_T = "oi.decs.temperature_control.DRI_MIX_CL.DRI_MIX_S.temperature"
+MC_T_SP = "oi.decs.temperature_control.DRI_MIX_CL.setpoint"
+MC_H = "oi.decs.temperature_control.DRI_MIX_CL.DRI_MIX_H.power"
+
+def test_compile_commands_kinds_and_packers():
+    commands = compile_commands({
+        "get_MC_T": MC_T,
+        "set_MC_T": MC_T_SP,
+        "set_MC_H_OFF": MC_H,
+        "set_UNKNOWN": "oi.decs.unknown",
+        "PUBLISH": "oi.decs.proteox.eventlog",
+        "*IDN?": "oi.decs.sessionmanager.idn"})
+    assert commands["get_MC_T"] == (MC_T, GET, None)
+    assert commands["set_MC_T"] == (MC_T_SP, SET, pack_setpoint)
+    assert commands["set_UNKNOWN"] == ("oi.decs.unknown", SET, None)
+    assert commands["PUBLISH"].kind == PUBLISH
+    assert commands["*IDN?"].kind is None
+    # the _OFF heater commands disable the output
+    assert commands["set_MC_H_OFF"].packer("0") == [0.0, False]
+    assert commands["set_MC_H_OFF"].packer.func is pack_heater_power
+
+def test_lookup_command():
+    assert command_name(" set_MC_T :0.1") == "set_MC_T"
+    assert lookup_command("set_MC_T:0.1") == ("set_MC_T", COMMANDS["set_MC_T"])
+    assert lookup_command("get_MC_T") == ("get_MC_T", COMMANDS["get_MC_T"])
+    assert lookup_command("get_NOTHING") == ("get_NOTHING", None)
+
+def test_decs_command_parser():
+    assert decs_command_parser("set_MC_T: 0.1") == (MC_T_SP, [0.1, 1])
+    assert decs_command_parser("set_MC_H:1e-6") == (MC_H, [1e-6, True])
+    with pytest.raises(ValueError):
+        decs_command_parser("set_MC_T")
+    with pytest.raises(ValueError):
+        decs_command_parser("set_NOTHING:1")
+
+def test_get_cache_ttls_are_keyed_by_uri():
+    # get_MC_T_SP reads the uri that set_MC_T writes - a set_
+    # alias has no TTL of its own, and unknown aliases are ignored
+    ttls = get_cache_ttls({"get_MC_T": 0.5, "get_MC_T_SP": 30, "set_MC_T": 1, "get_NOTHING": 1})
+    assert ttls == {MC_T: 0.5, MC_T_SP: 30}
+    commands = compile_commands({"get_A": "a", "get_A_AGAIN": "a"})
+    assert get_cache_ttls({"get_A": 2, "get_A_AGAIN": 1}, commands) == {"a": 1}
+
+def test_decs_sweep_parser():
+    alias, points, dwell, measure, record = decs_sweep_parser(
+        "SWEEP:set_MC_T:0.1,0.05,0.02,dwell=2;measure=get_MC_T,get_MC_T_SP;record=true")
+    assert alias == "set_MC_T"
+    assert points == [0.1, 0.08, 0.06]
+    assert (dwell, measure, record) == (2.0, ["get_MC_T", "get_MC_T_SP"], True)
+    assert decs_sweep_parser("SWEEP:set_MC_T:0,1,0.5")[1:] == ([0.0, 0.5, 1.0], 0.0, [], False)
+
+@pytest.mark.parametrize("cmd", [
+    "SWEEP:get_MC_T:0,1,0.5",
+    "SWEEP:set_MC_T:0,1",
+    "SWEEP:set_MC_T:0,1,0",
+    "SWEEP:set_MC_T:0,1,0.5,dwell=-1",
+    "SWEEP:set_MC_T:0,1,0.5,speed=2",
+    "SWEEP:set_MC_T:0,1,0.5;measure=set_MC_H",
+    "SWEEP:set_MC_T:0,1e9,1",
+    "SWEEP:set_MC_T:0,inf,0.5",
+    "SWEEP:set_MC_T:-1e308,1e308,1",
+    "SWEEP:set_MC_T:0,1e308,1e-308",
+    "SWEEP:set_MC_T:-inf,0,0.5",
+    "SWEEP:set_MC_T:0,1,nan",
+    "SWEEP:set_MC_T:nan,1,0.5",
+    "SWEEP:set_MC_T:0,1,0.5,dwell=inf",
+    "SWEEP:set_MC_T:0,1,0.5,dwell=nan",
+])
+def test_decs_sweep_parser_rejects(cmd):
+    with pytest.raises(ValueError):
+        decs_sweep_parser(cmd)
@@ -0,0 +1,39 @@
+"""
+The ring buffer history behind HIST
+"""
+from decs_visa_tools.history import History, RingBuffer
+
+def test_since_before_the_buffer_wraps():
+    buffer = RingBuffer(8)
+    for t in range(5):
+        assert buffer.append(100.0 + t, 0.1 * t)
+    assert buffer.since(102.0) == ([103.0, 104.0], [0.1 * 3, 0.1 * 4])
+    assert buffer.since(0.0)[0] == [100.0, 101.0, 102.0, 103.0, 104.0]
+    assert buffer.since(104.0) == ([], [])
+    assert len(buffer) == 5
+
+def test_since_after_the_buffer_wraps():
+    buffer = RingBuffer(4)
+    for t in range(10):
+        buffer.append(100.0 + t, t)
+    # only the newest 4 are held, oldest first
+    assert buffer.since(0.0) == ([106.0, 107.0, 108.0, 109.0], [6.0, 7.0, 8.0, 9.0])
+    assert buffer.since(107.5) == ([108.0, 109.0], [8.0, 9.0])
+    assert len(buffer) == 4
+
+def test_repeated_and_older_timestamps_are_not_added():
+    buffer = RingBuffer(4)
+    assert buffer.append(100.0, 1.0)
+    # the same record read again
+    assert not buffer.append(100.0, 1.0)
+    assert not buffer.append(99.0, 2.0)
+    assert buffer.since(0.0) == ([100.0], [1.0])
+
+def test_history_per_uri():
+    history = History(4)
+    history.record("a", 100.0, 1.0)
+    history.record("b", 100.0, 2.0)
+    history.record("a", 101.0, 3.0)
+    assert history.since("a", 0.0) == ([100.0, 101.0], [1.0, 3.0])
+    assert history.since("b", 100.0) == ([], [])
+    assert history.since("c", 0.0) == ([], [])
@@ -0,0 +1,46 @@
+"""
+Latency percentile estimates from the fixed bucket histogram
+"""
+import pytest
+
+from decs_visa_tools.metrics import LATENCY_BUCKETS, LatencyHistogram
+
+def test_percentiles_are_interpolated_within_the_bucket():
+    hist = LatencyHistogram((0.5, 1.0, 2.0))
+    for i in range(1, 11):
+        hist.observe(0.1 * i)
+    # 5 latencies in [0, 0.5], 5 in (0.5, 1.0]
+    assert hist.percentile(0.5) == pytest.approx(0.5)
+    assert hist.percentile(0.9) == pytest.approx(0.9)
+    assert hist.percentile(0.2) == pytest.approx(0.2)
+
+def test_percentiles_never_exceed_the_maximum():
+    hist = LatencyHistogram((1.0, 2.0))
+    for _ in range(4):
+        hist.observe(1.1)
+    # interpolation alone would give 1.5 - 2.0
+    assert hist.percentile(0.5) == pytest.approx(1.1)
+    assert hist.percentile(0.99) == pytest.approx(1.1)
+
+def test_overflow_bucket_gives_the_maximum():
+    hist = LatencyHistogram((1.0,))
+    hist.observe(0.5)
+    hist.observe(5.0)
+    hist.observe(7.0)
+    assert hist.counts == [1, 2]
+    assert hist.percentile(0.99) == 7.0
+
+def test_summary():
+    assert LatencyHistogram().summary() == {"count": 0}
+    hist = LatencyHistogram()
+    for ms in (1, 2, 3, 4):
+        hist.observe(ms * 1e-3)
+    summary = hist.summary()
+    assert summary["count"] == 4
+    assert summary["mean_ms"] == 2.5
+    assert summary["max_ms"] == 4.0
+    assert set(summary) == {"count", "mean_ms", "max_ms", "p50_est_ms", "p90_est_ms", "p99_est_ms"}
+    assert summary["p50_est_ms"] <= summary["p90_est_ms"] <= summary["p99_est_ms"] <= 4.0
+
+def test_default_buckets_are_increasing():
+    assert list(LATENCY_BUCKETS) == sorted(set(LATENCY_BUCKETS))
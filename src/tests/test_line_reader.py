@@ -0,0 +1,48 @@
+"""
+Framing of the bytes received by the threaded socket server into messages
+"""
+from decs_visa_components.simple_socket_server import LineReader
+
+class Connection:
+    """
+    A socket that returns the given chunks from recv(), then
+    b'' as the client disconnects
+    """
+    def __init__(self, *chunks: bytes) -> None:
+        self.chunks = list(chunks)
+
+    def recv(self, size: int) -> bytes:
+        chunk = self.chunks.pop(0) if self.chunks else b''
+        assert len(chunk) <= size
+        return chunk
+
+def read_all(reader: LineReader) -> list:
+    lines = []
+    while (line := reader.readline()) is not None:
+        lines.append(line)
+    return lines
+
+def test_several_messages_in_a_chunk():
+    reader = LineReader(Connection(b"get_MC_T\nset_MC_T:0.1\nget_MC_T_SP\n"))
+    assert read_all(reader) == ["get_MC_T", "set_MC_T:0.1", "get_MC_T_SP"]
+
+def test_message_split_across_chunks():
+    reader = LineReader(Connection(b"get_M", b"C_T", b"\nget_", b"MC_T_SP\n"), chunk_size=8)
+    assert read_all(reader) == ["get_MC_T", "get_MC_T_SP"]
+
+def test_delimiter_split_across_chunks():
+    reader = LineReader(Connection(b"get_MC_T\r", b"\nget_MC_T_SP\r", b"\n"), delim="\r\n")
+    assert read_all(reader) == ["get_MC_T", "get_MC_T_SP"]
+    # a lone \r isn't a delimiter
+    reader = LineReader(Connection(b"a\rb\r", b"\n"), delim="\r\n")
+    assert read_all(reader) == ["a\rb"]
+
+def test_utf8_character_split_across_chunks():
+    data = "PUBLISH:[µK,ok]\n".encode('utf-8')
+    split = data.index("µ".encode('utf-8')) + 1
+    reader = LineReader(Connection(data[:split], data[split:]))
+    assert read_all(reader) == ["PUBLISH:[µK,ok]"]
+
+def test_partial_message_at_disconnect_is_dropped():
+    reader = LineReader(Connection(b"get_MC_T\nget_MC"))
+    assert read_all(reader) == ["get_MC_T"]
@@ -0,0 +1,30 @@
+"""
+The latest published values, and their invalidation by a set_
+"""
+import asyncio
+
+from decs_visa_tools.live_values import LiveValueTable
+
+MC = "oi.decs.temperature_control.DRI_MIX_CL."
+STILL = "oi.decs.temperature_control.DRI_STL_CL."
+
+def test_max_age_and_invalidate_prefix():
+    table = LiveValueTable()
+    table.update(MC + "setpoint", (1050, 0, 1, 2, 0.1, 1, 1))
+    table.update(STILL + "setpoint", (1050, 0, 1, 2, 0.5, 1, 1))
+    assert table.get(MC + "setpoint", 10).results == [1050, 0, 1, 2, 0.1, 1, 1]
+    assert table.get(MC + "setpoint", -1) is None
+    table.invalidate_prefix(MC)
+    assert table.get(MC + "setpoint", 10) is None
+    assert table.get(STILL + "setpoint", 10) is not None
+
+def test_set_then_get_does_not_return_the_old_live_value(component):
+    async def test():
+        component.session_ready.set()
+        component.live_values = LiveValueTable()
+        # published before the set_
+        component.live_values.update(MC + "setpoint", (1050, 0, 1, 2, 0.1, 1, 1))
+        assert await component.process_message("get_MC_T_SP") == "0.1"
+        assert await component.process_message("set_MC_T:0.2") == "0.2"
+        assert await component.process_message("get_MC_T_SP") == "0.2"
+    asyncio.run(test())
@@ -0,0 +1,38 @@
+"""
+Handoff of messages from the socket server thread to the event loop
+"""
+import asyncio
+import threading
+
+from decs_visa_tools.loop_queue import LoopQueue
+
+def test_items_put_before_bind_are_delivered_in_order():
+    async def test():
+        q = LoopQueue()
+        q.put("get_MC_T")
+        q.put("set_MC_T:0.1")
+        assert q.qsize() == 2
+        q.bind()
+        assert [await q.get(), await q.get()] == ["get_MC_T", "set_MC_T:0.1"]
+        assert q.qsize() == 0
+    asyncio.run(test())
+
+def test_put_from_another_thread_wakes_the_loop():
+    async def test():
+        q = LoopQueue()
+        q.bind()
+        thread = threading.Thread(target=lambda: [q.put(i) for i in range(100)])
+        thread.start()
+        # no polling - get() is woken by each put()
+        items = [await asyncio.wait_for(q.get(), 1) for _ in range(100)]
+        thread.join()
+        assert items == list(range(100))
+    asyncio.run(test())
+
+def test_put_after_the_loop_has_closed():
+    q = LoopQueue()
+    async def bind():
+        q.bind()
+    asyncio.run(bind())
+    # logged and dropped, not raised in the socket server thread
+    q.put("get_MC_T")
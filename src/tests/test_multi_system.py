@@ -0,0 +1,52 @@
+"""
+Routing of the shared port's messages to the systems by their prefix
+"""
+import asyncio
+
+import pytest
+
+from decs_visa_components import wamp_component
+from decs_visa_components.multi_system import SystemRouter
+from decs_visa_tools.decs_visa_settings import SET_COALESCE_WINDOWS
+from decs_visa_tools.tracer import TracedLine
+
+@pytest.fixture
+def router(make_component):
+    return SystemRouter({"FRIDGE1": make_component(), "FRIDGE2": make_component()})
+
+def test_route_by_prefix(router):
+    fridge1, fridge2 = router.components["FRIDGE1"], router.components["FRIDGE2"]
+    assert router.route("FRIDGE2/get_MC_T") == (fridge2, "get_MC_T")
+    assert router.route(" FRIDGE2 /set_MC_T:0.1") == (fridge2, "set_MC_T:0.1")
+    assert router.route("FRIDGE1/get_MC_T") == (fridge1, "get_MC_T")
+    # no prefix, or not a system - the first system, with the message as it is
+    assert router.route("get_MC_T") == (fridge1, "get_MC_T")
+    assert router.route("FRIDGE3/get_MC_T") == (fridge1, "FRIDGE3/get_MC_T")
+    # only the first delimiter is a prefix
+    assert router.route("FRIDGE2/PUBLISH:[a/b,ok]") == (fridge2, "PUBLISH:[a/b,ok]")
+
+def test_route_keeps_the_trace(router):
+    line = TracedLine("FRIDGE2/get_MC_T")
+    line.trace = object()
+    _, message = router.route(line)
+    assert message == "get_MC_T" and message.trace is line.trace
+
+def test_overlap_and_coalescing_by_system(router, monkeypatch):
+    monkeypatch.setattr(wamp_component, "PIPELINE_DEPTH", 8)
+    monkeypatch.setitem(SET_COALESCE_WINDOWS, "set_MC_T", 0.05)
+    assert router.can_overlap("FRIDGE2/get_MC_T")
+    assert not router.can_overlap("FRIDGE2/set_MC_T:0.1")
+    assert router.can_overlap("MGET:FRIDGE1/get_MC_T,FRIDGE2/get_MC_T")
+    # the systems share the uri, but not the held set_
+    key1, _ = router.coalesce_set("FRIDGE1/set_MC_T:0.1")
+    key2, _ = router.coalesce_set("FRIDGE2/set_MC_T:0.1")
+    assert key1 != key2 and key1[1] == key2[1]
+
+def test_messages_reach_their_system(router):
+    async def test():
+        assert await router.process_message("FRIDGE2/set_MC_T:0.2") == "0.2"
+        assert await router.process_message("FRIDGE1/get_MC_T_SP") == "0.0"
+        assert await router.process_message("FRIDGE2/get_MC_T_SP") == "0.2"
+        assert await router.process_message(
+            "MGET:FRIDGE1/get_MC_T_SP,FRIDGE2/get_MC_T_SP,get_MC_T_SP") == "0.0;0.2;0.0"
+    asyncio.run(test())
@@ -0,0 +1,63 @@
+"""
+Requests made while the WAMP session is down, in resilient mode
+"""
+import asyncio
+
+import pytest
+
+from decs_visa_components import wamp_component
+
+@pytest.fixture
+def resilient(component, monkeypatch):
+    """
+    A component in resilient mode, with a 0.2 s request deadline
+    """
+    monkeypatch.setattr(wamp_component, "RECONNECT_REQUEST_DEADLINE", 0.2)
+    component.reconnect = True
+    return component
+
+def test_request_waits_for_the_session(resilient):
+    async def test():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, resilient.session_ready.set)
+        assert await resilient.checked_message("set_MC_T:0.1") == "0.1"
+    asyncio.run(test())
+
+def test_request_fails_at_the_deadline(resilient):
+    async def test():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        resp = await resilient.checked_message("get_MC_T_SP")
+        assert isinstance(resp, ConnectionError)
+        assert 0.2 <= loop.time() - start < 0.5
+        # messages that don't need a session are still answered
+        assert not isinstance(await resilient.checked_message("STATS?"), Exception)
+    asyncio.run(test())
+
+def test_request_in_progress_is_retried_when_the_session_is_lost(resilient):
+    async def test():
+        loop = asyncio.get_running_loop()
+        resilient.session_ready.set()
+        call = resilient.backend.call
+        calls = []
+        async def lose_session(uri, *args):
+            calls.append(uri)
+            if len(calls) == 1:
+                resilient.session_ready.clear()
+                loop.call_later(0.05, resilient.session_ready.set)
+                raise ConnectionError("connection lost")
+            return await call(uri, *args)
+        resilient.backend.call = lose_session
+        assert await resilient.checked_message("set_MC_T:0.1") == "0.1"
+        assert len(calls) == 2
+    asyncio.run(test())
+
+def test_errors_with_the_session_up_are_returned(resilient):
+    async def test():
+        resilient.session_ready.set()
+        resilient.commands = dict(resilient.commands)
+        resilient.commands["get_NOTHING"] = resilient.commands["get_MC_T"]._replace(
+            uri="oi.decs.unknown")
+        resp = await resilient.checked_message("get_NOTHING")
+        assert isinstance(resp, RuntimeError)
+    asyncio.run(test())
@@ -0,0 +1,180 @@
+"""
+Ordering (and set_ coalescing) of pipelined messages by RequestPipeline
+"""
+import asyncio
+
+from decs_visa_components import wamp_component
+from decs_visa_components.request_pipeline import RequestPipeline
+from decs_visa_tools.decs_visa_settings import SET_COALESCE_WINDOWS, SUPERSEDED
+
+def run(coro):
+    return asyncio.run(coro)
+
+class Handler:
+    """
+    A message handler that finishes each message when the
+    test releases it, logging the starts and ends
+    """
+    def __init__(self) -> None:
+        self.log = []
+        self.release = {}
+
+    async def __call__(self, data: str) -> str:
+        self.log.append(("start", data))
+        self.release[data] = asyncio.Event()
+        await self.release[data].wait()
+        self.log.append(("end", data))
+        return data.upper()
+
+    def started(self) -> list:
+        return [data for event, data in self.log if event == "start"]
+
+def is_get(data: str) -> bool:
+    return data.startswith("get_")
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_gets_overlap_and_complete_out_of_order():
+    async def test():
+        handler = Handler()
+        pipeline = RequestPipeline(handler, is_get)
+        first = await pipeline.submit("get_A")
+        second = await pipeline.submit("get_B")
+        await settle()
+        assert handler.started() == ["get_A", "get_B"]
+        # the second finishes first - the responses are still
+        # collected in the order the messages were sent
+        handler.release["get_B"].set()
+        await settle()
+        assert second.done() and not first.done()
+        handler.release["get_A"].set()
+        assert [await first, await second] == ["GET_A", "GET_B"]
+    run(test())
+
+def test_set_waits_for_earlier_gets_and_blocks_later_ones():
+    async def test():
+        handler = Handler()
+        pipeline = RequestPipeline(handler, is_get)
+        get = await pipeline.submit("get_A")
+        set_task = asyncio.ensure_future(pipeline.submit("set_A:1"))
+        await settle()
+        # the barrier hasn't started while the get_ is in flight
+        assert handler.started() == ["get_A"]
+        handler.release["get_A"].set()
+        await settle()
+        assert handler.started() == ["get_A", "set_A:1"]
+        # submit doesn't return until the barrier has completed,
+        # so a following get_ can't overtake it
+        assert not set_task.done()
+        handler.release["set_A:1"].set()
+        done = await set_task
+        assert done.result() == "SET_A:1"
+        later = await pipeline.submit("get_A")
+        await settle()
+        assert handler.log[-1] == ("start", "get_A")
+        assert ("end", "set_A:1") in handler.log[:-1]
+        handler.release["get_A"].set()
+        assert await get == "GET_A"
+        assert await later == "GET_A"
+    run(test())
+
+def test_cancel_on_disconnect():
+    async def test():
+        handler = Handler()
+        pipeline = RequestPipeline(handler, is_get)
+        tasks = [await pipeline.submit("get_A"), await pipeline.submit("get_B")]
+        await settle()
+        pipeline.cancel()
+        await settle()
+        assert all(task.cancelled() for task in tasks)
+        assert ("end", "get_A") not in handler.log
+    run(test())
+
+def coalesce_a(data: str):
+    """
+    set_A:<value> can be replaced by a later set_A within 50 ms
+    """
+    return ("A", 0.05) if data.startswith("set_A:") else None
+
+def test_held_set_is_superseded_by_a_later_one():
+    async def test():
+        handler = Handler()
+        pipeline = RequestPipeline(handler, is_get, coalesce_a)
+        first = await pipeline.submit("set_A:1")
+        second = await pipeline.submit("set_A:2")
+        third = await pipeline.submit("set_A:3")
+        assert await first == SUPERSEDED
+        assert await second == SUPERSEDED
+        # only the last value is sent, once its window has passed
+        await asyncio.sleep(0.1)
+        assert handler.started() == ["set_A:3"]
+        handler.release["set_A:3"].set()
+        assert await third == "SET_A:3"
+    run(test())
+
+def test_window_is_timed_from_the_first_held_set():
+    async def test():
+        handler = Handler()
+        pipeline = RequestPipeline(handler, is_get, lambda data: ("A", 0.2))
+        first = await pipeline.submit("set_A:1")
+        await asyncio.sleep(0.15)
+        second = await pipeline.submit("set_A:2")
+        assert await first == SUPERSEDED
+        # sent 0.2 s after the first set_, not 0.2 s after the second
+        await asyncio.sleep(0.1)
+        assert handler.started() == ["set_A:2"]
+        handler.release["set_A:2"].set()
+        assert await second == "SET_A:2"
+    run(test())
+
+def test_other_messages_send_held_sets_first():
+    async def test():
+        handler = Handler()
+        pipeline = RequestPipeline(handler, is_get, coalesce_a)
+        held = await pipeline.submit("set_A:1")
+        get = asyncio.ensure_future(pipeline.submit("get_A"))
+        await settle()
+        # sent without waiting for the window, and the get_
+        # waits for it so it sees the new value
+        assert handler.started() == ["set_A:1"]
+        handler.release["set_A:1"].set()
+        get = await get
+        await settle()
+        assert handler.started() == ["set_A:1", "get_A"]
+        handler.release["get_A"].set()
+        assert await held == "SET_A:1"
+        assert await get == "GET_A"
+    run(test())
+
+def test_cancel_on_disconnect_cancels_held_sets():
+    async def test():
+        handler = Handler()
+        pipeline = RequestPipeline(handler, is_get, coalesce_a)
+        held = await pipeline.submit("set_A:1")
+        pipeline.cancel()
+        await asyncio.sleep(0.1)
+        assert held.cancelled()
+        assert not handler.started()
+    run(test())
+
+def test_heater_off_commands_are_never_held(monkeypatch, component):
+    monkeypatch.setattr(wamp_component, "PIPELINE_DEPTH", 8)
+    for alias in ("set_MC_T", "set_MC_H", "set_MC_H_OFF", "set_STILL_H_OFF"):
+        monkeypatch.setitem(SET_COALESCE_WINDOWS, alias, 0.05)
+    c = component
+    assert c.coalesce_set("set_MC_T:0.1") == (c.commands["set_MC_T"].uri, 0.05)
+    assert c.coalesce_set("set_MC_H:0.1") is not None
+    assert c.coalesce_set("set_MC_H_OFF:0") is None
+    assert c.coalesce_set("set_STILL_H_OFF:0") is None
+    assert c.coalesce_set("get_MC_T") is None
+
+def test_nothing_held_without_a_window_or_pipelining(monkeypatch, component):
+    monkeypatch.setattr(wamp_component, "PIPELINE_DEPTH", 8)
+    c = component
+    assert c.coalesce_set("set_MC_T:0.1") is None
+    monkeypatch.setitem(SET_COALESCE_WINDOWS, "set_MC_T", 0.05)
+    assert c.coalesce_set("set_MC_T:0.1") is not None
+    monkeypatch.setattr(wamp_component, "PIPELINE_DEPTH", 1)
+    assert c.coalesce_set("set_MC_T:0.1") is None
@@ -0,0 +1,71 @@
+"""
+Decoding a sample data record of each layout
+"""
+import math
+
+import numpy as np
+import pytest
+
+from autobahn.wamp.types import CallResult
+
+from decs_visa_tools.response_parser import (
+    RECORD_LAYOUTS, OIRecordType, decs_batch_parser, decs_batch_records, decs_record,
+    decs_response_parser)
+
+# [record type, ?, seconds, nanoseconds, value(s)..., status]
+SAMPLES = [
+    ((0, 0, 1700000000, 500000000, 0.0123, 0), "0.0123", 0),
+    ((1020, 0, 1700000000, 500000000, 1, 2, 0), "1", 0),
+    ((1040, 0, 1700000000, 500000000, 1e-5, 1, 2, 0), "1e-05", 0),
+    ((1400, 0, 1700000000, 500000000, 0.1, 0.2, 0.3, 0), "0.1,0.2,0.3", 0),
+    ((100, 0, 1700000000, 500000000, 1.5, -0.5, 0), "1.5,-0.5", 0),
+    ((1000, 0, 1700000000, 500000000, 1, "detail", "more detail", 3), "1", 3),
+    ((1070, 0, 1700000000, 500000000, 5, 2.5, 1, 2, 3, 4, 7), "2.5", 7),
+]
+
+@pytest.mark.parametrize("results,value,status", SAMPLES)
+def test_record_layouts(results, value, status):
+    record = decs_record(CallResult(*results))
+    assert record.value == value
+    assert record.status == status
+    assert record.timestamp == pytest.approx(1700000000.5)
+    assert decs_response_parser(CallResult(*results)) == value
+
+@pytest.mark.parametrize("results,value", [
+    ((3,), "3"),
+    (("HOLD", 0), "HOLD"),
+    ((0.1, 0.2, 0.3, 0, 0, 0, 0, 0, 0), "0.1,0.2,0.3"),
+])
+def test_flat_responses(results, value):
+    assert decs_record(CallResult(*results)) == (value, None, None)
+
+def test_flat_responses_take_precedence():
+    # 9 results are a flat response, even if the first is a record type
+    # whose (variable length) records could be 9 results long
+    assert decs_record(CallResult(1000, 2, 3, 0, 0, 0, 0, 0, 0)) == ("1000,2,3", None, None)
+
+def test_numeric_string_record_type():
+    record = decs_record(CallResult("0", 0, 1700000000, 500000000, 0.0123, 0))
+    assert record == ("0.0123", 0, pytest.approx(1700000000.5))
+
+def test_every_record_type_has_a_layout():
+    assert set(RECORD_LAYOUTS) == set(OIRecordType)
+
+def test_errors_are_returned_as_the_value():
+    # too short for a temperature record, and an unknown record type
+    assert "inconsistent" in decs_record(CallResult(0, 0, 1700000000, 0, 0.1, 0, 0)).value
+    assert "Unable to match" in decs_record(CallResult(7, 0, 0, 0, 0.1, 0, 0)).value
+
+def test_batch_records():
+    resps = [CallResult(*SAMPLES[0][0]), CallResult(*SAMPLES[3][0]),
+             RuntimeError("no callee"), CallResult(3,), CallResult("HOLD", 0)]
+    texts, timestamps, values = decs_batch_records(resps)
+    assert texts == ["0.0123", "0.1,0.2,0.3", "no callee", "3", "HOLD"]
+    assert timestamps[0] == pytest.approx(1700000000.5)
+    assert [math.isnan(t) for t in timestamps[2:]] == [True, True, True]
+    # vectors, errors and non-numeric values aren't values
+    assert values[0] == 0.0123 and values[3] == 3
+    assert [math.isnan(v) for v in values[[1, 2, 4]]] == [True, True, True]
+    batch_timestamps, batch_values = decs_batch_parser(resps)
+    assert np.array_equal(batch_timestamps, timestamps, equal_nan=True)
+    assert np.array_equal(batch_values, values, equal_nan=True)
@@ -0,0 +1,72 @@
+"""
+Single-flight coalescing of identical get_ requests
+"""
+import asyncio
+
+import pytest
+
+from autobahn.wamp import exception as wamp_exceptions
+
+MC_T = "oi.decs.temperature_control.DRI_MIX_CL.DRI_MIX_S.temperature"
+MC_T_SP = "oi.decs.temperature_control.DRI_MIX_CL.setpoint"
+
+@pytest.fixture
+def calls(component):
+    """
+    The uris called on the simulator, which answers after 50 ms
+    """
+    calls = []
+    backend = component.backend
+    backend.latency = 0.05
+    call = backend.call
+    def counted(uri, *args):
+        calls.append(uri)
+        return call(uri, *args)
+    backend.call = counted
+    return calls
+
+def test_identical_requests_share_one_call(component, calls):
+    async def test():
+        resps = await asyncio.gather(*[component.coalesced_rpc(MC_T) for _ in range(5)],
+                                     component.coalesced_rpc(MC_T_SP))
+        assert calls == [MC_T, MC_T_SP]
+        assert all(resp is resps[0] for resp in resps[:5])
+        assert component.coalesced_gets == 4
+        # finished requests aren't shared
+        await component.coalesced_rpc(MC_T)
+        assert calls == [MC_T, MC_T_SP, MC_T]
+    asyncio.run(test())
+
+def test_cancelling_one_waiter_leaves_the_others(component, calls):
+    async def test():
+        first = asyncio.ensure_future(component.coalesced_rpc(MC_T))
+        second = asyncio.ensure_future(component.coalesced_rpc(MC_T))
+        await asyncio.sleep(0.01)
+        # e.g. the first client disconnected
+        first.cancel()
+        resp = await second
+        assert first.cancelled()
+        assert resp.results[0] == 0
+        assert calls == [MC_T]
+    asyncio.run(test())
+
+def test_errors_are_shared(component, calls):
+    async def test():
+        uri = "oi.decs.unknown"
+        resps = await asyncio.gather(component.coalesced_rpc(uri), component.coalesced_rpc(uri),
+                                     return_exceptions=True)
+        assert calls == [uri]
+        assert all(isinstance(resp, wamp_exceptions.ApplicationError) for resp in resps)
+    asyncio.run(test())
+
+def test_a_set_is_not_joined_by_later_requests(component, calls):
+    async def test():
+        before = asyncio.ensure_future(component.coalesced_rpc(MC_T_SP))
+        await asyncio.sleep(0.01)
+        # the set_ (and its invalidation) happen while the get_ is in flight
+        component.invalidate_cached(MC_T_SP)
+        after = await component.coalesced_rpc(MC_T_SP)
+        await before
+        assert calls == [MC_T_SP, MC_T_SP]
+        assert after is not before.result()
+    asyncio.run(test())
@@ -0,0 +1,76 @@
+"""
+The get_ response cache - expiry, eviction and invalidation
+"""
+import asyncio
+
+import pytest
+
+from decs_visa_tools import ttl_cache
+from decs_visa_tools.ttl_cache import TTLCache
+
+MC_T_SP = "oi.decs.temperature_control.DRI_MIX_CL.setpoint"
+
+class Clock:
+    """
+    time.monotonic(), moved on by the test
+    """
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    return clock
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(4)
+    cache.put("a", "A", 1.0, cache.generation)
+    cache.put("b", "B", 5.0, cache.generation)
+    clock.now += 0.5
+    assert (cache.get("a"), cache.get("b")) == ("A", "B")
+    clock.now += 1.0
+    assert (cache.get("a"), cache.get("b")) == (None, "B")
+    assert (cache.hits, cache.misses) == (3, 1)
+    # a TTL of 0 isn't cached at all
+    cache.put("c", "C", 0, cache.generation)
+    assert cache.get("c") is None
+
+def test_least_recently_used_is_evicted(clock):
+    cache = TTLCache(2)
+    cache.put("a", "A", 10, cache.generation)
+    cache.put("b", "B", 10, cache.generation)
+    assert cache.get("a") == "A"
+    cache.put("c", "C", 10, cache.generation)
+    assert len(cache) == 2 and cache.evictions == 1
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+
+def test_invalidation(clock):
+    cache = TTLCache(4)
+    family = "oi.decs.temperature_control.DRI_MIX_CL."
+    cache.put(family + "setpoint", "SP", 10, cache.generation)
+    cache.put("oi.decs.temperature_control.DRI_STL_CL.setpoint", "STILL", 10, cache.generation)
+    # requested before the set_, answered after it
+    generation = cache.generation
+    cache.invalidate_prefix(family)
+    assert cache.get(family + "setpoint") is None
+    assert cache.get("oi.decs.temperature_control.DRI_STL_CL.setpoint") == "STILL"
+    cache.put(family + "setpoint", "OLD SP", 10, generation)
+    assert cache.get(family + "setpoint") is None
+    cache.put(family + "setpoint", "NEW SP", 10, cache.generation)
+    assert cache.get(family + "setpoint") == "NEW SP"
+
+def test_set_then_get_is_not_answered_from_the_cache(component):
+    async def test():
+        component.session_ready.set()
+        component.get_cache = TTLCache(16)
+        component.cache_ttls = {MC_T_SP: 60}
+        assert await component.process_message("set_MC_T:0.1") == "0.1"
+        assert await component.process_message("get_MC_T_SP") == "0.1"
+        assert component.get_cache.get(MC_T_SP) is not None
+        assert await component.process_message("set_MC_T:0.2") == "0.2"
+        assert await component.process_message("get_MC_T_SP") == "0.2"
+    asyncio.run(test())